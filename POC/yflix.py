@@ -1,4 +1,13 @@
-import requests
+import os
+import sys
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from common import deadline
+from common.cache import TTLCache
+from common.http import Session
+from common.metrics import timed
 
 HEADERS = {
     "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/137.0.0.0 Safari/537.36",
@@ -7,44 +16,104 @@ HEADERS = {
 }
 
 API = "https://enc-dec.app/api"
+DB = "https://enc-dec.app/db"
 YFLIX_AJAX = "https://yflix.to/ajax"
 
+# enc-movies-flix is deterministic, so tokens are memoized persistently
+# (backend from SCRAPER_CACHE, see common/cache.py)
+ENC_CACHE = TTLCache("yflix:enc")
+ENC_TTL = 30 * 24 * 3600
+ENC_WORKERS = 8
+
+# Rate and in-flight requests are limited per host for the whole process
+# (yflix.to and enc-dec.app limits live in common/http.py HOST_LIMITS)
+SESSION = Session()
+
+def request(method, url, **kwargs):
+    return SESSION.request(method, url, **kwargs)
+
+@timed("encrypt", "yflix")
 def encrypt(text):
-    return requests.get(f"{API}/enc-movies-flix?text={text}").json()["result"]
+    cached = ENC_CACHE.get(text)
+    if cached is not None:
+        return cached
+    result = request("GET", f"{API}/enc-movies-flix", params={"text": text}).json()["result"]
+    ENC_CACHE.set(text, result, ENC_TTL)
+    return result
+
+def encrypt_many(texts):
+    # enc-dec.app only takes one text per call, so the batch is the cache hits
+    # plus the misses fetched concurrently — one round trip of wall time
+    texts = list(dict.fromkeys(texts))
+    tokens = {}
+    missing = []
+    for text in texts:
+        cached = ENC_CACHE.get(text)
+        if cached is not None:
+            tokens[text] = cached
+        else:
+            missing.append(text)
+    if missing:
+        with ThreadPoolExecutor(max_workers=min(ENC_WORKERS, len(missing))) as pool:
+            tokens.update(zip(missing, pool.map(deadline.bind(encrypt), missing)))
+    return tokens
 
+@timed("decrypt", "yflix")
 def decrypt(text):
-    return requests.post(f"{API}/dec-movies-flix", json={"text": text}).json()["result"]
+    # enc-dec.app calls are pure functions, so they are safe to retry and hedge
+    return request("POST", f"{API}/dec-movies-flix", json={"text": text}, idempotent=True).json()["result"]
 
 def parse_html(html):
-    return requests.post(f"{API}/parse-html", json={"text": html}).json()["result"]
+    return request("POST", f"{API}/parse-html", json={"text": html}, idempotent=True).json()["result"]
 
 def get_json(url):
-    return requests.get(url, headers=HEADERS).json()
-
-# 1movies and yflix are the same site with different domains, pick either
-# --- Cyberpunk Edgerunners ---
-# https://yflix.to/watch/cyberpunk-edgerunners.kmyvry
-content_id = "d4K68KU"
-
-# Episodes data
-enc_id = encrypt(content_id)
-episodes_resp = get_json(f"{YFLIX_AJAX}/episodes/list?id={content_id}&_={enc_id}")
-episodes = parse_html(episodes_resp["result"])
-
-# Pick first episode eid to load servers
-eid = episodes["1"]["1"]["eid"]
-enc_eid = encrypt(eid)
-servers_resp = get_json(f"{YFLIX_AJAX}/links/list?eid={eid}&_={enc_eid}")
-servers = parse_html(servers_resp["result"])
-
-# Pick first server lid to load embed
-lid = servers["default"]["1"]["lid"]
-enc_lid = encrypt(lid)
-embed_resp = get_json(f"{YFLIX_AJAX}/links/view?id={lid}&_={enc_lid}")
-encrypted = embed_resp["result"]
-
-# Decrypt
-# Note: subtitles url is passed as urlencoded sub.list parameter
-decrypted = decrypt(encrypted)
-print(f"\n{'-'*25} Decrypted Data {'-'*25}\n")
-print(decrypted)
\ No newline at end of file
+    return request("GET", url, headers=HEADERS).json()
+
+@timed("search", "yflix")
+def db_lookup(tmdb_id, kind):
+    # enc-dec.app's yflix DB: [{info: {title_en, year, flix_id}, episodes: {s: {e: {eid}}}}]
+    return request("GET", f"{DB}/flix/find", params={"tmdb_id": tmdb_id, "type": kind}).json()
+
+@timed("detail", "yflix")
+def get_episodes(content_id):
+    enc_id = encrypt(content_id)
+    episodes_resp = get_json(f"{YFLIX_AJAX}/episodes/list?id={content_id}&_={enc_id}")
+    return parse_html(episodes_resp["result"])
+
+def precompute_season_tokens(episodes, season):
+    # Encrypt every eid of a season up front so each episode only needs links/list
+    eids = [ep["eid"] for ep in episodes.get(str(season), {}).values() if ep.get("eid")]
+    return encrypt_many(eids)
+
+@timed("servers", "yflix")
+def get_servers(eid):
+    enc_eid = encrypt(eid)
+    servers_resp = get_json(f"{YFLIX_AJAX}/links/list?eid={eid}&_={enc_eid}")
+    return parse_html(servers_resp["result"])
+
+@timed("source", "yflix")
+def get_embed(lid):
+    enc_lid = encrypt(lid)
+    embed_resp = get_json(f"{YFLIX_AJAX}/links/view?id={lid}&_={enc_lid}")
+    # Note: subtitles url is passed as urlencoded sub.list parameter
+    return decrypt(embed_resp["result"])
+
+if __name__ == "__main__":
+    # 1movies and yflix are the same site with different domains, pick either
+    # --- Cyberpunk Edgerunners ---
+    # https://yflix.to/watch/cyberpunk-edgerunners.kmyvry
+    content_id = "d4K68KU"
+
+    # Episodes data
+    episodes = get_episodes(content_id)
+    precompute_season_tokens(episodes, 1)
+
+    # Pick first episode eid to load servers
+    eid = episodes["1"]["1"]["eid"]
+    servers = get_servers(eid)
+
+    # Pick first server lid to load embed
+    lid = servers["default"]["1"]["lid"]
+    decrypted = get_embed(lid)
+    print(f"\n{'-'*25} Decrypted Data {'-'*25}\n")
+    print(decrypted)
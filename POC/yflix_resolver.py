@@ -0,0 +1,277 @@
+"""
+Concurrent yflix resolver.
+
+Resolves every selected episode × server of a yflix content id in parallel:
+links/list per episode, then links/view + decrypt (+ hoster decrypt) per
+server. Requests are limited per host by common/http.py, and results are
+yielded as soon as each server finishes.
+
+Usage:
+    python yflix_resolver.py <content_id> [--season N] [--episode N ...]
+
+Examples:
+    python yflix_resolver.py d4K68KU --season 1          # whole season
+    python yflix_resolver.py d4K68KU --season 1 --episode 3 --episode 4
+"""
+
+import sys
+import json
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from urllib.parse import urlparse, parse_qs
+
+import yflix
+from common import deadline
+from common.cache import ResolvedStreamCache
+from common.metrics import timed
+from common.providers import Provider, make_link
+
+USER_AGENT = yflix.HEADERS["User-Agent"]
+
+# Upper bound on worker threads; real concurrency is capped per host in common/http.py
+MAX_WORKERS = 16
+
+
+def select_episodes(episodes, season=None, episode_nums=None):
+    """[(season, episode, eid)] for the selection; all seasons when season is None."""
+    selected = []
+    for s_key in sorted(episodes, key=lambda k: int(k) if k.isdigit() else 0):
+        if season is not None and s_key != str(season):
+            continue
+        for e_key in sorted(episodes[s_key], key=lambda k: int(k) if k.isdigit() else 0):
+            if episode_nums and e_key not in {str(n) for n in episode_nums}:
+                continue
+            eid = episodes[s_key][e_key].get("eid")
+            if eid:
+                selected.append((s_key, e_key, eid))
+    return selected
+
+
+def stream_url_of(decrypted):
+    if isinstance(decrypted, str):
+        return decrypted
+    if isinstance(decrypted, dict):
+        return decrypted.get("url") or decrypted.get("stream") or decrypted.get("file")
+    return None
+
+
+@timed("extract", "yflix")
+def resolve_hoster(embed_url):
+    """rapidairmax / megaup /e/ embeds → stream URL via /media/ + dec-rapid / dec-mega."""
+    media = yflix.request("GET", embed_url.replace("/e/", "/media/"), headers={"User-Agent": USER_AGENT}).json()
+    endpoint = "dec-rapid" if urlparse(embed_url).hostname == "rapidairmax.site" else "dec-mega"
+    decrypted = yflix.request(
+        "POST", f"{yflix.API}/{endpoint}", json={"text": media["result"], "agent": USER_AGENT}, idempotent=True
+    ).json()["result"]
+    return decrypted.get("stream") or ((decrypted.get("sources") or [{}])[0].get("file"))
+
+
+def resolve_server(season, episode, group, server, lid):
+    record = {"season": season, "episode": episode, "group": group, "server": server, "lid": lid}
+    try:
+        url = stream_url_of(yflix.get_embed(lid))
+        if not url:
+            record["error"] = "No stream URL in decrypted response"
+            return record
+        # Subtitles ride along as a urlencoded sub.list parameter
+        sub_list = parse_qs(urlparse(url).query).get("sub.list")
+        record["subtitles"] = sub_list[0] if sub_list else None
+        if "/e/" in urlparse(url).path:
+            record["embed"] = url
+            url = resolve_hoster(url)
+        record["url"] = url
+    except Exception as e:
+        record["error"] = str(e)
+    return record
+
+
+def resolve(content_id, season=None, episode_nums=None, all_servers=True):
+    """
+    Yield one result dict per (episode, server) as each completes.
+    all_servers=False stops at the first server of each group, as the POC did.
+    Under a deadline (common/deadline.py) it stops when the budget runs out
+    and yields one error record per episode still outstanding.
+    """
+    episodes = yflix.get_episodes(content_id)
+    selected = select_episodes(episodes, season, episode_nums)
+    if not selected:
+        return
+
+    # All eid tokens in one concurrent batch, so links/list is the only per-episode hop
+    yflix.encrypt_many([eid for _, _, eid in selected])
+
+    pool = ThreadPoolExecutor(max_workers=MAX_WORKERS)
+    try:
+        pending = {}
+        for s_key, e_key, eid in selected:
+            pending[deadline.submit(pool, yflix.get_servers, eid)] = ("servers", s_key, e_key, eid)
+
+        while pending:
+            done, _ = wait(pending, timeout=deadline.remaining_timeout(None), return_when=FIRST_COMPLETED)
+            if not done:
+                for kind, s_key, e_key, eid in dict.fromkeys(pending.values()):
+                    yield {"season": s_key, "episode": e_key, "eid": eid, "error": f"deadline exceeded ({kind})"}
+                return
+            for future in done:
+                kind, s_key, e_key, eid = pending.pop(future)
+                if kind == "server":
+                    yield future.result()
+                    continue
+                try:
+                    servers = future.result()
+                except Exception as e:
+                    yield {"season": s_key, "episode": e_key, "eid": eid, "error": f"links/list: {e}"}
+                    continue
+                for group, items in servers.items():
+                    for n in sorted(items, key=lambda k: int(k) if k.isdigit() else 0):
+                        lid = items[n]["lid"]
+                        job = deadline.submit(pool, resolve_server, s_key, e_key, group, n, lid)
+                        pending[job] = ("server", s_key, e_key, eid)
+                        if not all_servers:
+                            break
+    finally:
+        # A consumer that stops early should not wait for the rest
+        pool.shutdown(wait=False, cancel_futures=True)
+
+
+# ─── JSON API (same shape as yflix/src/index.js) ────────────────────────────
+
+REFERER = "https://yflix.to/"
+
+
+def resolve_eid(eid):
+    """First server of the default group for an episode id, as the worker does."""
+    servers = yflix.get_servers(eid)
+    lid = (servers.get("default") or {}).get("1", {}).get("lid")
+    if not lid:
+        raise RuntimeError("No server ID (lid) found in parsed HTML")
+    record = resolve_server(None, None, "default", "1", lid)
+    if "error" in record:
+        raise RuntimeError(record["error"])
+    return record["url"]
+
+
+# Successful lookups, kept until their stream URL expires
+STREAM_CACHE = ResolvedStreamCache()
+
+
+def _api_lookup(kind, tmdb_id, season, episode):
+    """{"streams", "metadata"} for a title; raises on any failure."""
+    results = yflix.db_lookup(tmdb_id, kind)
+    if not results:
+        raise RuntimeError("Content not found in database")
+    item = results[0]
+    info = item.get("info") or {}
+    eid = ((item.get("episodes") or {}).get(str(season or 1)) or {}).get(str(episode or 1), {}).get("eid")
+    if not eid:
+        raise RuntimeError(
+            "Episode ID not found in database for movie" if kind == "movie"
+            else f"Episode S{season}E{episode} not found in database"
+        )
+    return {
+        "streams": [{
+            "url": resolve_eid(eid),
+            "quality": "Auto",
+            "title": "YFlix Stream",
+            "stream_type": "hls",
+            "referer": REFERER,
+            "subtitles": [],
+        }],
+        "metadata": {
+            "title": info.get("title_en"),
+            "year": info.get("year"),
+            "flix_id": info.get("flix_id"),
+            "episode_id": eid,
+        },
+    }
+
+
+def _api_response(kind, tmdb_id, season, episode):
+    response = {
+        "provider": "yflix",
+        "type": kind,
+        "tmdb_id": int(tmdb_id),
+        "season": season,
+        "episode": episode,
+        "streams": [],
+        "metadata": None,
+        "success": False,
+        "error": None,
+    }
+    try:
+        found = STREAM_CACHE.get_or_resolve(
+            "yflix:api", tmdb_id, season, episode,
+            lambda: _api_lookup(kind, tmdb_id, season, episode),
+            lambda found: [s["url"] for s in found["streams"]],
+        )
+        response.update(found, success=True)
+    except Exception as e:
+        # The worker reports failures in-band with a 200, not as an HTTP error
+        response["error"] = str(e)
+    return response
+
+
+def api_movie(tmdb_id):
+    return _api_response("movie", tmdb_id, None, None)
+
+
+def api_tv(tmdb_id, season, episode):
+    return _api_response("tv", tmdb_id, season, episode)
+
+
+# ─── Provider interface (see common/providers.py) ───────────────────────────
+
+class YFlixProvider(Provider):
+    name = "yflix"
+    budget = 20.0
+
+    def map(self, tmdb_id, kind, season=None, episode=None):
+        results = yflix.db_lookup(tmdb_id, kind)
+        if not results:
+            return None
+        episodes = results[0].get("episodes") or {}
+        eid = (episodes.get(str(season or 1)) or {}).get(str(episode or 1), {}).get("eid")
+        return {"eid": eid} if eid else None
+
+    def list_servers(self, target):
+        servers = yflix.get_servers(target["eid"])
+        return [
+            {"name": f"{group}/{n}", "group": group, "n": n, "lid": items[n]["lid"]}
+            for group, items in servers.items()
+            for n in sorted(items, key=lambda k: int(k) if k.isdigit() else 0)
+        ]
+
+    def extract(self, target, server):
+        record = resolve_server(None, None, server["group"], server["n"], server["lid"])
+        if "error" in record:
+            raise RuntimeError(record["error"])
+        return [make_link(self.name, record["url"], server=server["name"], referer=REFERER)]
+
+
+PROVIDER = YFlixProvider()
+
+
+def main():
+    if len(sys.argv) < 2:
+        print(__doc__)
+        return
+
+    content_id = sys.argv[1]
+    season = None
+    episode_nums = []
+    i = 2
+    while i < len(sys.argv):
+        if sys.argv[i] == "--season" and i + 1 < len(sys.argv):
+            season = int(sys.argv[i + 1])
+            i += 2
+        elif sys.argv[i] == "--episode" and i + 1 < len(sys.argv):
+            episode_nums.append(int(sys.argv[i + 1]))
+            i += 2
+        else:
+            i += 1
+
+    for record in resolve(content_id, season, episode_nums):
+        print(json.dumps(record), flush=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,6 @@
+"""
+Shared helpers for the Python scrapers (watch32, streamflix, hdhub4u, yflix).
+
+The scrapers are run as plain scripts from their own directories, so each one
+puts the repository root on sys.path before importing from this package.
+"""
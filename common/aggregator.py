@@ -0,0 +1,223 @@
+"""
+Concurrent multi-provider lookup.
+
+aggregate() starts every provider's resolve() at once, each on its own
+thread with its own time budget, and yields records as an async stream:
+
+    {"type": "link", "provider": ..., "url": ..., ...}      as each link resolves
+    {"type": "provider", "provider": ..., "status": ...}    when a provider ends
+
+status is "ok", "empty", "error" or "timeout". A provider still running at
+its deadline is reported as "timeout" and told to stop, so the whole lookup
+takes at most the largest budget. Each provider thread runs inside a
+deadline_scope of its budget (clipped to the caller's deadline, if any), so
+its HTTP timeouts shrink as the budget is used up.
+
+Usage:
+    python -m common.aggregator movie <tmdb_id> [--providers a,b] [--budget S] [--deadline S] [--timings]
+    python -m common.aggregator tv <tmdb_id> <season> <episode> [...]
+
+The CLI prints progressive() records: every link and provider status as it
+happens, then a summary. Scraper progress (and with --timings, per-stage
+span timings) goes to stderr.
+"""
+
+import sys
+import json
+import contextlib
+import time
+import asyncio
+import threading
+import contextvars
+
+from common import deadline as deadlines, metrics
+from common.providers import PROVIDERS, get_provider
+
+# Server error strings kept per provider in its status record
+MAX_ERRORS = 5
+
+
+def _budget_for(name, budgets, default_budget):
+    if budgets and name in budgets:
+        return budgets[name]
+    if default_budget is not None:
+        return default_budget
+    try:
+        return get_provider(name).budget
+    except Exception:
+        return 20.0
+
+
+async def aggregate(tmdb_id, kind, season=None, episode=None, providers=None, budgets=None, default_budget=None,
+                    deadline=None):
+    """
+    Async generator of link and provider-status records (see module docstring).
+    deadline (a common.deadline.Deadline, default the current one) caps every
+    provider's budget.
+    """
+    deadline = deadline or deadlines.current()
+    loop = asyncio.get_running_loop()
+    queue = asyncio.Queue()
+    names = [n for n in (providers or PROVIDERS) if n in PROVIDERS]
+
+    def emit(item):
+        try:
+            loop.call_soon_threadsafe(queue.put_nowait, item)
+        except RuntimeError:
+            pass  # loop already closed — the consumer has gone
+
+    def run(name, budget, cancel, errors):
+        try:
+            with deadlines.deadline_scope(budget):
+                for link in get_provider(name).resolve(tmdb_id, kind, season, episode, cancel=cancel, errors=errors):
+                    if cancel.is_set():
+                        return
+                    emit(("link", name, link))
+            emit(("done", name, None))
+        except Exception as e:
+            emit(("error", name, e))
+
+    started = time.monotonic()
+    state = {}
+    for name in names:
+        budget = _budget_for(name, budgets, default_budget)
+        if deadline is not None:
+            budget = min(budget, max(0.0, deadline.remaining()))
+        state[name] = {
+            "cancel": threading.Event(),
+            "errors": [],
+            "deadline": started + budget,
+            "links": 0,
+        }
+        context = contextvars.copy_context()
+        threading.Thread(
+            target=context.run, args=(run, name, budget, state[name]["cancel"], state[name]["errors"]),
+            name=f"provider-{name}", daemon=True,
+        ).start()
+
+    def status(name, outcome, error=None):
+        record = {
+            "type": "provider",
+            "provider": name,
+            "status": outcome,
+            "links": state[name]["links"],
+            "elapsed_ms": int((time.monotonic() - started) * 1000),
+        }
+        if error:
+            record["error"] = error
+        if state[name]["errors"]:
+            record["serverErrors"] = state[name]["errors"][:MAX_ERRORS]
+        return record
+
+    active = set(names)
+    try:
+        while active:
+            timeout = min(state[n]["deadline"] for n in active) - time.monotonic()
+            try:
+                event, name, payload = await asyncio.wait_for(queue.get(), max(timeout, 0))
+            except asyncio.TimeoutError:
+                now = time.monotonic()
+                for name in [n for n in active if state[n]["deadline"] <= now]:
+                    active.discard(name)
+                    state[name]["cancel"].set()
+                    yield status(name, "timeout")
+                continue
+
+            if name not in active:
+                continue  # late result from a provider that already timed out
+            if event == "link":
+                state[name]["links"] += 1
+                yield {"type": "link", **payload}
+            elif event == "done":
+                active.discard(name)
+                yield status(name, "ok" if state[name]["links"] else "empty")
+            else:
+                active.discard(name)
+                yield status(name, "error", str(payload))
+    finally:
+        # Finished, or the consumer stopped early: release any stragglers
+        for p in state.values():
+            p["cancel"].set()
+
+
+async def progressive(tmdb_id, kind, season=None, episode=None, **kwargs):
+    """aggregate() records followed by one {"type": "summary"} record."""
+    started = time.monotonic()
+    first_link_ms = None
+    links, providers = 0, []
+    async for record in aggregate(tmdb_id, kind, season, episode, **kwargs):
+        if record["type"] == "link":
+            links += 1
+            if first_link_ms is None:
+                first_link_ms = int((time.monotonic() - started) * 1000)
+        else:
+            providers.append(record)
+        yield record
+    yield {
+        "type": "summary",
+        "tmdbId": str(tmdb_id),
+        "kind": kind,
+        "season": season,
+        "episode": episode,
+        "links": links,
+        "firstLinkMs": first_link_ms,
+        "elapsedMs": int((time.monotonic() - started) * 1000),
+        "providers": providers,
+    }
+
+
+async def collect(tmdb_id, kind, season=None, episode=None, **kwargs):
+    """Run aggregate() to completion → {"links": [...], "providers": [...]}."""
+    links, providers = [], []
+    async for record in aggregate(tmdb_id, kind, season, episode, **kwargs):
+        (links if record["type"] == "link" else providers).append(record)
+    return {"links": links, "providers": providers}
+
+
+def main():
+    args = sys.argv[1:]
+    if len(args) < 2 or args[0] not in ("movie", "tv") or (args[0] == "tv" and len(args) < 4):
+        print(__doc__)
+        return
+
+    kind, tmdb_id = args[0], args[1]
+    season = episode = None
+    rest = args[2:]
+    if kind == "tv":
+        season, episode = int(args[2]), int(args[3])
+        rest = args[4:]
+
+    providers, default_budget, seconds, timings = None, None, None, False
+    i = 0
+    while i < len(rest):
+        if rest[i] == "--providers" and i + 1 < len(rest):
+            providers = rest[i + 1].split(",")
+            i += 2
+        elif rest[i] == "--budget" and i + 1 < len(rest):
+            default_budget = float(rest[i + 1])
+            i += 2
+        elif rest[i] == "--deadline" and i + 1 < len(rest):
+            seconds = float(rest[i + 1])
+            i += 2
+        elif rest[i] == "--timings":
+            timings = True
+            i += 1
+        else:
+            i += 1
+
+    out = sys.stdout
+
+    async def run():
+        deadline = deadlines.Deadline(seconds) if seconds else None
+        async for record in progressive(tmdb_id, kind, season, episode, providers=providers,
+                                        default_budget=default_budget, deadline=deadline):
+            print(json.dumps(record), file=out, flush=True)
+
+    # Scraper progress lines go to stderr so stdout stays one JSON record per line
+    metrics.console(stream=sys.stderr, timings=timings)
+    with contextlib.redirect_stdout(sys.stderr):
+        asyncio.run(run())
+
+
+if __name__ == "__main__":
+    main()
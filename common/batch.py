@@ -0,0 +1,236 @@
+"""
+Batch lookups: many TMDB ids in one process, one JSON record per result.
+
+Input (a file, or stdin with "-"), one title per line, "#" starts a comment:
+
+    550                 movie
+    movie 550
+    1396 1 2            tv, season 1 episode 2
+    tv 1396 1 2
+
+Titles are resolved concurrently through the provider's api_movie / api_tv,
+so sessions, pools, caches and the StreamFlix config/catalog/Firebase
+connection are shared by the whole batch. Each result is written as soon as
+it completes:
+
+    {"key": "tv:1396:1:2", "type": "tv", "tmdbId": "1396", "season": 1, "episode": 2,
+     "ok": true, "elapsedMs": 812, "result": {...}}            ("error" instead of "result" on failure)
+
+With --out FILE, results are appended to FILE, and titles whose key is
+already in it are skipped, so an interrupted batch resumes where it stopped
+(--retry-errors also redoes the ones recorded as failed).
+
+Usage:
+    python -m common.batch --provider <name> [FILE|-] [--out FILE] [--workers N]
+                           [--deadline S] [--retry-errors] [--parse-workers N|auto] [--verbose]
+    python watch32/watch32_test.py batch [FILE|-] [...]       (same options)
+"""
+
+import os
+import sys
+import json
+import time
+import contextlib
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+
+from common import deadline, metrics, parsepool
+
+DEFAULT_WORKERS = 8
+# Titles read ahead of the workers, so a huge input file isn't loaded at once
+QUEUE_FACTOR = 4
+
+
+def parse_line(line):
+    """One input line → (kind, tmdb_id, season, episode), or None for blanks and comments."""
+    parts = line.split("#", 1)[0].replace(",", " ").split()
+    if not parts:
+        return None
+    kind = None
+    if parts[0].lower() in ("movie", "tv"):
+        kind, parts = parts[0].lower(), parts[1:]
+    if not parts or not parts[0].isdigit():
+        raise ValueError(f"expected a TMDB id: {line.strip()!r}")
+    if len(parts) >= 3:
+        return "tv", parts[0], int(parts[1]), int(parts[2])
+    if kind == "tv":
+        raise ValueError(f"tv needs a season and an episode: {line.strip()!r}")
+    return "movie", parts[0], None, None
+
+
+def key_of(kind, tmdb_id, season=None, episode=None):
+    return f"movie:{tmdb_id}" if kind == "movie" else f"tv:{tmdb_id}:{season}:{episode}"
+
+
+def done_keys(path, retry_errors=False):
+    """Keys already recorded in a previous run's output (only successes with retry_errors)."""
+    keys = set()
+    if not path or not os.path.exists(path):
+        return keys
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            try:
+                record = json.loads(line)
+            except ValueError:
+                continue  # torn last line of an interrupted run
+            if record.get("key") and (record.get("ok") or not retry_errors):
+                keys.add(record["key"])
+    return keys
+
+
+def resolve_one(api_movie, api_tv, kind, tmdb_id, season, episode, seconds=None):
+    """Run one lookup → its output record; failures are recorded, never raised."""
+    started = time.monotonic()
+    record = {
+        "key": key_of(kind, tmdb_id, season, episode),
+        "type": kind,
+        "tmdbId": str(tmdb_id),
+        "season": season,
+        "episode": episode,
+    }
+    try:
+        with deadline.deadline_scope(seconds):
+            body = api_movie(tmdb_id) if kind == "movie" else api_tv(tmdb_id, season, episode)
+        if isinstance(body, dict) and body.get("error"):
+            record.update(ok=False, error=body["error"])
+        else:
+            record.update(ok=True, result=body)
+    except Exception as e:
+        record.update(ok=False, error=str(e) or type(e).__name__)
+    record["elapsedMs"] = int((time.monotonic() - started) * 1000)
+    return record
+
+
+def titles(lines, errors):
+    """Parsed, de-duplicated titles of the input; bad lines are reported to errors."""
+    seen = set()
+    for number, line in enumerate(lines, 1):
+        try:
+            title = parse_line(line)
+        except ValueError as e:
+            errors.append(f"line {number}: {e}")
+            continue
+        if title is None:
+            continue
+        key = key_of(*title)
+        if key not in seen:
+            seen.add(key)
+            yield key, title
+
+
+def run_batch(lines, api_movie, api_tv, out, workers=DEFAULT_WORKERS, skip=(), seconds=None):
+    """
+    Resolve every title of lines on `workers` threads, writing each record to
+    out (a text stream) as it completes. Returns {"ok", "failed", "skipped", "invalid"}.
+    """
+    counts = {"ok": 0, "failed": 0, "skipped": 0, "invalid": 0}
+    errors = []
+    pending = set()
+    pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="batch")
+
+    def drain(block):
+        done, _ = wait(pending, return_when=FIRST_COMPLETED) if block else (
+            {f for f in pending if f.done()}, None)
+        for future in done:
+            pending.discard(future)
+            record = future.result()
+            counts["ok" if record["ok"] else "failed"] += 1
+            out.write(json.dumps(record) + "\n")
+            out.flush()
+
+    try:
+        for key, title in titles(lines, errors):
+            if key in skip:
+                counts["skipped"] += 1
+                continue
+            while len(pending) >= workers * QUEUE_FACTOR:
+                drain(block=True)
+            pending.add(deadline.submit(pool, resolve_one, api_movie, api_tv, *title, seconds))
+            drain(block=False)
+        while pending:
+            drain(block=True)
+    finally:
+        pool.shutdown(wait=False, cancel_futures=True)
+
+    counts["invalid"] = len(errors)
+    for error in errors:
+        print(f"⚠️  {error}", file=sys.stderr)
+    return counts
+
+
+def main(argv, api_movie, api_tv):
+    """CLI entry shared by the scrapers' `batch` subcommand; argv excludes the program and "batch"."""
+    source, out_path, workers, seconds = "-", None, DEFAULT_WORKERS, None
+    retry_errors = verbose = False
+    i = 0
+    while i < len(argv):
+        if argv[i] == "--out" and i + 1 < len(argv):
+            out_path = argv[i + 1]
+            i += 2
+        elif argv[i] == "--workers" and i + 1 < len(argv):
+            workers = max(1, int(argv[i + 1]))
+            i += 2
+        elif argv[i] == "--deadline" and i + 1 < len(argv):
+            seconds = float(argv[i + 1])
+            i += 2
+        elif argv[i] == "--parse-workers" and i + 1 < len(argv):
+            # Large pages are parsed in worker processes (common/parsepool.py)
+            parsepool.configure(parsepool.workers_from(argv[i + 1]))
+            i += 2
+        elif argv[i] == "--retry-errors":
+            retry_errors = True
+            i += 1
+        elif argv[i] == "--verbose":
+            verbose = True
+            i += 1
+        else:
+            source = argv[i]
+            i += 1
+
+    # stdout carries only the JSONL records; scraper progress goes to stderr when asked for
+    metrics.console(enabled=verbose, stream=sys.stderr)
+
+    skip = done_keys(out_path, retry_errors)
+    started = time.monotonic()
+    lines = sys.stdin if source == "-" else open(source, encoding="utf-8")
+    stdout = out = sys.stdout
+    try:
+        if out_path:
+            out = open(out_path, "a", encoding="utf-8")
+            if out.tell() and not _ends_with_newline(out_path):
+                out.write("\n")  # don't glue the first record onto a torn line
+        # Scrapers still print() here and there; keep that off the records
+        with contextlib.redirect_stdout(sys.stderr):
+            counts = run_batch(lines, api_movie, api_tv, out, workers, skip, seconds)
+    finally:
+        if lines is not sys.stdin:
+            lines.close()
+        if out is not stdout:
+            out.close()
+
+    print(
+        f"✅ {counts['ok']} ok, ❌ {counts['failed']} failed, ⏭️  {counts['skipped']} skipped"
+        f"{', ' + str(counts['invalid']) + ' invalid line(s)' if counts['invalid'] else ''}"
+        f" in {time.monotonic() - started:.1f}s",
+        file=sys.stderr,
+    )
+    return counts
+
+
+def _ends_with_newline(path):
+    with open(path, "rb") as f:
+        f.seek(-1, os.SEEK_END)
+        return f.read(1) == b"\n"
+
+
+if __name__ == "__main__":
+    args = sys.argv[1:]
+    if "--provider" not in args or args.index("--provider") + 1 >= len(args):
+        print(__doc__)
+        sys.exit(1)
+    at = args.index("--provider")
+    name = args[at + 1]
+    del args[at:at + 2]
+
+    from common.providers import load_provider
+    module = load_provider(name)
+    main(args, module.api_movie, module.api_tv)
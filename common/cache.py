@@ -0,0 +1,652 @@
+"""
+TTL cache with pluggable backends.
+
+Backends are picked by URL, from the SCRAPER_CACHE environment variable by
+default:
+    memory://                       per-process dict
+    sqlite:///path/to/cache.sqlite  file shared by every process on the host
+    redis://[[user]:password@]host[:port][/db][?prefix=scraper:]
+                                    any Redis-protocol server, shared by every
+                                    process and node pointed at it
+
+Values must be JSON-serialisable; encodings of COMPRESS_MIN_BYTES or more are
+stored zlib-compressed. Keys are namespaced per TTLCache ("w32:servers:<id>").
+TTLCache.add() is an atomic set-if-absent, for "only one worker does this"
+coordination across processes sharing a backend.
+"""
+
+import os
+import json
+import time
+import zlib
+import socket
+import sqlite3
+import threading
+from collections import OrderedDict
+from contextlib import contextmanager
+from urllib.parse import urlparse, parse_qs, parse_qsl, unquote
+
+DEFAULT_CACHE_URL = "sqlite:///" + os.path.join(
+    os.path.expanduser("~"), ".cache", "cloudflare-provider", "cache.sqlite"
+)
+
+# Expired entries are kept this long so adaptive TTLs can compare old vs new
+STALE_RETENTION = 24 * 3600
+
+# JSON encodings at least this long are stored zlib-compressed
+COMPRESS_MIN_BYTES = 8 * 1024
+
+REDIS_TIMEOUT = 2.0
+REDIS_MAX_IDLE = 8
+
+
+# ─── Backends ────────────────────────────────────────────────────────────────
+#
+# A backend stores (value, expires_at) per key, value being the JSON text or
+# its compressed bytes. add() stores only when the key has no live entry and
+# reports whether it did.
+
+class MemoryBackend:
+    """Process-local backend. Entries are (value, expires_at)."""
+
+    def __init__(self):
+        self._data = {}
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            return self._data.get(key)
+
+    def set(self, key, value, expires_at):
+        with self._lock:
+            self._data[key] = (value, expires_at)
+
+    def add(self, key, value, expires_at):
+        with self._lock:
+            current = self._data.get(key)
+            if current is not None and current[1] > time.time():
+                return False
+            self._data[key] = (value, expires_at)
+            return True
+
+    def delete(self, key):
+        with self._lock:
+            self._data.pop(key, None)
+
+
+class SQLiteBackend:
+    """Backend stored in one SQLite file, safe to share between processes."""
+
+    def __init__(self, path):
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self._conn = sqlite3.connect(path, timeout=10, check_same_thread=False)
+        self._lock = threading.Lock()
+        with self._lock:
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            # value is TEXT (JSON) or a BLOB (compressed JSON)
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS cache ("
+                " key TEXT PRIMARY KEY, value TEXT NOT NULL, expires_at REAL NOT NULL)"
+            )
+            self._conn.execute(
+                "DELETE FROM cache WHERE expires_at < ?", (time.time() - STALE_RETENTION,)
+            )
+            self._conn.commit()
+
+    def get(self, key):
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT value, expires_at FROM cache WHERE key = ?", (key,)
+            ).fetchone()
+        return (row[0], row[1]) if row else None
+
+    def set(self, key, value, expires_at):
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO cache (key, value, expires_at) VALUES (?, ?, ?)",
+                (key, value, expires_at),
+            )
+            self._conn.commit()
+
+    def add(self, key, value, expires_at):
+        # One statement, so the check and the write are atomic across processes
+        with self._lock:
+            cursor = self._conn.execute(
+                "INSERT INTO cache (key, value, expires_at) VALUES (?, ?, ?)"
+                " ON CONFLICT (key) DO UPDATE SET value = excluded.value, expires_at = excluded.expires_at"
+                " WHERE cache.expires_at <= ?",
+                (key, value, expires_at, time.time()),
+            )
+            self._conn.commit()
+        return cursor.rowcount == 1
+
+    def delete(self, key):
+        with self._lock:
+            self._conn.execute("DELETE FROM cache WHERE key = ?", (key,))
+            self._conn.commit()
+
+
+class RedisError(Exception):
+    """Error reply from the Redis server."""
+
+
+class _RespConnection:
+    """One socket speaking RESP2, the Redis wire protocol."""
+
+    def __init__(self, host, port, timeout):
+        self.sock = socket.create_connection((host, port), timeout=timeout)
+        self.sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        self.reader = self.sock.makefile("rb")
+
+    def command(self, *args):
+        parts = [b"*%d\r\n" % len(args)]
+        for arg in args:
+            if not isinstance(arg, bytes):
+                arg = str(arg).encode("utf-8")
+            parts.append(b"$%d\r\n%s\r\n" % (len(arg), arg))
+        self.sock.sendall(b"".join(parts))
+        return self._reply()
+
+    def _reply(self):
+        line = self.reader.readline()
+        if not line.endswith(b"\r\n"):
+            raise ConnectionError("Redis connection closed")
+        kind, body = line[:1], line[1:-2]
+        if kind == b"+":
+            return body.decode("utf-8")
+        if kind == b"-":
+            raise RedisError(body.decode("utf-8", "replace"))
+        if kind == b":":
+            return int(body)
+        if kind == b"$":
+            size = int(body)
+            if size < 0:
+                return None
+            data = self.reader.read(size + 2)
+            if len(data) != size + 2:
+                raise ConnectionError("Redis connection closed")
+            return data[:-2]
+        if kind == b"*":
+            size = int(body)
+            return None if size < 0 else [self._reply() for _ in range(size)]
+        raise ConnectionError(f"Unexpected Redis reply: {line[:40]!r}")
+
+    def close(self):
+        try:
+            self.reader.close()
+            self.sock.close()
+        except OSError:
+            pass
+
+
+class RedisBackend:
+    """
+    Backend on a Redis-protocol server (Redis, Valkey, KeyDB, ...).
+
+    Each entry is one string, "<expires_at>\\n<value>", whose server-side
+    expiry is STALE_RETENTION past expires_at so stale reads keep working.
+    Connections are pooled; one that fails is dropped and the command retried
+    once on a fresh one.
+    """
+
+    def __init__(self, url, timeout=REDIS_TIMEOUT):
+        parsed = urlparse(url)
+        self.host = parsed.hostname or "localhost"
+        self.port = parsed.port or 6379
+        self.username = unquote(parsed.username) if parsed.username else None
+        self.password = unquote(parsed.password) if parsed.password else None
+        self.db = int(parsed.path.strip("/") or 0)
+        self.prefix = parse_qs(parsed.query).get("prefix", ["scraper:"])[0]
+        self.timeout = timeout
+        self._idle = []
+        self._lock = threading.Lock()
+
+    def _connect(self):
+        conn = _RespConnection(self.host, self.port, self.timeout)
+        try:
+            if self.password is not None:
+                if self.username:
+                    conn.command("AUTH", self.username, self.password)
+                else:
+                    conn.command("AUTH", self.password)
+            if self.db:
+                conn.command("SELECT", self.db)
+        except Exception:
+            conn.close()
+            raise
+        return conn
+
+    @contextmanager
+    def _connection(self):
+        with self._lock:
+            conn = self._idle.pop() if self._idle else None
+        if conn is None:
+            conn = self._connect()
+        try:
+            yield conn
+        except BaseException:
+            # Its state (unread reply, open MULTI) is unknown: never reuse it
+            conn.close()
+            raise
+        with self._lock:
+            if len(self._idle) < REDIS_MAX_IDLE:
+                self._idle.append(conn)
+                return
+        conn.close()
+
+    def _command(self, *args):
+        try:
+            with self._connection() as conn:
+                return conn.command(*args)
+        except (OSError, ConnectionError):
+            # A pooled connection the server has since closed; one retry on a new one
+            with self._connection() as conn:
+                return conn.command(*args)
+
+    def _key(self, key):
+        return self.prefix + key
+
+    @staticmethod
+    def _pack(value, expires_at):
+        if isinstance(value, str):
+            value = value.encode("utf-8")
+        return b"%.3f\n%s" % (expires_at, value)
+
+    @staticmethod
+    def _retention_ms(expires_at):
+        return max(1, int((expires_at - time.time() + STALE_RETENTION) * 1000))
+
+    def get(self, key):
+        raw = self._command("GET", self._key(key))
+        if raw is None:
+            return None
+        expires_at, _, value = raw.partition(b"\n")
+        return value, float(expires_at)
+
+    def set(self, key, value, expires_at):
+        self._command("SET", self._key(key), self._pack(value, expires_at),
+                      "PX", self._retention_ms(expires_at))
+
+    def add(self, key, value, expires_at):
+        key = self._key(key)
+        packed = self._pack(value, expires_at)
+        retention = self._retention_ms(expires_at)
+        if self._command("SET", key, packed, "NX", "PX", retention) is not None:
+            return True
+        # Only a stale entry may be replaced: WATCH makes the check-and-set atomic
+        with self._connection() as conn:
+            conn.command("WATCH", key)
+            raw = conn.command("GET", key)
+            if raw is not None and float(raw.partition(b"\n")[0]) > time.time():
+                conn.command("UNWATCH")
+                return False
+            conn.command("MULTI")
+            conn.command("SET", key, packed, "PX", retention)
+            return conn.command("EXEC") is not None
+
+    def delete(self, key):
+        self._command("DEL", self._key(key))
+
+
+_BACKENDS = {}
+_BACKENDS_LOCK = threading.Lock()
+
+
+def open_backend(url=None):
+    """Return the (process-wide shared) backend for a cache URL."""
+    url = url or os.environ.get("SCRAPER_CACHE", DEFAULT_CACHE_URL)
+    with _BACKENDS_LOCK:
+        backend = _BACKENDS.get(url)
+        if backend is None:
+            parsed = urlparse(url)
+            if parsed.scheme == "memory":
+                backend = MemoryBackend()
+            elif parsed.scheme == "sqlite":
+                backend = SQLiteBackend(os.path.expanduser(url[len("sqlite:///"):]))
+            elif parsed.scheme == "redis":
+                backend = RedisBackend(url)
+            else:
+                raise ValueError(f"Unsupported cache backend: {url}")
+            _BACKENDS[url] = backend
+        return backend
+
+
+def encode(value):
+    """JSON text, or zlib-compressed JSON bytes once it reaches COMPRESS_MIN_BYTES."""
+    text = json.dumps(value)
+    if len(text) < COMPRESS_MIN_BYTES:
+        return text
+    return zlib.compress(text.encode("utf-8"))
+
+
+def decode(raw):
+    # A zlib stream starts with 0x78 ("x"), which no JSON text can
+    if isinstance(raw, (bytes, bytearray, memoryview)) and bytes(raw[:1]) == b"x":
+        raw = zlib.decompress(raw)
+    return json.loads(raw)
+
+
+# ─── Cache ───────────────────────────────────────────────────────────────────
+
+class Entry:
+    """A cached value with its expiry; stale entries are still readable."""
+
+    __slots__ = ("value", "expires_at")
+
+    def __init__(self, value, expires_at):
+        self.value = value
+        self.expires_at = expires_at
+
+    @property
+    def expired(self):
+        return time.time() >= self.expires_at
+
+
+class TTLCache:
+    """Namespaced view over a backend."""
+
+    def __init__(self, namespace, backend=None):
+        self.namespace = namespace
+        self._backend = backend
+
+    @property
+    def backend(self):
+        # Opened on first use so importing a scraper never touches the disk
+        if self._backend is None:
+            try:
+                self._backend = open_backend()
+            except Exception:
+                self._backend = MemoryBackend()
+        return self._backend
+
+    def _key(self, key):
+        return f"{self.namespace}:{key}"
+
+    def get_entry(self, key):
+        """Return the Entry for key, even if expired, or None."""
+        try:
+            raw = self.backend.get(self._key(key))
+        except Exception:
+            return None
+        if raw is None:
+            return None
+        return Entry(decode(raw[0]), raw[1])
+
+    def get(self, key, default=None):
+        entry = self.get_entry(key)
+        if entry is None or entry.expired:
+            return default
+        return entry.value
+
+    def set(self, key, value, ttl):
+        try:
+            self.backend.set(self._key(key), encode(value), time.time() + ttl)
+        except Exception:
+            # A cache that cannot be written is just a cache miss next time
+            pass
+
+    def add(self, key, value, ttl):
+        """
+        Store value only if key has no live entry; True if this call stored it.
+        Atomic across every process sharing the backend. An unreachable
+        backend also returns True: without it nobody can coordinate, and
+        duplicate work beats none.
+        """
+        try:
+            return self.backend.add(self._key(key), encode(value), time.time() + ttl)
+        except Exception:
+            return True
+
+    def delete(self, key):
+        try:
+            self.backend.delete(self._key(key))
+        except Exception:
+            pass
+
+    def expire(self, key):
+        """Mark an entry expired now, keeping its value for lifetime tracking."""
+        entry = self.get_entry(key)
+        if entry is not None and not entry.expired:
+            try:
+                self.backend.set(self._key(key), encode(entry.value), time.time())
+            except Exception:
+                pass
+
+
+class AdaptiveTTLCache(TTLCache):
+    """
+    Cache whose TTL follows the observed lifetime of the values.
+    When an entry expires and the refetched value is unchanged, the next TTL is
+    doubled (up to max_ttl); when it changed, the TTL is halved (down to
+    min_ttl). An entry cut short with expire() (its value stopped working
+    before the TTL ran out) also halves the TTL, whatever the refetch returns.
+    """
+
+    def __init__(self, namespace, default_ttl, min_ttl, max_ttl, backend=None):
+        super().__init__(namespace, backend)
+        self.default_ttl = default_ttl
+        self.min_ttl = min_ttl
+        self.max_ttl = max_ttl
+
+    def get_or_fetch(self, key, fetch):
+        entry = self.get_entry(key)
+        if entry is not None and not entry.expired:
+            return entry.value["data"]
+
+        data = fetch()
+        if not data:
+            return data
+
+        ttl = self.default_ttl
+        if entry is not None:
+            previous_ttl = entry.value.get("ttl", self.default_ttl)
+            if entry.value.get("forced"):
+                ttl = max(previous_ttl / 2, self.min_ttl)
+            elif entry.value.get("data") == data:
+                ttl = min(previous_ttl * 2, self.max_ttl)
+            else:
+                ttl = max(previous_ttl / 2, self.min_ttl)
+        self.set(key, {"data": data, "ttl": ttl}, ttl)
+        return data
+
+    def expire(self, key):
+        """Mark an entry expired now and remember it was forced, for the next TTL."""
+        entry = self.get_entry(key)
+        if entry is not None and not entry.expired:
+            try:
+                self.backend.set(self._key(key), encode({**entry.value, "forced": True}), time.time())
+            except Exception:
+                pass
+
+
+# ─── Resolved streams ────────────────────────────────────────────────────────
+
+# Query parameters that hosts use for an absolute expiry
+EXPIRY_PARAMS = {"expires", "expire", "expiry", "exp", "e", "validto", "valid_to"}
+# ... and ones that carry either an expiry or the signing time, which is in the past
+SIGNED_AT_PARAMS = {"token", "t", "ts"}
+
+# Timestamps further out than this are not treated as expiries
+MAX_EXPIRY_HORIZON = 30 * 24 * 3600
+
+
+def _as_epoch(value):
+    if not value.isdigit() or len(value) not in (10, 13):
+        return None
+    return int(value) / (1000 if len(value) == 13 else 1)
+
+
+def url_expiry(url, now=None):
+    """
+    Best-effort absolute expiry (epoch seconds) embedded in a stream URL, from
+    expiry-style query parameters or a bare epoch path segment such as
+    /v4/<sig>/1772002433/... ; None if the URL carries none.
+
+    An explicit expiry parameter counts even when it has already passed (the
+    URL is dead). A signing-time parameter or a path segment only counts when
+    it is in the future, since a past value there is more likely the time the
+    URL was issued, or an id.
+    """
+    now = now or time.time()
+    parsed = urlparse(url)
+    candidates = []
+    for name, value in parse_qsl(parsed.query):
+        name = name.lower()
+        if name in EXPIRY_PARAMS:
+            candidates.append((_as_epoch(value), True))
+        elif name in SIGNED_AT_PARAMS:
+            candidates.append((_as_epoch(value), False))
+    for segment in parsed.path.split("/"):
+        candidates.append((_as_epoch(segment), False))
+    expiries = [
+        ts for ts, explicit in candidates
+        if ts is not None and ts <= now + MAX_EXPIRY_HORIZON and (explicit or ts > now)
+    ]
+    return min(expiries) if expiries else None
+
+
+def ttl_for_urls(urls, default_ttl, margin=120, now=None):
+    """
+    TTL that expires `margin` seconds before the earliest URL expiry; 0 (don't
+    cache) when a URL has expired or expires within the margin.
+    """
+    now = now or time.time()
+    ttl = default_ttl
+    for url in urls:
+        expiry = url_expiry(url, now) if url else None
+        if expiry is not None:
+            ttl = min(ttl, expiry - now - margin)
+    return max(0, ttl)
+
+
+class ResolvedStreamCache(TTLCache):
+    """
+    Final resolved stream results keyed by provider, tmdb_id, season, episode.
+
+    Two tiers: a per-process LRU in front of the shared backend, so a hot
+    title is a dict lookup. Each entry's lifetime comes from the expiry tokens
+    of its stream URLs (ttl_for_urls); once refresh_after of that lifetime has
+    passed the entry is still served, but get_or_resolve() starts one
+    background refresh. Nothing is served past the hard expiry.
+    """
+
+    # How long one refresh may hold the cross-process refresh claim
+    REFRESH_CLAIM_TTL = 120
+
+    def __init__(self, default_ttl=1800, backend=None, max_entries=512, refresh_after=0.75):
+        super().__init__("streams", backend)
+        self.default_ttl = default_ttl
+        self.max_entries = max_entries
+        self.refresh_after = refresh_after
+        self._hot = OrderedDict()  # key → (value, fresh_until, expires_at)
+        self._hot_lock = threading.Lock()
+        self._refreshing = set()
+
+    @staticmethod
+    def stream_key(provider, tmdb_id, season=None, episode=None):
+        # Season 0 (specials) is a real season: keep it apart from "no season"
+        season = "-" if season is None else season
+        episode = "-" if episode is None else episode
+        return f"{provider}:{tmdb_id}:{season}:{episode}"
+
+    def _remember(self, key, hit):
+        with self._hot_lock:
+            self._hot[key] = hit
+            self._hot.move_to_end(key)
+            while len(self._hot) > self.max_entries:
+                self._hot.popitem(last=False)
+
+    def _lookup(self, key):
+        now = time.time()
+        with self._hot_lock:
+            hit = self._hot.get(key)
+            if hit is not None:
+                if hit[2] > now:
+                    self._hot.move_to_end(key)
+                    return hit
+                del self._hot[key]
+
+        entry = self.get_entry(key)
+        if entry is None or entry.expired:
+            return None
+        value = entry.value
+        if isinstance(value, dict) and "fresh_until" in value:
+            hit = (value["data"], value["fresh_until"], entry.expires_at)
+        else:
+            # Written before entries carried a refresh point
+            hit = (value, entry.expires_at, entry.expires_at)
+        self._remember(key, hit)
+        return hit
+
+    def lookup(self, provider, tmdb_id, season=None, episode=None):
+        """(value, needs_refresh) for a live entry, or None."""
+        hit = self._lookup(self.stream_key(provider, tmdb_id, season, episode))
+        if hit is None:
+            return None
+        return hit[0], hit[1] <= time.time()
+
+    def get_streams(self, provider, tmdb_id, season=None, episode=None):
+        hit = self.lookup(provider, tmdb_id, season, episode)
+        return hit[0] if hit else None
+
+    def put_streams(self, provider, tmdb_id, season, episode, value, urls):
+        """Store value with a TTL bounded by the expiry of the given stream URLs."""
+        ttl = ttl_for_urls(urls, self.default_ttl)
+        if ttl > 0:
+            key = self.stream_key(provider, tmdb_id, season, episode)
+            now = time.time()
+            fresh_until = now + ttl * self.refresh_after
+            self.set(key, {"data": value, "fresh_until": fresh_until}, ttl)
+            self._remember(key, (value, fresh_until, now + ttl))
+        return ttl
+
+    def refresh(self, provider, tmdb_id, season, episode, resolve, urls_of):
+        """
+        Re-resolve on a background thread, at most one refresh per key at a
+        time across every process sharing the backend.
+        """
+        key = self.stream_key(provider, tmdb_id, season, episode)
+        with self._hot_lock:
+            if key in self._refreshing:
+                return
+            self._refreshing.add(key)
+        claim = f"refreshing:{key}"
+        if not self.add(claim, True, self.REFRESH_CLAIM_TTL):
+            # Another process is on it; its result reaches us through the backend
+            with self._hot_lock:
+                self._refreshing.discard(key)
+                self._hot.pop(key, None)
+            return
+
+        def run():
+            try:
+                value = resolve()
+                urls = [u for u in urls_of(value) if u] if value else []
+                if urls:
+                    self.put_streams(provider, tmdb_id, season, episode, value, urls)
+            except Exception:
+                pass  # the current entry stays until its hard expiry
+            finally:
+                self.delete(claim)
+                with self._hot_lock:
+                    self._refreshing.discard(key)
+
+        threading.Thread(target=run, name=f"refresh-{key}", daemon=True).start()
+
+    def get_or_resolve(self, provider, tmdb_id, season, episode, resolve, urls_of):
+        """
+        Cached value if live (refreshing it in the background once it is past
+        its refresh point), else resolve() now. Values whose urls_of() is
+        empty are returned but not cached.
+        """
+        hit = self.lookup(provider, tmdb_id, season, episode)
+        if hit is not None:
+            value, needs_refresh = hit
+            if needs_refresh:
+                self.refresh(provider, tmdb_id, season, episode, resolve, urls_of)
+            return value
+        value = resolve()
+        urls = [u for u in urls_of(value) if u] if value else []
+        if urls:
+            self.put_streams(provider, tmdb_id, season, episode, value, urls)
+        return value
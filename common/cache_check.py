@@ -0,0 +1,294 @@
+"""
+Cache Backend Conformance + Benchmark
+Run the same checks against every cache backend: namespaces, TTL and stale
+reads, compression of large values, and atomic set-if-absent under
+concurrency (separate backend instances, as separate processes would have).
+
+The Redis backend is checked against StandInRedis, a small in-process server
+speaking the subset of the Redis protocol the backend uses, unless --redis
+points at a real server.
+
+Usage:
+    python -m common.cache_check                       # memory, sqlite, redis stand-in
+    python -m common.cache_check --redis redis://localhost:6379/15
+    python -m common.cache_check --no-bench
+"""
+
+import os
+import sys
+import time
+import random
+import tempfile
+import threading
+import socketserver
+
+from common.cache import (
+    COMPRESS_MIN_BYTES, MemoryBackend, RedisBackend, SQLiteBackend, TTLCache, decode,
+)
+
+RACERS = 16
+BENCH_OPS = 2000
+
+
+# ─── Redis stand-in ──────────────────────────────────────────────────────────
+
+class StandInRedis(socketserver.ThreadingTCPServer):
+    """
+    In-memory server for GET, SET [NX|XX] [EX|PX], DEL, EXISTS, PTTL, PING,
+    AUTH, SELECT, FLUSHDB and WATCH / UNWATCH / MULTI / EXEC.
+    """
+
+    daemon_threads = True
+    allow_reuse_address = True
+
+    def __init__(self, port=0):
+        super().__init__(("127.0.0.1", port), _StandInHandler)
+        self.data = {}          # key → (value, expires_at or None)
+        self.versions = {}      # key → write counter, for WATCH
+        self.lock = threading.Lock()
+
+    @property
+    def url(self):
+        return f"redis://127.0.0.1:{self.server_address[1]}/0"
+
+    def start(self):
+        threading.Thread(target=self.serve_forever, name="redis-stand-in", daemon=True).start()
+        return self
+
+    def _live(self, key):
+        entry = self.data.get(key)
+        if entry is not None and entry[1] is not None and entry[1] <= time.time():
+            del self.data[key]
+            self._touch(key)
+            entry = None
+        return entry
+
+    def _touch(self, key):
+        self.versions[key] = self.versions.get(key, 0) + 1
+
+    def execute(self, args):
+        """One command (list of bytes) → reply value; holds the lock."""
+        name = args[0].upper()
+        if name == b"PING":
+            return "PONG"
+        if name in (b"AUTH", b"SELECT", b"UNWATCH"):
+            return "OK"
+        if name == b"FLUSHDB":
+            for key in list(self.data):
+                self._touch(key)
+            self.data.clear()
+            return "OK"
+        if name == b"GET":
+            entry = self._live(args[1])
+            return entry[0] if entry else None
+        if name == b"EXISTS":
+            return sum(1 for key in args[1:] if self._live(key))
+        if name == b"DEL":
+            removed = 0
+            for key in args[1:]:
+                if self._live(key):
+                    del self.data[key]
+                    self._touch(key)
+                    removed += 1
+            return removed
+        if name == b"PTTL":
+            entry = self._live(args[1])
+            if entry is None:
+                return -2
+            return -1 if entry[1] is None else int((entry[1] - time.time()) * 1000)
+        if name == b"SET":
+            key, value, options = args[1], args[2], [a.upper() for a in args[3:]]
+            expires_at = None
+            for unit, scale in ((b"EX", 1.0), (b"PX", 0.001)):
+                if unit in options:
+                    expires_at = time.time() + int(options[options.index(unit) + 1]) * scale
+            exists = self._live(key) is not None
+            if (b"NX" in options and exists) or (b"XX" in options and not exists):
+                return None
+            self.data[key] = (value, expires_at)
+            self._touch(key)
+            return "OK"
+        return RuntimeError(f"ERR unknown command '{name.decode()}'")
+
+
+class _StandInHandler(socketserver.StreamRequestHandler):
+    def handle(self):
+        server = self.server
+        watched, queued = None, None
+        while True:
+            args = self._read_command()
+            if args is None:
+                return
+            name = args[0].upper()
+            with server.lock:
+                if name == b"WATCH":
+                    watched = watched or {}
+                    for key in args[1:]:
+                        watched[key] = server.versions.get(key, 0)
+                    reply = "OK"
+                elif name == b"UNWATCH":
+                    watched, reply = None, "OK"
+                elif name == b"MULTI":
+                    queued, reply = [], "OK"
+                elif name == b"EXEC":
+                    changed = watched and any(server.versions.get(k, 0) != v for k, v in watched.items())
+                    reply = None if changed else [server.execute(cmd) for cmd in queued or []]
+                    watched, queued = None, None
+                elif queued is not None:
+                    queued.append(args)
+                    reply = "QUEUED"
+                else:
+                    reply = server.execute(args)
+            self.wfile.write(_encode_reply(reply))
+
+    def _read_command(self):
+        line = self.rfile.readline()
+        if not line.startswith(b"*"):
+            return None
+        args = []
+        for _ in range(int(line[1:])):
+            size = int(self.rfile.readline()[1:])
+            args.append(self.rfile.read(size + 2)[:-2])
+        return args
+
+
+def _encode_reply(value):
+    if value is None:
+        return b"$-1\r\n"
+    if isinstance(value, Exception):
+        return b"-%s\r\n" % str(value).encode()
+    if isinstance(value, str):
+        return b"+%s\r\n" % value.encode()
+    if isinstance(value, int):
+        return b":%d\r\n" % value
+    if isinstance(value, list):
+        return b"*%d\r\n" % len(value) + b"".join(_encode_reply(v) for v in value)
+    return b"$%d\r\n%s\r\n" % (len(value), value)
+
+
+# ─── Checks ──────────────────────────────────────────────────────────────────
+
+def _catalog(items):
+    """Something shaped like the streamflix catalog index."""
+    rng = random.Random(7)
+    return {
+        str(i): {"tmdb": i, "title": f"Title {rng.randrange(10 ** 6)}", "isTV": i % 3 == 0,
+                 "year": 1980 + i % 45, "genres": ["Drama", "Action"][: 1 + i % 2]}
+        for i in range(items)
+    }
+
+
+def run_checks(name, new_backend):
+    """Conformance checks on fresh backends from new_backend(). Returns failure count."""
+    failures = 0
+
+    def check(label, ok, detail=""):
+        nonlocal failures
+        failures += not ok
+        print(f"   {'✅' if ok else '❌'} {name:<7} {label}{'' if ok else '  ' + detail}")
+
+    backend = new_backend()
+    run = f"{time.time_ns()}"
+    a, b = TTLCache(f"check-a:{run}", backend), TTLCache(f"check-b:{run}", backend)
+
+    a.set("k", {"n": 1}, 60)
+    b.set("k", [2], 60)
+    check("namespaces keep equal keys apart", a.get("k") == {"n": 1} and b.get("k") == [2])
+
+    a.set("short", "v", 0.3)
+    live = a.get("short")
+    time.sleep(0.4)
+    entry = a.get_entry("short")
+    check("ttl expires, stale entry stays readable",
+          live == "v" and a.get("short") is None and entry is not None and entry.expired and entry.value == "v")
+
+    a.delete("k")
+    check("delete", a.get("k") is None and b.get("k") == [2])
+
+    catalog = _catalog(3000)
+    a.set("catalog", catalog, 60)
+    raw = backend.get(a._key("catalog"))[0]
+    stored = len(raw)
+    check(f"large values compressed ({stored / 1024:.0f} KiB stored)",
+          isinstance(raw, (bytes, bytearray)) and decode(raw) == catalog
+          and a.get("catalog") == catalog)
+    small = backend.get(a._key("short"))[0]
+    check(f"values under {COMPRESS_MIN_BYTES} bytes stored as JSON", decode(small) == "v")
+
+    first, second = a.add("claim", 1, 60), a.add("claim", 2, 60)
+    check("add sets only when absent", first and not second and a.get("claim") == 1)
+    a.add("stale-claim", 1, 0.2)
+    time.sleep(0.3)
+    check("add replaces an expired entry", a.add("stale-claim", 2, 60) and a.get("stale-claim") == 2)
+
+    # Racers on separate backend instances, as separate worker processes would
+    # be, all replacing one expired entry (the harder case for every backend)
+    a.set("race", -1, 0.1)
+    time.sleep(0.2)
+    caches = [TTLCache(f"check-a:{run}", new_backend()) for _ in range(RACERS)]
+    start = threading.Barrier(RACERS)
+    wins = []
+
+    def race(i):
+        start.wait()
+        if caches[i].add("race", i, 60):
+            wins.append(i)
+
+    threads = [threading.Thread(target=race, args=(i,)) for i in range(RACERS)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    check(f"add is atomic ({RACERS} concurrent racers)",
+          len(wins) == 1 and a.get("race") == wins[0], f"winners: {wins}")
+    return failures
+
+
+def run_benchmark(name, backend):
+    cache = TTLCache(f"bench:{time.time_ns()}", backend)
+    value = {"url": "https://example.com/stream.m3u8", "quality": "1080p", "headers": {"Referer": "x"}}
+    started = time.perf_counter()
+    for i in range(BENCH_OPS):
+        cache.set(i, value, 60)
+    set_rate = BENCH_OPS / (time.perf_counter() - started)
+    started = time.perf_counter()
+    for i in range(BENCH_OPS):
+        cache.get(i)
+    get_rate = BENCH_OPS / (time.perf_counter() - started)
+    print(f"   ⏱️  {name:<7} set {set_rate:9.0f} ops/s   get {get_rate:9.0f} ops/s")
+
+
+def main():
+    bench = "--no-bench" not in sys.argv
+    redis_url = None
+    if "--redis" in sys.argv:
+        redis_url = sys.argv[sys.argv.index("--redis") + 1]
+    if redis_url is None:
+        redis_url = StandInRedis().start().url
+
+    tmp = tempfile.mkdtemp(prefix="cache-check-")
+    sqlite_path = os.path.join(tmp, "cache.sqlite")
+    memory = MemoryBackend()
+    backends = {
+        # One dict per process: its instances share it to model one process
+        "memory": lambda: memory,
+        "sqlite": lambda: SQLiteBackend(sqlite_path),
+        "redis": lambda: RedisBackend(redis_url),
+    }
+
+    print(f"🗄️  Cache backend conformance (redis: {redis_url}):")
+    failures = sum(run_checks(name, new) for name, new in backends.items())
+
+    if bench:
+        print(f"\n⏱️  Cache backend benchmark ({BENCH_OPS} ops):")
+        for name, new in backends.items():
+            run_benchmark(name, new())
+
+    if failures:
+        print(f"\n❌ {failures} check(s) failed")
+        sys.exit(1)
+    print("\n✅ All checks passed")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,107 @@
+"""
+Request-scoped deadlines.
+
+A Deadline is set once per lookup (server.py per request, the CLIs per run,
+the aggregator per provider) and read from a context variable by every stage
+below it, so no signature has to carry it:
+
+    with deadline_scope(20):
+        api_tv(...)            # every Session request inside gets at most
+                               # the remaining budget as its timeout
+
+Work handed to thread pools keeps the deadline when submitted with submit()
+(plain pool.submit does not copy context variables). Once the deadline has
+passed, Session requests, Firebase queries and the provider extraction loop
+raise or stop immediately, and callers return whatever they already have.
+"""
+
+import time
+import contextvars
+from contextlib import contextmanager
+
+import requests
+
+_current = contextvars.ContextVar("deadline", default=None)
+
+# Timeouts derived from a nearly spent budget are never shorter than this
+MIN_TIMEOUT = 0.05
+
+
+class DeadlineExceeded(requests.Timeout):
+    """The request-scoped budget ran out before this stage could start or finish."""
+
+
+class Deadline:
+    __slots__ = ("at", "budget")
+
+    def __init__(self, seconds):
+        self.budget = seconds
+        self.at = time.monotonic() + seconds
+
+    def remaining(self):
+        return self.at - time.monotonic()
+
+    @property
+    def expired(self):
+        return self.remaining() <= 0
+
+    def check(self, stage=""):
+        if self.expired:
+            where = f" before {stage}" if stage else ""
+            raise DeadlineExceeded(f"Deadline of {self.budget:g}s exceeded{where}")
+
+    def timeout(self, cap=None):
+        """Seconds a stage may take: the remaining budget, at most cap."""
+        remaining = max(MIN_TIMEOUT, self.remaining())
+        return remaining if cap is None else min(cap, remaining)
+
+    def cap_requests_timeout(self, timeout):
+        """Cap a requests timeout (seconds or a (connect, read) tuple) to the remaining budget."""
+        if isinstance(timeout, tuple):
+            return tuple(self.timeout(t) for t in timeout)
+        return self.timeout(timeout)
+
+    def earlier(self, other):
+        return other if other is not None and other.at < self.at else self
+
+
+def current():
+    """The deadline of the running lookup, or None."""
+    return _current.get()
+
+
+def remaining_timeout(cap):
+    """cap, shortened to the current deadline's remaining budget if there is one."""
+    deadline = _current.get()
+    return cap if deadline is None else deadline.timeout(cap)
+
+
+def check(stage=""):
+    deadline = _current.get()
+    if deadline is not None:
+        deadline.check(stage)
+
+
+@contextmanager
+def deadline_scope(seconds):
+    """Run the block under a deadline `seconds` from now (or the enclosing one, if sooner)."""
+    if seconds is None:
+        yield _current.get()
+        return
+    deadline = Deadline(seconds).earlier(_current.get())
+    token = _current.set(deadline)
+    try:
+        yield deadline
+    finally:
+        _current.reset(token)
+
+
+def submit(pool, fn, *args, **kwargs):
+    """pool.submit that carries the caller's deadline into the worker thread."""
+    return pool.submit(contextvars.copy_context().run, fn, *args, **kwargs)
+
+
+def bind(fn):
+    """fn wrapped to run under the caller's deadline, for pool.map."""
+    context = contextvars.copy_context()
+    return lambda *args, **kwargs: context.copy().run(fn, *args, **kwargs)
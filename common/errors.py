@@ -0,0 +1,15 @@
+"""
+Errors shared by the scrapers' structured (non-CLI) entry points.
+"""
+
+
+class ApiError(Exception):
+    """A lookup failure that maps to an HTTP status, like the workers' errorResponse()."""
+
+    def __init__(self, message, status=400):
+        super().__init__(message)
+        self.message = message
+        self.status = status
+
+    def to_json(self):
+        return {"error": self.message}
@@ -0,0 +1,385 @@
+"""
+Per-host rate and concurrency limiting for every scraper's HTTP traffic.
+
+Each upstream host gets a HostLimiter with two controls:
+    - a token bucket (requests per second, with a small burst)
+    - an AIMD concurrency window: +1/window per good response, halved on
+      429/503 or when latency climbs well above its baseline
+
+A 429/503 also halves the token rate and honours Retry-After; both recover
+additively while responses stay healthy. Session (a requests.Session) runs
+every request through the limiter of its host, plus the breakers, hedging
+and retry budgets of common/resilience.py.
+
+Limits are configured per host suffix in HOST_LIMITS, or from
+SCRAPER_HOST_LIMITS="host=rate/concurrency,...", e.g. "videostr.net=2/3".
+"""
+
+import os
+import time
+import threading
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeout, as_completed
+from contextlib import contextmanager
+from urllib.parse import urlparse
+
+import requests
+
+from common import deadline as deadlines, metrics, resilience
+
+# host suffix → (requests per second, max concurrency)
+HOST_LIMITS = {
+    "api.themoviedb.org": (20, 8),
+    "watch32.sx": (6, 6),
+    "videostr.net": (3, 4),
+    "script.google.com": (3, 4),
+    "search.pingora.fyi": (2, 2),
+    "yflix.to": (8, 6),
+    "enc-dec.app": (10, 8),
+    "api.streamflix.app": (4, 4),
+}
+DEFAULT_LIMIT = (5, 6)
+
+# Statuses that mean "slow down"
+THROTTLE_STATUSES = {429, 503}
+# Latency above this multiple of the baseline counts as congestion
+LATENCY_FACTOR = 3.0
+# ... but only when it is also this much slower in absolute terms (seconds)
+LATENCY_SLACK = 1.0
+# Longest Retry-After we honour (seconds)
+MAX_RETRY_AFTER = 60
+# Recent throttle events kept for stats()
+EVENT_LOG_SIZE = 50
+
+
+def _env_limits():
+    limits = {}
+    for item in os.environ.get("SCRAPER_HOST_LIMITS", "").split(","):
+        host, _, spec = item.strip().partition("=")
+        rate, _, concurrency = spec.partition("/")
+        try:
+            limits[host] = (float(rate), int(concurrency or DEFAULT_LIMIT[1]))
+        except ValueError:
+            continue
+    return limits
+
+
+class HostLimiter:
+    """Token bucket + AIMD window for one host."""
+
+    def __init__(self, host, rate, max_concurrency):
+        self.host = host
+        self.max_rate = float(rate)
+        self.rate = float(rate)
+        self.min_rate = min(0.2, self.max_rate)
+        self.max_window = max(1, int(max_concurrency))
+        self.window = float(max(1, self.max_window // 2))
+        self.tokens = max(1.0, self.rate)
+        self.refilled_at = time.monotonic()
+        self.paused_until = 0.0
+        self.in_flight = 0
+        self.latency = None      # fast EWMA (seconds)
+        self.baseline = None     # slow EWMA, tracks the uncongested latency
+        self.last_backoff = 0.0
+        self.cond = threading.Condition()
+        self.counts = {"requests": 0, "throttled": 0, "errors": 0, "backoffs": 0, "waited_s": 0.0}
+        self.events = deque(maxlen=EVENT_LOG_SIZE)
+
+    def _refill(self, now):
+        burst = max(1.0, self.rate)
+        self.tokens = min(burst, self.tokens + (now - self.refilled_at) * self.rate)
+        self.refilled_at = now
+
+    def acquire(self, deadline=None):
+        started = time.monotonic()
+        with self.cond:
+            while True:
+                now = time.monotonic()
+                self._refill(now)
+                if deadline is not None:
+                    deadline.check(f"a {self.host} slot")
+                if now < self.paused_until:
+                    wait = self.paused_until - now
+                elif self.in_flight >= int(self.window):
+                    wait = 1.0
+                elif self.tokens < 1:
+                    wait = (1 - self.tokens) / self.rate
+                else:
+                    wait = None
+                if wait is not None:
+                    self.cond.wait(wait if deadline is None else deadline.timeout(wait))
+                else:
+                    self.tokens -= 1
+                    self.in_flight += 1
+                    self.counts["requests"] += 1
+                    self.counts["waited_s"] += now - started
+                    return
+
+    def release(self, status=None, latency=None, retry_after=None):
+        """Feed back one response (status None = connection error)."""
+        with self.cond:
+            self.in_flight -= 1
+            now = time.monotonic()
+            if status is None:
+                self.counts["errors"] += 1
+            elif status in THROTTLE_STATUSES:
+                self.counts["throttled"] += 1
+                self._backoff(now, f"HTTP {status}", rate_too=True)
+                if retry_after:
+                    self.paused_until = max(self.paused_until, now + min(retry_after, MAX_RETRY_AFTER))
+            elif latency is not None:
+                self._observe_latency(now, latency)
+            self.cond.notify_all()
+
+    def _observe_latency(self, now, latency):
+        if self.baseline is None:
+            self.latency = self.baseline = latency
+            return
+        self.latency = 0.7 * self.latency + 0.3 * latency
+        # The baseline follows improvements quickly and degradations slowly
+        self.baseline += (0.2 if latency < self.baseline else 0.01) * (latency - self.baseline)
+        if self.latency > max(self.baseline * LATENCY_FACTOR, self.baseline + LATENCY_SLACK):
+            self._backoff(now, f"latency {self.latency:.2f}s vs {self.baseline:.2f}s")
+        else:
+            # Additive increase: about +1 per window's worth of good responses
+            self.window = min(self.max_window, self.window + 1 / self.window)
+            # ... and the rate is back to its maximum after ~50 good responses
+            self.rate = min(self.max_rate, self.rate + self.max_rate / 50)
+
+    def _backoff(self, now, reason, rate_too=False):
+        # One decrease per round trip, however many responses report the same congestion
+        if now - self.last_backoff < (self.latency or 1.0):
+            return
+        self.last_backoff = now
+        self.window = max(1.0, self.window / 2)
+        if rate_too:
+            self.rate = max(self.min_rate, self.rate / 2)
+            self.tokens = min(self.tokens, 0.0)
+        self.counts["backoffs"] += 1
+        self.events.append({
+            "at": time.time(), "reason": reason,
+            "window": round(self.window, 2), "rate": round(self.rate, 2),
+        })
+
+    @contextmanager
+    def slot(self, deadline=None):
+        """with limiter.slot() as done: resp = ...; done(resp)"""
+        self.acquire(deadline)
+        started = time.monotonic()
+        result = {}
+
+        def done(response):
+            result["status"] = response.status_code
+            result["retry_after"] = _retry_after(response)
+
+        try:
+            yield done
+        finally:
+            self.release(result.get("status"), time.monotonic() - started, result.get("retry_after"))
+
+    def stats(self):
+        with self.cond:
+            return {
+                "rate": round(self.rate, 2),
+                "maxRate": self.max_rate,
+                "window": round(self.window, 2),
+                "maxWindow": self.max_window,
+                "inFlight": self.in_flight,
+                "latencyMs": int(self.latency * 1000) if self.latency is not None else None,
+                "baselineMs": int(self.baseline * 1000) if self.baseline is not None else None,
+                "pausedFor": max(0.0, round(self.paused_until - time.monotonic(), 1)),
+                **{k: round(v, 2) if isinstance(v, float) else v for k, v in self.counts.items()},
+                "events": list(self.events),
+            }
+
+
+def _retry_after(response):
+    value = response.headers.get("Retry-After", "")
+    return float(value) if value.replace(".", "", 1).isdigit() else None
+
+
+# ─── Registry ────────────────────────────────────────────────────────────────
+
+_limiters = {}
+_limiters_lock = threading.Lock()
+_overrides = {}
+
+
+def configure(limits):
+    """Set (rate, concurrency) per host suffix; applies to limiters created afterwards."""
+    _overrides.update(limits)
+
+
+def _limit_for(host):
+    table = {**HOST_LIMITS, **_overrides, **_env_limits()}
+    parts = host.split(".")
+    for i in range(len(parts) - 1):
+        suffix = ".".join(parts[i:])
+        if suffix in table:
+            return table[suffix]
+    return DEFAULT_LIMIT
+
+
+def limiter_for(url):
+    host = (urlparse(url).hostname or "").lower()
+    with _limiters_lock:
+        limiter = _limiters.get(host)
+        if limiter is None:
+            rate, concurrency = _limit_for(host)
+            limiter = _limiters[host] = HostLimiter(host, rate, concurrency)
+        return limiter
+
+
+def stats():
+    """{host: limiter stats} for every host contacted so far."""
+    with _limiters_lock:
+        limiters = dict(_limiters)
+    return {host: limiter.stats() for host, limiter in sorted(limiters.items())}
+
+
+# ─── Session ─────────────────────────────────────────────────────────────────
+
+# Applied when a caller passes no timeout: (connect, read) seconds
+DEFAULT_TIMEOUT = (10, 30)
+# Retries for idempotent requests (connection errors, timeouts, 5xx, 429)
+DEFAULT_RETRIES = 2
+IDEMPOTENT_METHODS = {"GET", "HEAD", "OPTIONS"}
+# Slow, bursty hops whose idempotent requests are hedged by default
+HEDGED_HOSTS = {"script.google.com", "script.googleusercontent.com", "search.pingora.fyi", "enc-dec.app"}
+
+_HEDGE_POOL = ThreadPoolExecutor(max_workers=32, thread_name_prefix="hedge")
+
+
+def _failed(response):
+    return response.status_code >= 500 or response.status_code in THROTTLE_STATUSES
+
+
+def _close_quietly(future):
+    try:
+        future.result().close()
+    except Exception:
+        pass
+
+
+class Session(requests.Session):
+    """
+    requests.Session whose requests wait for their host's limiter, with the
+    resilience layer of common/resilience.py on top: a default timeout, a
+    circuit breaker per endpoint, budgeted jittered retries and hedging.
+
+    Extra keyword arguments per request:
+        idempotent=True   allow retries / hedging for a POST that is safe to repeat
+        hedge=True|False  force hedging on or off (default: HEDGED_HOSTS, idempotent only)
+        retries=N         retry count for idempotent requests (default DEFAULT_RETRIES)
+    """
+
+    def __init__(self, pool_maxsize=16):
+        super().__init__()
+        adapter = requests.adapters.HTTPAdapter(pool_connections=32, pool_maxsize=pool_maxsize)
+        self.mount("https://", adapter)
+        self.mount("http://", adapter)
+
+    def _send_once(self, method, url, args, kwargs, deadline=None):
+        with limiter_for(url).slot(deadline) as done:
+            response = super().request(method, url, *args, **kwargs)
+            done(response)
+            return response
+
+    def _send_hedged(self, method, url, args, kwargs, latencies, deadline=None):
+        first = _HEDGE_POOL.submit(self._send_once, method, url, args, kwargs, deadline)
+        hedge_delay = latencies.hedge_delay()
+        if deadline is not None and deadline.remaining() < hedge_delay:
+            # No time left for a second copy to help
+            return first.result()
+        try:
+            return first.result(timeout=hedge_delay)
+        except FutureTimeout:
+            pass
+        latencies.hedges += 1
+        second = _HEDGE_POOL.submit(self._send_once, method, url, args, kwargs, deadline)
+        error = None
+        for future in as_completed((first, second)):
+            try:
+                response = future.result()
+            except Exception as e:
+                error = e
+                continue
+            if future is second:
+                latencies.hedge_wins += 1
+            # The slower copy is dropped when it lands
+            (second if future is first else first).add_done_callback(_close_quietly)
+            return response
+        raise error
+
+    def request(self, method, url, *args, idempotent=None, hedge=None, retries=None, **kwargs):
+        method = method.upper()
+        kwargs.setdefault("timeout", DEFAULT_TIMEOUT)
+        host = (urlparse(url).hostname or "").lower()
+        endpoint = resilience.endpoint_of(url)
+        idempotent = method in IDEMPOTENT_METHODS if idempotent is None else idempotent
+        retries = (DEFAULT_RETRIES if idempotent else 0) if retries is None else retries
+        if hedge is None:
+            hedge = idempotent and host in HEDGED_HOSTS and not kwargs.get("stream")
+
+        breaker = resilience.breaker(endpoint)
+        latencies = resilience.tracker(endpoint)
+        retry_budget = resilience.budget(host)
+        retry_budget.deposit()
+        deadline = deadlines.current()
+
+        attempt = 0
+        while True:
+            call_kwargs = kwargs
+            if deadline is not None:
+                deadline.check(f"{method} {endpoint}")
+                # Each attempt may use at most what is left of the lookup's budget
+                call_kwargs = {**kwargs, "timeout": deadline.cap_requests_timeout(kwargs["timeout"])}
+            probe = breaker.check()
+            settled = False
+            started = time.monotonic()
+            try:
+                try:
+                    if hedge:
+                        response = self._send_hedged(method, url, args, call_kwargs, latencies, deadline)
+                    else:
+                        response = self._send_once(method, url, args, call_kwargs, deadline)
+                except deadlines.DeadlineExceeded:
+                    raise
+                except requests.RequestException as e:
+                    if deadline is not None and deadline.expired:
+                        # Our budget ran out, not the endpoint: don't count it against the breaker
+                        raise deadlines.DeadlineExceeded(f"Deadline exceeded during {method} {endpoint}") from e
+                    breaker.record_failure()
+                    settled = True
+                    if attempt < retries and retry_budget.withdraw():
+                        self._sleep_before_retry(attempt, deadline)
+                        attempt += 1
+                        continue
+                    raise
+
+                if not kwargs.get("stream"):
+                    metrics.add_bytes(len(response.content or b""))
+                if not _failed(response):
+                    breaker.record_success()
+                    settled = True
+                    latencies.add(time.monotonic() - started)
+                    return response
+                breaker.record_failure()
+                settled = True
+                if attempt < retries and retry_budget.withdraw():
+                    response.close()
+                    self._sleep_before_retry(attempt, deadline)
+                    attempt += 1
+                    continue
+                return response
+            finally:
+                # No verdict on the endpoint (deadline, interrupt): hand the probe back
+                if probe and not settled:
+                    breaker.release_probe()
+
+    @staticmethod
+    def _sleep_before_retry(attempt, deadline):
+        delay = resilience.backoff_delay(attempt)
+        if deadline is not None:
+            delay = min(delay, max(0.0, deadline.remaining()))
+        time.sleep(delay)
@@ -0,0 +1,618 @@
+"""
+Durable job queue for large crawls: whole shows, seasons, provider catalogs.
+
+A crawl is a tree of jobs in one SQLite file, one row per unit of work:
+
+    title    (provider, tmdb id, movie/tv)  → season jobs, or for a movie its server jobs
+    season   (tmdb id, season)              → one episode job per aired episode (TMDB)
+    episode  (tmdb id, season, episode)     → provider map + list_servers → server jobs
+    server   (target, server)               → provider extract → links
+
+Each row carries its state (pending → running → done | failed), attempts, and
+its result or last error. A job's completion and the children it spawns are
+committed in one transaction, so a crawl killed at any point (Ctrl-C, crash,
+reboot) resumes exactly where it stopped: jobs that were running when it died
+are picked up again once their lease runs out, or at once when the runner
+was stopped cleanly. Failed attempts are retried with exponential backoff
+up to --max-attempts.
+
+When every server job of an episode (or movie) has settled, the links found
+are stored where Provider.resolve() looks first (common/providers.py), so a
+crawl pre-warms the server and the CLIs. Several runner processes can work
+on the same file; claims are atomic.
+
+Usage:
+    python -m common.jobs [--db FILE] add <provider> movie <tmdb_id>
+    python -m common.jobs [--db FILE] add <provider> tv <tmdb_id> [season [episode]]
+    python -m common.jobs [--db FILE] add <provider> catalog       (providers with a catalog, e.g. streamflix)
+    python -m common.jobs [--db FILE] add <provider> FILE|-        (lines as above: "tv 1396 2", "movie 550")
+    python -m common.jobs [--db FILE] run [--workers N] [--deadline S] [--max-attempts N]
+                                          [--provider NAME] [--follow] [--verbose]
+    python -m common.jobs [--db FILE] status
+    python -m common.jobs [--db FILE] retry-failed
+    python -m common.jobs [--db FILE] export [--kind KIND]         (JSONL, finished jobs)
+"""
+
+import os
+import sys
+import json
+import time
+import socket
+import sqlite3
+import threading
+from datetime import date
+
+from common import deadline, metrics
+
+DEFAULT_DB = os.path.join(os.path.expanduser("~"), ".cache", "cloudflare-provider", "jobs.sqlite")
+DEFAULT_WORKERS = 8
+DEFAULT_MAX_ATTEMPTS = 3
+# Per-job deadline (seconds); a lease outlives it, so a live worker never loses its job
+JOB_DEADLINE = 120.0
+LEASE = 300.0
+RETRY_BASE = 30.0
+RETRY_MAX = 3600.0
+# Idle runner poll interval (seconds)
+POLL = 2.0
+# On Ctrl-C, how long running jobs get to finish before they are handed back
+STOP_GRACE = 10.0
+
+# Deeper kinds are claimed first, so episodes finish (and warm the cache)
+# before the crawl fans out further
+DEPTH = {"title": 0, "season": 1, "episode": 2, "server": 3}
+
+TMDB_API_KEY = os.environ.get("TMDB_API_KEY", "297f1b91919bae59d50ed815f8d2e14c")
+TMDB_API_BASE = "https://api.themoviedb.org/3"
+TMDB_TTL = 24 * 3600
+
+
+# ─── Queue ───────────────────────────────────────────────────────────────────
+
+class Job:
+    __slots__ = ("id", "key", "kind", "provider", "payload", "parent", "attempts")
+
+    def __init__(self, id, key, kind, provider, payload, parent, attempts):
+        self.id = id
+        self.key = key
+        self.kind = kind
+        self.provider = provider
+        self.payload = json.loads(payload)
+        self.parent = parent
+        self.attempts = attempts
+
+
+class JobQueue:
+    """The jobs table of one SQLite file; safe to share between threads and processes."""
+
+    def __init__(self, path=DEFAULT_DB, max_attempts=DEFAULT_MAX_ATTEMPTS):
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self.max_attempts = max_attempts
+        self.worker = f"{socket.gethostname()}:{os.getpid()}"
+        # Autocommit mode: every write below is its own explicit transaction
+        self._conn = sqlite3.connect(path, timeout=30, check_same_thread=False, isolation_level=None)
+        self._lock = threading.Lock()
+        with self._lock:
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS jobs ("
+                " id INTEGER PRIMARY KEY,"
+                " key TEXT NOT NULL UNIQUE,"
+                " kind TEXT NOT NULL,"
+                " depth INTEGER NOT NULL,"
+                " provider TEXT NOT NULL,"
+                " payload TEXT NOT NULL,"
+                " parent INTEGER,"
+                " state TEXT NOT NULL DEFAULT 'pending',"
+                " attempts INTEGER NOT NULL DEFAULT 0,"
+                " result TEXT,"
+                " error TEXT,"
+                " not_before REAL NOT NULL DEFAULT 0,"
+                " lease_until REAL,"
+                " worker TEXT,"
+                " updated_at REAL NOT NULL)"
+            )
+            self._conn.execute("CREATE INDEX IF NOT EXISTS jobs_state ON jobs (state, depth, id)")
+            self._conn.execute("CREATE INDEX IF NOT EXISTS jobs_parent ON jobs (parent, state)")
+
+    def _insert(self, jobs, parent=None):
+        now = time.time()
+        inserted = 0
+        for key, kind, provider, payload in jobs:
+            inserted += self._conn.execute(
+                "INSERT OR IGNORE INTO jobs (key, kind, depth, provider, payload, parent, updated_at)"
+                " VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (key, kind, DEPTH[kind], provider, json.dumps(payload), parent, now),
+            ).rowcount
+        return inserted
+
+    def add(self, jobs):
+        """Enqueue (key, kind, provider, payload) tuples; keys already queued are skipped. Returns the count added."""
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                inserted = self._insert(jobs)
+                self._conn.execute("COMMIT")
+            except BaseException:
+                self._conn.execute("ROLLBACK")
+                raise
+        return inserted
+
+    def claim(self, provider=None):
+        """Lease the next ready job to this worker, or None."""
+        now = time.time()
+        query = (
+            "SELECT id, key, kind, provider, payload, parent, attempts FROM jobs"
+            " WHERE ((state = 'pending' AND not_before <= ?) OR (state = 'running' AND lease_until < ?))"
+        )
+        args = [now, now]
+        if provider:
+            query += " AND provider = ?"
+            args.append(provider)
+        query += " ORDER BY depth DESC, id LIMIT 1"
+        with self._lock:
+            # IMMEDIATE takes the write lock up front: no other process can claim the same row
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                row = self._conn.execute(query, args).fetchone()
+                if row is not None:
+                    self._conn.execute(
+                        "UPDATE jobs SET state = 'running', attempts = attempts + 1, lease_until = ?,"
+                        " worker = ?, updated_at = ? WHERE id = ?",
+                        (now + LEASE, self.worker, now, row[0]),
+                    )
+                self._conn.execute("COMMIT")
+            except BaseException:
+                self._conn.execute("ROLLBACK")
+                raise
+        if row is None:
+            return None
+        job = Job(*row)
+        job.attempts += 1
+        return job
+
+    def _settled(self, parent):
+        """True once a parent's children are all done or failed (call inside a transaction)."""
+        if parent is None:
+            return False
+        row = self._conn.execute(
+            "SELECT COUNT(*) FROM jobs WHERE parent = ? AND state NOT IN ('done', 'failed')", (parent,)
+        ).fetchone()
+        return row[0] == 0
+
+    def complete(self, job, result, children=()):
+        """
+        Record a job's result and enqueue its children, atomically. Returns
+        the parent id when this settled the parent's last child, else None.
+        """
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                self._conn.execute(
+                    "UPDATE jobs SET state = 'done', result = ?, error = NULL, lease_until = NULL,"
+                    " updated_at = ? WHERE id = ?",
+                    (json.dumps(result), time.time(), job.id),
+                )
+                self._insert(children, parent=job.id)
+                settled = self._settled(job.parent)
+                self._conn.execute("COMMIT")
+            except BaseException:
+                self._conn.execute("ROLLBACK")
+                raise
+        return job.parent if settled else None
+
+    def fail(self, job, error):
+        """
+        Record a failed attempt: retried after a backoff, or failed for good
+        after max_attempts. Returns the parent id when this settled it, else None.
+        """
+        final = job.attempts >= self.max_attempts
+        retry_at = time.time() + min(RETRY_BASE * 2 ** (job.attempts - 1), RETRY_MAX)
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                self._conn.execute(
+                    "UPDATE jobs SET state = ?, error = ?, not_before = ?, lease_until = NULL,"
+                    " updated_at = ? WHERE id = ?",
+                    ("failed" if final else "pending", error, retry_at, time.time(), job.id),
+                )
+                settled = final and self._settled(job.parent)
+                self._conn.execute("COMMIT")
+            except BaseException:
+                self._conn.execute("ROLLBACK")
+                raise
+        return job.parent if settled else None
+
+    def release(self):
+        """Hand this worker's running jobs back (attempt not counted), e.g. on Ctrl-C."""
+        with self._lock:
+            return self._conn.execute(
+                "UPDATE jobs SET state = 'pending', attempts = MAX(attempts - 1, 0), lease_until = NULL,"
+                " updated_at = ? WHERE state = 'running' AND worker = ?",
+                (time.time(), self.worker),
+            ).rowcount
+
+    def recover(self):
+        """
+        Hand back running jobs of runners on this host that no longer exist
+        (killed, crashed), rather than waiting out their lease. POSIX only;
+        elsewhere the lease expiry does it.
+        """
+        if os.name != "posix":
+            return 0
+        host = socket.gethostname()
+        with self._lock:
+            workers = [w for (w,) in self._conn.execute(
+                "SELECT DISTINCT worker FROM jobs WHERE state = 'running'").fetchall() if w]
+        released = 0
+        for worker in workers:
+            worker_host, _, pid = worker.rpartition(":")
+            if worker_host != host or not pid.isdigit() or worker == self.worker:
+                continue
+            try:
+                os.kill(int(pid), 0)
+                continue
+            except ProcessLookupError:
+                pass
+            except PermissionError:
+                continue  # alive, owned by another user
+            with self._lock:
+                released += self._conn.execute(
+                    "UPDATE jobs SET state = 'pending', lease_until = NULL, updated_at = ?"
+                    " WHERE state = 'running' AND worker = ?",
+                    (time.time(), worker),
+                ).rowcount
+        return released
+
+    def retry_failed(self):
+        with self._lock:
+            return self._conn.execute(
+                "UPDATE jobs SET state = 'pending', attempts = 0, not_before = 0, updated_at = ?"
+                " WHERE state = 'failed'",
+                (time.time(),),
+            ).rowcount
+
+    def get(self, job_id):
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT id, key, kind, provider, payload, parent, attempts FROM jobs WHERE id = ?", (job_id,)
+            ).fetchone()
+        return Job(*row) if row else None
+
+    def child_results(self, parent):
+        """Results of a parent's finished children, in id order."""
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT result FROM jobs WHERE parent = ? AND state = 'done' ORDER BY id", (parent,)
+            ).fetchall()
+        return [json.loads(r[0]) for r in rows]
+
+    def pending(self, provider=None):
+        """Jobs not yet finished: pending (including backed-off retries) or running."""
+        query = "SELECT COUNT(*) FROM jobs WHERE state IN ('pending', 'running')"
+        args = ()
+        if provider:
+            query += " AND provider = ?"
+            args = (provider,)
+        with self._lock:
+            return self._conn.execute(query, args).fetchone()[0]
+
+    def counts(self):
+        """{kind: {state: count}}."""
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT kind, state, COUNT(*) FROM jobs GROUP BY kind, state ORDER BY MIN(depth)"
+            ).fetchall()
+        counts = {}
+        for kind, state, n in rows:
+            counts.setdefault(kind, {})[state] = n
+        return counts
+
+    def finished(self, kind=None):
+        """(key, kind, provider, payload, state, attempts, result, error) of done and failed jobs."""
+        query = ("SELECT key, kind, provider, payload, state, attempts, result, error FROM jobs"
+                 " WHERE state IN ('done', 'failed')")
+        args = ()
+        if kind:
+            query += " AND kind = ?"
+            args = (kind,)
+        with self._lock:
+            return self._conn.execute(query + " ORDER BY id", args).fetchall()
+
+
+# ─── Units ───────────────────────────────────────────────────────────────────
+
+def title_job(provider, tmdb_id, kind):
+    return (f"{provider}:title:{kind}:{tmdb_id}", "title", provider, {"tmdb": str(tmdb_id), "type": kind})
+
+
+def season_job(provider, tmdb_id, season):
+    return (f"{provider}:season:{tmdb_id}:{season}", "season", provider, {"tmdb": str(tmdb_id), "season": season})
+
+
+def episode_job(provider, tmdb_id, season, episode):
+    return (f"{provider}:episode:{tmdb_id}:{season}:{episode}", "episode", provider,
+            {"tmdb": str(tmdb_id), "season": season, "episode": episode})
+
+
+def parse_unit(provider, line):
+    """One input line → a job tuple, or None for blanks and comments."""
+    parts = line.split("#", 1)[0].replace(",", " ").split()
+    if not parts:
+        return None
+    kind = parts[0].lower()
+    numbers = parts[1:]
+    if kind not in ("movie", "tv") or not numbers or not all(p.isdigit() for p in numbers):
+        raise ValueError(f"expected 'movie <id>' or 'tv <id> [season [episode]]': {line.strip()!r}")
+    if kind == "movie" or len(numbers) == 1:
+        return title_job(provider, numbers[0], kind)
+    if len(numbers) == 2:
+        return season_job(provider, numbers[0], int(numbers[1]))
+    return episode_job(provider, numbers[0], int(numbers[1]), int(numbers[2]))
+
+
+_tmdb = None
+
+
+def tmdb_get(path):
+    """A TMDB path through the shared "tmdb" cache namespace (same keys as the scrapers)."""
+    global _tmdb
+    if _tmdb is None:
+        from common.cache import TTLCache
+        from common.http import Session
+        _tmdb = (Session(), TTLCache("tmdb"))
+    session, cache = _tmdb
+    data = cache.get(path)
+    if data is None:
+        resp = session.get(f"{TMDB_API_BASE}/{path}", params={"api_key": TMDB_API_KEY}, timeout=15)
+        resp.raise_for_status()
+        data = resp.json()
+        cache.set(path, data, TMDB_TTL)
+    return data
+
+
+def _aired(day):
+    return bool(day) and day <= date.today().isoformat()
+
+
+def _servers(provider, job, tmdb_id, kind, season=None, episode=None):
+    """Map a title on the provider → (result, server jobs)."""
+    target = provider.map(tmdb_id, kind, season, episode)
+    if target is None:
+        return {"found": False}, []
+    servers = provider.list_servers(target) or []
+    children = [
+        (f"{job.key}:server:{i}", "server", job.provider, {"target": target, "server": server})
+        for i, server in enumerate(servers)
+    ]
+    return {"found": True, "target": target, "servers": len(servers)}, children
+
+
+def run_job(provider, job):
+    """Do one unit of work → (result, children)."""
+    p = job.payload
+    if job.kind == "title":
+        if p["type"] == "movie":
+            return _servers(provider, job, p["tmdb"], "movie")
+        show = tmdb_get(f"tv/{p['tmdb']}")
+        seasons = [s["season_number"] for s in show.get("seasons") or []
+                   if s.get("season_number") and _aired(s.get("air_date"))]
+        return {"seasons": seasons}, [season_job(job.provider, p["tmdb"], n) for n in seasons]
+    if job.kind == "season":
+        data = tmdb_get(f"tv/{p['tmdb']}/season/{p['season']}")
+        episodes = [e["episode_number"] for e in data.get("episodes") or [] if _aired(e.get("air_date"))]
+        return {"episodes": episodes}, [episode_job(job.provider, p["tmdb"], p["season"], n) for n in episodes]
+    if job.kind == "episode":
+        return _servers(provider, job, p["tmdb"], "tv", p["season"], p["episode"])
+    if job.kind == "server":
+        return provider.extract(p["target"], p["server"]) or [], []
+    raise ValueError(f"unknown job kind: {job.kind}")
+
+
+def describe(job):
+    p = job.payload
+    if job.kind == "server":
+        return f"{job.provider} server {p['server'].get('name')}"
+    where = f"S{p['season']}" if "season" in p else ""
+    where += f"E{p['episode']}" if "episode" in p else ""
+    return f"{job.provider} {job.kind} {p['tmdb']}{' ' + where if where else ''}"
+
+
+# ─── Runner ──────────────────────────────────────────────────────────────────
+
+def _store_links(queue, providers, parent_id):
+    """All server jobs of a title/episode settled: keep its links for Provider.resolve()."""
+    parent = queue.get(parent_id)
+    links = [link for result in queue.child_results(parent_id) for link in result]
+    if parent is None or not links:
+        return
+    p = parent.payload
+    providers(parent.provider).remember(p["tmdb"], p.get("season"), p.get("episode"), links)
+
+
+def run(queue, workers=DEFAULT_WORKERS, seconds=JOB_DEADLINE, provider=None, follow=False):
+    """
+    Work the queue on `workers` threads until nothing is left (or forever
+    with follow=True). Returns {"done", "retried", "failed"} for this run.
+    """
+    from common.providers import get_provider
+
+    recovered = queue.recover()
+    if recovered:
+        print(f"♻️  {recovered} job(s) of a runner that died picked up again", file=sys.stderr)
+    counts = {"done": 0, "retried": 0, "failed": 0}
+    lock = threading.Lock()
+    stop = threading.Event()
+    busy = [0]
+
+    def work():
+        while not stop.is_set():
+            job = queue.claim(provider)
+            if job is None:
+                with lock:
+                    idle = busy[0] == 0
+                # Busy workers may still enqueue children; retries may be backing off
+                if not follow and idle and queue.pending(provider) == 0:
+                    return
+                stop.wait(POLL)
+                continue
+            with lock:
+                busy[0] += 1
+            try:
+                work_one(job)
+            finally:
+                with lock:
+                    busy[0] -= 1
+
+    def work_one(job):
+        try:
+            with deadline.deadline_scope(seconds):
+                result, children = run_job(get_provider(job.provider), job)
+        except Exception as e:
+            settled = queue.fail(job, str(e) or type(e).__name__)
+            final = job.attempts >= queue.max_attempts
+            with lock:
+                counts["failed" if final else "retried"] += 1
+            print(f"{'❌' if final else '🔁'} {describe(job)} (attempt {job.attempts}): {e}", file=sys.stderr)
+        else:
+            settled = queue.complete(job, result, children)
+            with lock:
+                counts["done"] += 1
+            note = f" → {len(children)} job(s)" if children else ""
+            if job.kind == "server":
+                note = f" → {len(result)} link(s)"
+            print(f"✅ {describe(job)}{note}", file=sys.stderr)
+        if settled is not None and job.kind == "server":
+            try:
+                _store_links(queue, get_provider, settled)
+            except Exception as e:
+                print(f"⚠️  caching links of job {settled}: {e}", file=sys.stderr)
+
+    threads = [threading.Thread(target=work, name=f"jobs-{i}", daemon=True) for i in range(workers)]
+    for t in threads:
+        t.start()
+    try:
+        for t in threads:
+            while t.is_alive():
+                t.join(0.5)
+    except KeyboardInterrupt:
+        stop.set()
+        print("\n⏹️  Stopping; letting running jobs finish...", file=sys.stderr)
+        try:
+            # Workers still in a job would settle it after release() handed it back
+            end = time.monotonic() + STOP_GRACE
+            for t in threads:
+                t.join(max(0.0, end - time.monotonic()))
+        except KeyboardInterrupt:
+            pass
+        finally:
+            released = queue.release()
+        print(f"⏹️  Stopped; {released} running job(s) handed back for the next run", file=sys.stderr)
+    return counts
+
+
+# ─── CLI ─────────────────────────────────────────────────────────────────────
+
+def _option(argv, name, default=None):
+    if name in argv:
+        i = argv.index(name)
+        if i + 1 < len(argv):
+            value = argv[i + 1]
+            del argv[i:i + 2]
+            return value
+    return default
+
+
+def _flag(argv, name):
+    if name in argv:
+        argv.remove(name)
+        return True
+    return False
+
+
+def cmd_add(queue, argv):
+    if len(argv) < 2:
+        print(__doc__)
+        sys.exit(1)
+    provider, what = argv[0], argv[1]
+    from common.providers import PROVIDERS, get_provider
+    if provider not in PROVIDERS:
+        raise SystemExit(f"Unknown provider {provider!r} (one of {', '.join(PROVIDERS)})")
+
+    if what == "catalog":
+        jobs = [title_job(provider, tmdb_id, kind) for tmdb_id, kind in get_provider(provider).catalog()]
+    elif what in ("movie", "tv"):
+        jobs = [parse_unit(provider, " ".join(argv[1:]))]
+    else:
+        lines = sys.stdin if what == "-" else open(what, encoding="utf-8")
+        jobs = []
+        try:
+            for number, line in enumerate(lines, 1):
+                try:
+                    job = parse_unit(provider, line)
+                except ValueError as e:
+                    print(f"⚠️  line {number}: {e}", file=sys.stderr)
+                    continue
+                if job is not None:
+                    jobs.append(job)
+        finally:
+            if lines is not sys.stdin:
+                lines.close()
+    added = queue.add(jobs)
+    print(f"➕ {added} job(s) added, {len(jobs) - added} already queued", file=sys.stderr)
+
+
+def cmd_status(queue):
+    counts = queue.counts()
+    states = ("pending", "running", "done", "failed")
+    print(f"{'kind':<9}" + "".join(f"{s:>10}" for s in states))
+    for kind, by_state in counts.items():
+        print(f"{kind:<9}" + "".join(f"{by_state.get(s, 0):>10}" for s in states))
+
+
+def cmd_export(queue, kind):
+    for key, job_kind, provider, payload, state, attempts, result, error in queue.finished(kind):
+        record = {"key": key, "kind": job_kind, "provider": provider, "payload": json.loads(payload),
+                  "state": state, "attempts": attempts}
+        if state == "done":
+            record["result"] = json.loads(result)
+        else:
+            record["error"] = error
+        print(json.dumps(record))
+
+
+def main(argv):
+    argv = list(argv)
+    db = _option(argv, "--db", os.environ.get("SCRAPER_JOBS_DB", DEFAULT_DB))
+    max_attempts = int(_option(argv, "--max-attempts", DEFAULT_MAX_ATTEMPTS))
+    if not argv:
+        print(__doc__)
+        sys.exit(1)
+    queue = JobQueue(db, max_attempts=max_attempts)
+    command, argv = argv[0], argv[1:]
+
+    if command == "add":
+        cmd_add(queue, argv)
+    elif command == "run":
+        workers = max(1, int(_option(argv, "--workers", DEFAULT_WORKERS)))
+        seconds = float(_option(argv, "--deadline", JOB_DEADLINE))
+        provider = _option(argv, "--provider")
+        follow = _flag(argv, "--follow")
+        # Scraper progress is noise at crawl scale; the runner reports per job
+        metrics.console(enabled=_flag(argv, "--verbose"), stream=sys.stderr)
+        started = time.monotonic()
+        counts = run(queue, workers, seconds, provider, follow)
+        print(f"✅ {counts['done']} done, 🔁 {counts['retried']} to retry, ❌ {counts['failed']} failed"
+              f" in {time.monotonic() - started:.1f}s ({queue.pending(provider)} left)", file=sys.stderr)
+    elif command == "status":
+        cmd_status(queue)
+    elif command == "retry-failed":
+        print(f"🔁 {queue.retry_failed()} failed job(s) queued again", file=sys.stderr)
+    elif command == "export":
+        cmd_export(queue, _option(argv, "--kind"))
+    else:
+        print(__doc__)
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
@@ -0,0 +1,304 @@
+"""
+Per-stage timing spans, latency histograms and progress output.
+
+Every hop of a lookup runs inside a span:
+
+    with span("search", "watch32") as s:
+        ...                    # Session responses add their size to s.bytes
+                               # (stream=True readers call add_bytes themselves)
+        s.outcome = "empty"    # default "ok"; "error"/"timeout" on exceptions
+
+or, for a whole function, @timed("search", "watch32"), which also marks an
+empty/None result as "empty". Finished spans feed one histogram and set of
+counters per (provider, stage), exported by prometheus() (text format 0.0.4)
+and snapshot() (JSON), and served by server.py at /metrics and /stats.
+
+Progress lines go through progress() instead of print(), to the registered
+renderers only: the CLIs keep the console renderer (on by default), while the
+server and the aggregator turn it off or send it to stderr.
+"""
+
+import sys
+import time
+import threading
+import tracemalloc
+import contextvars
+from contextlib import contextmanager
+from functools import wraps
+
+import requests
+
+# Histogram bucket bounds (seconds)
+BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+_current = contextvars.ContextVar("span", default=None)
+_lock = threading.Lock()
+_stages = {}        # (provider, stage) → StageStats
+_renderers = []
+_threads = {}       # thread id → innermost open span, while tracked (common/profiling.py)
+_track_threads = False
+
+
+class Span:
+    __slots__ = ("stage", "provider", "parent", "started", "duration", "bytes", "outcome", "error", "memory")
+
+    def __init__(self, stage, provider, parent):
+        self.stage = stage
+        self.provider = provider
+        self.parent = parent
+        self.started = time.perf_counter()
+        self.duration = None
+        self.bytes = 0
+        self.outcome = "ok"
+        self.error = None
+        # Traced heap size at the start, while tracemalloc is on
+        self.memory = tracemalloc.get_traced_memory()[0] if tracemalloc.is_tracing() else None
+
+    @property
+    def label(self):
+        return f"{self.provider}/{self.stage}" if self.provider else self.stage
+
+    def to_json(self):
+        return {
+            "provider": self.provider,
+            "stage": self.stage,
+            "ms": round(self.duration * 1000, 1) if self.duration is not None else None,
+            "bytes": self.bytes,
+            "outcome": self.outcome,
+        }
+
+
+class StageStats:
+    """Histogram and counters of one (provider, stage)."""
+
+    def __init__(self):
+        self.buckets = [0] * len(BUCKETS)
+        self.count = 0
+        self.sum = 0.0
+        self.bytes = 0
+        self.outcomes = {}
+
+    def add(self, span):
+        for i, bound in enumerate(BUCKETS):
+            if span.duration <= bound:
+                self.buckets[i] += 1
+                break
+        self.count += 1
+        self.sum += span.duration
+        self.bytes += span.bytes
+        self.outcomes[span.outcome] = self.outcomes.get(span.outcome, 0) + 1
+
+    def percentile(self, p):
+        """Upper bucket bound holding the p-th percentile (None when empty or past the last bucket)."""
+        rank = self.count * p / 100
+        seen = 0
+        for bound, n in zip(BUCKETS, self.buckets):
+            seen += n
+            if n and seen >= rank:
+                return bound
+        return None
+
+    def to_json(self):
+        return {
+            "count": self.count,
+            "avgMs": round(self.sum / self.count * 1000, 1) if self.count else None,
+            "p50Ms": _ms(self.percentile(50)),
+            "p90Ms": _ms(self.percentile(90)),
+            "p99Ms": _ms(self.percentile(99)),
+            "bytes": self.bytes,
+            "outcomes": dict(self.outcomes),
+        }
+
+
+def _ms(seconds):
+    return int(seconds * 1000) if seconds is not None else None
+
+
+def _outcome_of(error):
+    if isinstance(error, (requests.Timeout, TimeoutError)):
+        return "timeout"
+    return "error"
+
+
+# ─── Spans ───────────────────────────────────────────────────────────────────
+
+@contextmanager
+def span(stage, provider=""):
+    """Time the block as one `stage` of `provider`; see the module docstring."""
+    current = Span(stage, provider, _current.get())
+    token = _current.set(current)
+    thread = threading.get_ident() if _track_threads else None
+    if thread is not None:
+        outer = _threads.get(thread)
+        _threads[thread] = current
+    try:
+        yield current
+    except BaseException as e:
+        current.outcome = _outcome_of(e)
+        current.error = str(e)
+        raise
+    finally:
+        _current.reset(token)
+        if thread is not None:
+            if outer is None:
+                _threads.pop(thread, None)
+            else:
+                _threads[thread] = outer
+        current.duration = time.perf_counter() - current.started
+        _record(current)
+
+
+def timed(stage, provider=""):
+    """Decorator: run the function inside span(stage, provider)."""
+    def decorate(fn):
+        @wraps(fn)
+        def wrapper(*args, **kwargs):
+            with span(stage, provider) as s:
+                result = fn(*args, **kwargs)
+                if result is None or (isinstance(result, (list, dict, tuple)) and not result):
+                    s.outcome = "empty"
+                return result
+        return wrapper
+    return decorate
+
+
+def add_bytes(n):
+    """Count n transferred bytes against the running span and its parents."""
+    current = _current.get()
+    if current is None or not n:
+        return
+    with _lock:
+        while current is not None:
+            current.bytes += n
+            current = current.parent
+
+
+def track_threads(enabled=True):
+    """Keep a thread → open span map, so a sampler can attribute stacks to stages."""
+    global _track_threads
+    _track_threads = enabled
+    if not enabled:
+        _threads.clear()
+
+
+def thread_span(thread_id):
+    """Innermost open span of a thread (only while track_threads is on)."""
+    return _threads.get(thread_id)
+
+
+def _record(finished):
+    key = (finished.provider, finished.stage)
+    with _lock:
+        stats = _stages.get(key)
+        if stats is None:
+            stats = _stages[key] = StageStats()
+        stats.add(finished)
+    for renderer in _renderers:
+        renderer.on_span(finished)
+
+
+# ─── Renderers ───────────────────────────────────────────────────────────────
+
+class ConsoleRenderer:
+    """Prints progress lines, and with timings=True one line per finished span."""
+
+    def __init__(self, stream=None, timings=False):
+        self.stream = stream
+        self.timings = timings
+
+    def on_progress(self, message):
+        print(message, file=self.stream or sys.stdout)
+
+    def on_span(self, finished):
+        if not self.timings:
+            return
+        size = f" {finished.bytes / 1024:.1f}KB" if finished.bytes else ""
+        print(f"   ⏱️  {finished.label} {finished.duration * 1000:.0f}ms {finished.outcome}{size}",
+              file=self.stream or sys.stdout)
+
+
+CONSOLE = ConsoleRenderer()
+_renderers.append(CONSOLE)
+
+
+def add_renderer(renderer):
+    if renderer not in _renderers:
+        _renderers.append(renderer)
+
+
+def remove_renderer(renderer):
+    if renderer in _renderers:
+        _renderers.remove(renderer)
+
+
+def console(enabled=True, stream=None, timings=False):
+    """Turn the console renderer on (optionally to another stream, with span timings) or off."""
+    CONSOLE.stream = stream
+    CONSOLE.timings = timings
+    if enabled:
+        add_renderer(CONSOLE)
+    else:
+        remove_renderer(CONSOLE)
+
+
+def progress(message):
+    """A human-readable progress line, shown only by the active renderers."""
+    for renderer in _renderers:
+        renderer.on_progress(message)
+
+
+# ─── Export ──────────────────────────────────────────────────────────────────
+
+def snapshot():
+    """{"provider/stage": {count, avgMs, p50Ms, p90Ms, p99Ms, bytes, outcomes}}."""
+    with _lock:
+        items = [(key, stats.to_json()) for key, stats in _stages.items()]
+    return {f"{p}/{s}" if p else s: value for (p, s), value in sorted(items)}
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _labels(**labels):
+    return ",".join(f'{k}="{_escape(v)}"' for k, v in labels.items())
+
+
+def prometheus():
+    """All stage metrics in the Prometheus text exposition format."""
+    with _lock:
+        items = sorted((key, stats.buckets[:], stats.count, stats.sum, stats.bytes, dict(stats.outcomes))
+                       for key, stats in _stages.items())
+    lines = [
+        "# HELP scraper_stage_duration_seconds Time spent in one resolution stage.",
+        "# TYPE scraper_stage_duration_seconds histogram",
+    ]
+    for (provider, stage), buckets, count, total, _, _ in items:
+        cumulative = 0
+        for bound, n in zip(BUCKETS, buckets):
+            cumulative += n
+            lines.append(f"scraper_stage_duration_seconds_bucket{{{_labels(provider=provider, stage=stage, le=bound)}}} {cumulative}")
+        lines.append(f"scraper_stage_duration_seconds_bucket{{{_labels(provider=provider, stage=stage, le='+Inf')}}} {count}")
+        lines.append(f"scraper_stage_duration_seconds_sum{{{_labels(provider=provider, stage=stage)}}} {total:.6f}")
+        lines.append(f"scraper_stage_duration_seconds_count{{{_labels(provider=provider, stage=stage)}}} {count}")
+
+    lines += [
+        "# HELP scraper_stage_total Finished stages by outcome.",
+        "# TYPE scraper_stage_total counter",
+    ]
+    for (provider, stage), _, _, _, _, outcomes in items:
+        for outcome, n in sorted(outcomes.items()):
+            lines.append(f"scraper_stage_total{{{_labels(provider=provider, stage=stage, outcome=outcome)}}} {n}")
+
+    lines += [
+        "# HELP scraper_stage_bytes_total Response bytes transferred within a stage.",
+        "# TYPE scraper_stage_bytes_total counter",
+    ]
+    for (provider, stage), _, _, _, size, _ in items:
+        lines.append(f"scraper_stage_bytes_total{{{_labels(provider=provider, stage=stage)}}} {size}")
+    return "\n".join(lines) + "\n"
+
+
+def reset():
+    with _lock:
+        _stages.clear()
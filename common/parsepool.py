@@ -0,0 +1,150 @@
+"""
+Worker-process offload for CPU-bound HTML parsing.
+
+    links = parsepool.run(build_season_index, response.content)
+
+BeautifulSoup holds the GIL for the whole parse, so under concurrent lookups
+one large page stalls every other thread. run() sends the raw page bytes to a
+process pool instead and gets the compact extracted result back. The parse
+function must be module-level (picklable by name), take the bytes plus small
+arguments, and return plain data.
+
+Routing per call:
+    - pool off (the default; SCRAPER_PARSE_WORKERS=N or configure(N) turns it on,
+      "auto" = one worker per core): inline
+    - page under MIN_OFFLOAD_BYTES: inline
+    - otherwise offloaded when the function's measured inline cost for a page
+      that size exceeds the measured pool round-trip overhead by
+      OFFLOAD_MARGIN; until both are measured, pages over OFFLOAD_BYTES go to
+      the pool
+A broken pool (a worker crashed) switches back to inline parsing.
+"""
+
+import os
+import sys
+import time
+import threading
+from concurrent.futures import TimeoutError as FutureTimeout
+
+from common import deadline
+
+MIN_OFFLOAD_BYTES = 16 * 1024
+OFFLOAD_BYTES = 64 * 1024
+OFFLOAD_MARGIN = 1.5
+# Weight of the newest sample in the moving averages
+EWMA_ALPHA = 0.2
+
+_lock = threading.Lock()
+_pool = None
+_workers = 0
+_costs = {}         # function name → EWMA inline seconds per byte
+_overhead = None    # EWMA pool round trip minus the parse itself (seconds)
+_counts = {"inline": 0, "offloaded": 0, "fallbacks": 0}
+
+
+def workers_from(value):
+    """"auto" → one worker per core, "N" → N, anything else → 0 (inline)."""
+    value = (value or "").strip().lower()
+    if value == "auto":
+        return os.cpu_count() or 1
+    return int(value) if value.isdigit() else 0
+
+
+def _init_worker(path):
+    # Scraper modules are imported through sys.path entries added at runtime
+    sys.path[:] = path
+
+
+def _call(fn, data, args):
+    """Runs in the worker: the parse result and how long the parse took."""
+    started = time.perf_counter()
+    result = fn(data, *args)
+    return result, time.perf_counter() - started
+
+
+def configure(workers):
+    """Set the pool size (0 = parse inline); takes effect on the next offload."""
+    global _workers, _pool
+    with _lock:
+        _workers = workers
+        old, _pool = _pool, None
+    if old is not None:
+        old.shutdown(wait=False, cancel_futures=True)
+
+
+def _get_pool():
+    global _pool
+    with _lock:
+        if _pool is None and _workers > 0:
+            # Imported here: multiprocessing is only worth loading once the pool is on
+            import multiprocessing
+            from concurrent.futures import ProcessPoolExecutor
+            # spawn: forking a process full of threads and open sockets is unsafe
+            _pool = ProcessPoolExecutor(
+                max_workers=_workers,
+                mp_context=multiprocessing.get_context("spawn"),
+                initializer=_init_worker,
+                initargs=(list(sys.path),),
+            )
+        return _pool
+
+
+def _ewma(old, sample):
+    return sample if old is None else old + EWMA_ALPHA * (sample - old)
+
+
+def _should_offload(name, size):
+    if _workers <= 0 or size < MIN_OFFLOAD_BYTES:
+        return False
+    cost = _costs.get(name)
+    if cost is None or _overhead is None:
+        return size >= OFFLOAD_BYTES
+    return cost * size > _overhead * OFFLOAD_MARGIN
+
+
+def run(fn, data, *args):
+    """fn(data, *args), inline or in the worker pool (see module docstring)."""
+    global _overhead
+    name = f"{fn.__module__}.{fn.__qualname__}"
+    size = len(data)
+    if _should_offload(name, size):
+        pool = _get_pool()
+        if pool is not None:
+            from concurrent.futures.process import BrokenProcessPool  # loaded with the pool
+            started = time.perf_counter()
+            try:
+                future = pool.submit(_call, fn, data, args)
+                result, parse_time = future.result(timeout=deadline.remaining_timeout(None))
+            except FutureTimeout:
+                future.cancel()
+                deadline.check(f"parsing {fn.__name__}")
+                raise
+            except BrokenProcessPool:
+                _counts["fallbacks"] += 1
+                configure(0)
+            else:
+                with _lock:
+                    _overhead = _ewma(_overhead, max(0.0, time.perf_counter() - started - parse_time))
+                    _costs[name] = _ewma(_costs.get(name), parse_time / max(size, 1))
+                    _counts["offloaded"] += 1
+                return result
+
+    started = time.perf_counter()
+    result = fn(data, *args)
+    with _lock:
+        _costs[name] = _ewma(_costs.get(name), (time.perf_counter() - started) / max(size, 1))
+        _counts["inline"] += 1
+    return result
+
+
+def stats():
+    with _lock:
+        return {
+            "workers": _workers,
+            **_counts,
+            "overheadMs": round(_overhead * 1000, 2) if _overhead is not None else None,
+            "usPerKB": {name: round(cost * 1024 * 1e6, 1) for name, cost in sorted(_costs.items())},
+        }
+
+
+_workers = workers_from(os.environ.get("SCRAPER_PARSE_WORKERS"))
@@ -0,0 +1,206 @@
+"""
+Sampling CPU profiler and allocation tracking for scraper runs.
+
+    with profile("prof/"):          # the CLIs: --profile prof/
+        api_tv(...)
+
+A sampler thread reads every thread's Python stack (sys._current_frames)
+every SAMPLE_INTERVAL and files it under the metrics span that thread is in
+(common/metrics.py), so hot spots are attributed to search / detail /
+extract / decrypt / ... Threads parked in socket reads, lock waits or sleeps
+are counted as idle and left out of the CPU profile. tracemalloc runs for
+the whole profile; each span records the net heap growth it saw.
+
+Written to the output directory when the block exits:
+    cpu.collapsed   folded stacks, "[provider/stage];file:func;... count"
+                    (flamegraph.pl, inferno, speedscope)
+    cpu-top.txt     top-N functions by self and total samples, samples per stage
+    alloc-top.txt   top-N allocation sites at the end of the run, heap growth per stage
+    alloc.snapshot  tracemalloc snapshot, for tracemalloc.Snapshot.load() diffs
+
+Heap growth per stage is measured on the process-wide heap, so it is
+approximate while stages run concurrently. tracemalloc slows allocation-heavy
+code (JSON, BeautifulSoup) several times over; SCRAPER_PROFILE_ALLOC=0 keeps
+just the CPU sampler, whose overhead is small.
+"""
+
+import os
+import sys
+import time
+import threading
+import tracemalloc
+from collections import Counter
+from contextlib import contextmanager
+
+from common import metrics
+
+SAMPLE_INTERVAL = 0.005
+TOP_N = 30
+# Frames kept per traced allocation
+TRACE_FRAMES = 1
+TRACE_ALLOCATIONS = os.environ.get("SCRAPER_PROFILE_ALLOC", "1") != "0"
+
+# (file, function) leaves where a thread is waiting rather than running
+IDLE_LEAVES = {
+    ("threading.py", "wait"), ("threading.py", "_wait_for_tstate_lock"),
+    ("queue.py", "get"), ("selectors.py", "select"), ("socket.py", "readinto"),
+    ("socket.py", "accept"), ("ssl.py", "read"), ("ssl.py", "recv_into"),
+    ("ssl.py", "do_handshake"), ("connection.py", "create_connection"),
+    ("_base.py", "wait"), ("_base.py", "result"), ("thread.py", "_worker"),
+    ("base_events.py", "_run_once"), ("_socket.py", "recv"), ("_app.py", "read"),
+}
+NO_STAGE = "[-]"
+
+
+def _frame_name(frame):
+    code = frame.f_code
+    return f"{os.path.basename(code.co_filename)}:{getattr(code, 'co_qualname', code.co_name)}"
+
+
+class Profiler:
+    """Collects samples and allocations between start() and stop(); see module docstring."""
+
+    def __init__(self, out_dir, interval=SAMPLE_INTERVAL, top=TOP_N, allocations=TRACE_ALLOCATIONS):
+        self.out_dir = out_dir
+        self.allocations = allocations
+        self.interval = interval
+        self.top = top
+        self.stacks = Counter()         # folded stack → samples
+        self.idle = 0
+        self.samples = 0
+        self.stage_memory = {}          # stage label → [spans, net bytes]
+        self.lock = threading.Lock()
+        self.stop_event = threading.Event()
+        self.thread = None
+        self.started = None
+
+    # ── metrics renderer hooks ──
+
+    def on_progress(self, message):
+        pass
+
+    def on_span(self, finished):
+        if finished.memory is None or not tracemalloc.is_tracing():
+            return
+        grown = tracemalloc.get_traced_memory()[0] - finished.memory
+        with self.lock:
+            entry = self.stage_memory.setdefault(finished.label, [0, 0])
+            entry[0] += 1
+            entry[1] += grown
+
+    # ── sampling ──
+
+    def _sample(self):
+        me = threading.get_ident()
+        while not self.stop_event.wait(self.interval):
+            for thread_id, frame in sys._current_frames().items():
+                if thread_id == me:
+                    continue
+                code = frame.f_code
+                if (os.path.basename(code.co_filename), code.co_name) in IDLE_LEAVES:
+                    self.idle += 1
+                    continue
+                names = []
+                while frame is not None:
+                    names.append(_frame_name(frame))
+                    frame = frame.f_back
+                current = metrics.thread_span(thread_id)
+                names.append(f"[{current.label}]" if current else NO_STAGE)
+                self.stacks[";".join(reversed(names))] += 1
+                self.samples += 1
+
+    def start(self):
+        self.started = time.perf_counter()
+        if self.allocations and not tracemalloc.is_tracing():
+            tracemalloc.start(TRACE_FRAMES)
+        metrics.track_threads(True)
+        metrics.add_renderer(self)
+        self.thread = threading.Thread(target=self._sample, name="profiler", daemon=True)
+        self.thread.start()
+
+    def stop(self):
+        """Stop sampling and write the reports; returns the output directory."""
+        self.stop_event.set()
+        self.thread.join()
+        snapshot = None
+        if tracemalloc.is_tracing():
+            snapshot = tracemalloc.take_snapshot().filter_traces((
+                tracemalloc.Filter(False, tracemalloc.__file__),
+                tracemalloc.Filter(False, "<frozen importlib._bootstrap>"),
+                tracemalloc.Filter(False, "<frozen importlib._bootstrap_external>"),
+            ))
+            tracemalloc.stop()
+        metrics.remove_renderer(self)
+        metrics.track_threads(False)
+
+        os.makedirs(self.out_dir, exist_ok=True)
+        self._write_collapsed()
+        self._write_cpu_top()
+        if snapshot is not None:
+            self._write_alloc_top(snapshot)
+            snapshot.dump(os.path.join(self.out_dir, "alloc.snapshot"))
+        return self.out_dir
+
+    # ── reports ──
+
+    def _write_collapsed(self):
+        with open(os.path.join(self.out_dir, "cpu.collapsed"), "w", encoding="utf-8") as f:
+            for stack, count in sorted(self.stacks.items()):
+                f.write(f"{stack} {count}\n")
+
+    def _write_cpu_top(self):
+        self_samples, total_samples, stages = Counter(), Counter(), Counter()
+        for stack, count in self.stacks.items():
+            stage, *frames = stack.split(";")
+            stages[stage] += count
+            if frames:
+                self_samples[frames[-1]] += count
+            for name in set(frames):
+                total_samples[name] += count
+
+        elapsed = time.perf_counter() - self.started
+        total = self.samples or 1
+        lines = [
+            f"{self.samples} samples every {self.interval * 1000:g}ms over {elapsed:.1f}s "
+            f"({self.idle} idle thread samples left out)",
+            "",
+            "Samples per stage",
+        ]
+        lines += [f"  {n:7d} {n / total:6.1%}  {stage}" for stage, n in stages.most_common()]
+        for title, table in (("Self (function on top of the stack)", self_samples),
+                             ("Total (function anywhere on the stack)", total_samples)):
+            lines += ["", f"Top {self.top} by {title}"]
+            lines += [f"  {n:7d} {n / total:6.1%}  {name}" for name, n in table.most_common(self.top)]
+        with open(os.path.join(self.out_dir, "cpu-top.txt"), "w", encoding="utf-8") as f:
+            f.write("\n".join(lines) + "\n")
+
+    def _write_alloc_top(self, snapshot):
+        stats = snapshot.statistics("lineno")
+        lines = [f"Top {self.top} allocation sites still live at the end of the run"]
+        for stat in stats[:self.top]:
+            frame = stat.traceback[0]
+            lines.append(f"  {stat.size / 1024:10.1f} KiB {stat.count:8d} blocks  "
+                         f"{os.path.basename(frame.filename)}:{frame.lineno}")
+        lines += ["", "Net heap growth per stage (approximate under concurrency)"]
+        with self.lock:
+            ordered = sorted(self.stage_memory.items(), key=lambda kv: -kv[1][1])
+        for label, (spans, grown) in ordered:
+            lines.append(f"  {grown / 1024:10.1f} KiB total {grown / spans / 1024:9.1f} KiB/span "
+                         f"{spans:6d} spans  {label}")
+        with open(os.path.join(self.out_dir, "alloc-top.txt"), "w", encoding="utf-8") as f:
+            f.write("\n".join(lines) + "\n")
+
+
+@contextmanager
+def profile(out_dir, **kwargs):
+    """Profile the block into out_dir; a no-op when out_dir is None."""
+    if not out_dir:
+        yield None
+        return
+    profiler = Profiler(out_dir, **kwargs)
+    profiler.start()
+    try:
+        yield profiler
+    finally:
+        profiler.stop()
+        print(f"📊 Profile written to {out_dir}", file=sys.stderr)
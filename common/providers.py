@@ -0,0 +1,179 @@
+"""
+Common provider interface and registry.
+
+Every scraper module exposes PROVIDER, an instance of a Provider subclass:
+
+    map(tmdb_id, kind, season, episode)  → provider-specific target, or None
+    list_servers(target)                 → [{"name": ..., ...}]
+    extract(target, server)              → [link] (see make_link)
+
+resolve() chains the three stages and yields links as each server finishes;
+common/aggregator.py runs resolve() for several providers at once.
+"""
+
+import os
+import re
+import sys
+import importlib
+import threading
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+
+from common import deadline
+from common.cache import ResolvedStreamCache
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# name → (directory, module) of the scraper defining PROVIDER
+PROVIDERS = {
+    "watch32": ("watch32", "watch32_test"),
+    "hdhub4u": ("hdhub4u", "hdhub4u_scraper"),
+    "streamflix": ("streamflix", "streamflix_test"),
+    "yflix": ("POC", "yflix_resolver"),
+}
+
+QUALITY_LABEL = re.compile(r"\b(2160|1440|1080|720|480|360|240)p\b|\b(4K|UHD)\b", re.I)
+
+# Normalized link lists per provider/title, shared by every provider in the process
+STREAM_CACHE = ResolvedStreamCache()
+
+# How often a cancelled resolve() notices, while waiting on extractors
+CANCEL_POLL = 0.25
+
+
+def normalize_quality(label):
+    """"1080p x264 [2.1GB]" → "1080p", "4K HDR" → "2160p", anything else → "Auto"."""
+    m = QUALITY_LABEL.search(label or "")
+    if not m:
+        return "Auto"
+    return f"{m.group(1)}p" if m.group(1) else "2160p"
+
+
+def make_link(provider, url, quality=None, server=None, label=None, referer=None, subtitles=None, headers=None):
+    """One normalized stream link, the same shape for every provider."""
+    path = url.split("?", 1)[0].lower()
+    return {
+        "provider": provider,
+        "url": url,
+        "quality": normalize_quality(quality or label),
+        "format": "hls" if path.endswith(".m3u8") or "/m3u8" in path else "file",
+        "server": server,
+        "label": label,
+        "referer": referer,
+        "headers": headers or {},
+        "subtitles": subtitles or [],
+    }
+
+
+class Provider:
+    """Base class for the scraper adapters; subclasses implement the three stages."""
+
+    name = ""
+    # Default time budget (seconds) when run by the aggregator
+    budget = 20.0
+    # Servers extracted in parallel within one resolve()
+    max_workers = 4
+
+    def map(self, tmdb_id, kind, season=None, episode=None):
+        """Find the title on the provider; None when it isn't there."""
+        raise NotImplementedError
+
+    def list_servers(self, target):
+        """Servers (mirrors, hosters, CDNs) for a mapped target."""
+        raise NotImplementedError
+
+    def extract(self, target, server):
+        """Links for one server; raise on failure."""
+        raise NotImplementedError
+
+    def catalog(self):
+        """Every title the provider lists, as [(tmdb_id, kind)], for bulk crawls (common/jobs.py)."""
+        raise NotImplementedError(f"{self.name} has no catalog listing")
+
+    def remember(self, tmdb_id, season, episode, links):
+        """Store a complete link list where resolve() looks first."""
+        STREAM_CACHE.put_streams(f"{self.name}:links", tmdb_id, season, episode, links, _link_urls(links))
+
+    def resolve(self, tmdb_id, kind, season=None, episode=None, cancel=None, errors=None):
+        """
+        Yield links as each server's extraction completes. Stops early once
+        cancel (a threading.Event) is set or the current deadline passes;
+        per-server failures are appended to errors when a list is given.
+
+        Complete results are kept in STREAM_CACHE until their URLs expire, and
+        refreshed in the background when they get close.
+        """
+        cache_key = (f"{self.name}:links", tmdb_id, season, episode)
+        hit = STREAM_CACHE.lookup(*cache_key)
+        if hit is not None:
+            links, needs_refresh = hit
+            if needs_refresh:
+                STREAM_CACHE.refresh(
+                    *cache_key, lambda: list(self._resolve(tmdb_id, kind, season, episode)), _link_urls,
+                )
+            yield from links
+            return
+
+        links = []
+        for link in self._resolve(tmdb_id, kind, season, episode, cancel, errors):
+            links.append(link)
+            yield link
+        stopped = (cancel and cancel.is_set()) or (deadline.current() and deadline.current().expired)
+        if links and not stopped:
+            self.remember(tmdb_id, season, episode, links)
+
+    def _resolve(self, tmdb_id, kind, season=None, episode=None, cancel=None, errors=None):
+        cancel = cancel or threading.Event()
+        stop = deadline.current()
+        stopped = lambda: cancel.is_set() or (stop is not None and stop.expired)
+        target = self.map(tmdb_id, kind, season, episode)
+        if target is None or stopped():
+            return
+        servers = self.list_servers(target)
+        if not servers or stopped():
+            return
+
+        pool = ThreadPoolExecutor(max_workers=min(self.max_workers, len(servers)))
+        try:
+            pending = {deadline.submit(pool, self.extract, target, server): server for server in servers}
+            while pending and not stopped():
+                done, _ = wait(pending, timeout=deadline.remaining_timeout(CANCEL_POLL), return_when=FIRST_COMPLETED)
+                for future in done:
+                    server = pending.pop(future)
+                    try:
+                        links = future.result()
+                    except Exception as e:
+                        if errors is not None:
+                            errors.append(f"{server.get('name')}: {e}")
+                        continue
+                    for link in links or ():
+                        yield link
+            if pending and errors is not None and not cancel.is_set():
+                errors.append(f"deadline exceeded with {len(pending)} server(s) outstanding")
+        finally:
+            pool.shutdown(wait=False, cancel_futures=True)
+
+
+def _link_urls(links):
+    return [link["url"] for link in links]
+
+
+# ─── Registry ────────────────────────────────────────────────────────────────
+
+_modules = {}
+_modules_lock = threading.Lock()
+
+
+def load_provider(name):
+    """Import a scraper module once; a missing dependency only disables that provider."""
+    with _modules_lock:
+        if name not in _modules:
+            directory, module = PROVIDERS[name]
+            path = os.path.join(ROOT, directory)
+            if path not in sys.path:
+                sys.path.insert(0, path)
+            _modules[name] = importlib.import_module(module)
+        return _modules[name]
+
+
+def get_provider(name):
+    return load_provider(name).PROVIDER
@@ -0,0 +1,232 @@
+"""
+Circuit breakers, latency percentiles and retry budgets per upstream endpoint.
+
+An endpoint is a host plus the first path segment ("script.google.com/macros",
+"watch32.sx/ajax"), so one broken API on a host does not trip the others.
+common/http.Session uses these to:
+    - fail fast while an endpoint's breaker is open
+    - send a hedged duplicate of a slow idempotent request once it has taken
+      longer than the endpoint's p90 latency
+    - retry with full jitter, but only while the host's retry budget allows
+"""
+
+import time
+import random
+import threading
+from collections import deque
+from urllib.parse import urlparse
+
+import requests
+
+# Consecutive failures that open a breaker
+FAILURE_THRESHOLD = 5
+# First open period (seconds); doubles each time a half-open probe fails
+RESET_TIMEOUT = 10.0
+MAX_RESET_TIMEOUT = 120.0
+
+# Latency samples kept per endpoint, and how many are needed before hedging
+LATENCY_SAMPLES = 200
+MIN_HEDGE_SAMPLES = 20
+HEDGE_PERCENTILE = 90
+# Hedge delay when there are too few samples, and the floor (seconds)
+DEFAULT_HEDGE_DELAY = 2.0
+MIN_HEDGE_DELAY = 0.2
+
+# Each request earns this much retry credit; a retry spends 1
+RETRY_BUDGET_RATIO = 0.2
+RETRY_BUDGET_MAX = 10.0
+RETRY_BASE_DELAY = 0.3
+RETRY_MAX_DELAY = 5.0
+
+
+class CircuitOpenError(requests.ConnectionError):
+    """Raised instead of sending a request to an endpoint whose breaker is open."""
+
+
+class CircuitBreaker:
+    """closed → (N consecutive failures) → open → (timeout) → half-open → one probe."""
+
+    def __init__(self, name, failure_threshold=FAILURE_THRESHOLD, reset_timeout=RESET_TIMEOUT):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.base_reset_timeout = reset_timeout
+        self.reset_timeout = reset_timeout
+        self.state = "closed"
+        self.failures = 0
+        self.opened_at = 0.0
+        self.probing = False
+        self.counts = {"opened": 0, "rejected": 0}
+        self.lock = threading.Lock()
+
+    def allow(self):
+        return self._admit() is not None
+
+    def _admit(self):
+        """None when rejected, else whether this call is the half-open probe."""
+        with self.lock:
+            if self.state == "closed":
+                return False
+            if self.state == "open" and time.monotonic() - self.opened_at >= self.reset_timeout:
+                self.state = "half-open"
+            if self.state == "half-open" and not self.probing:
+                self.probing = True
+                return True
+            self.counts["rejected"] += 1
+            return None
+
+    def check(self):
+        """Raise CircuitOpenError when rejected; returns whether this call took the probe."""
+        probe = self._admit()
+        if probe is None:
+            raise CircuitOpenError(f"Circuit open for {self.name} (retry in {self.retry_in():.0f}s)")
+        return probe
+
+    def retry_in(self):
+        return max(0.0, self.opened_at + self.reset_timeout - time.monotonic())
+
+    def record_success(self):
+        with self.lock:
+            self.state = "closed"
+            self.failures = 0
+            self.probing = False
+            self.reset_timeout = self.base_reset_timeout
+
+    def record_failure(self):
+        with self.lock:
+            self.failures += 1
+            if self.state == "half-open":
+                self.reset_timeout = min(self.reset_timeout * 2, MAX_RESET_TIMEOUT)
+                self._open()
+            elif self.state == "closed" and self.failures >= self.failure_threshold:
+                self._open()
+            self.probing = False
+
+    def release_probe(self):
+        """Give back a half-open probe that ended with no verdict (e.g. our deadline ran out)."""
+        with self.lock:
+            self.probing = False
+
+    def _open(self):
+        self.state = "open"
+        self.opened_at = time.monotonic()
+        self.counts["opened"] += 1
+
+    def stats(self):
+        with self.lock:
+            return {
+                "state": self.state,
+                "failures": self.failures,
+                "retryIn": round(self.retry_in(), 1) if self.state == "open" else 0,
+                **self.counts,
+            }
+
+
+class LatencyTracker:
+    """Recent successful latencies of one endpoint."""
+
+    def __init__(self):
+        self.samples = deque(maxlen=LATENCY_SAMPLES)
+        self.lock = threading.Lock()
+        self.hedges = 0
+        self.hedge_wins = 0
+
+    def add(self, latency):
+        with self.lock:
+            self.samples.append(latency)
+
+    def percentile(self, p):
+        with self.lock:
+            if not self.samples:
+                return None
+            ordered = sorted(self.samples)
+        return ordered[min(len(ordered) - 1, int(len(ordered) * p / 100))]
+
+    def hedge_delay(self):
+        if len(self.samples) < MIN_HEDGE_SAMPLES:
+            return DEFAULT_HEDGE_DELAY
+        return max(MIN_HEDGE_DELAY, self.percentile(HEDGE_PERCENTILE))
+
+    def stats(self):
+        p50, p90, p99 = (self.percentile(p) for p in (50, 90, 99))
+        ms = lambda v: int(v * 1000) if v is not None else None
+        return {
+            "samples": len(self.samples),
+            "p50Ms": ms(p50), "p90Ms": ms(p90), "p99Ms": ms(p99),
+            "hedges": self.hedges, "hedgeWins": self.hedge_wins,
+        }
+
+
+class RetryBudget:
+    """Retries may use at most RETRY_BUDGET_RATIO of the host's request volume."""
+
+    def __init__(self):
+        self.tokens = RETRY_BUDGET_MAX / 2
+        self.lock = threading.Lock()
+        self.retries = 0
+        self.denied = 0
+
+    def deposit(self):
+        with self.lock:
+            self.tokens = min(RETRY_BUDGET_MAX, self.tokens + RETRY_BUDGET_RATIO)
+
+    def withdraw(self):
+        with self.lock:
+            if self.tokens >= 1:
+                self.tokens -= 1
+                self.retries += 1
+                return True
+            self.denied += 1
+            return False
+
+    def stats(self):
+        with self.lock:
+            return {"tokens": round(self.tokens, 2), "retries": self.retries, "denied": self.denied}
+
+
+def backoff_delay(attempt):
+    """Full-jitter exponential backoff for retry number `attempt` (0-based)."""
+    return random.uniform(0, min(RETRY_MAX_DELAY, RETRY_BASE_DELAY * 2 ** attempt))
+
+
+# ─── Registry ────────────────────────────────────────────────────────────────
+
+_breakers = {}
+_trackers = {}
+_budgets = {}
+_registry_lock = threading.Lock()
+
+
+def endpoint_of(url):
+    parsed = urlparse(url)
+    segment = parsed.path.strip("/").split("/", 1)[0]
+    return f"{(parsed.hostname or '').lower()}/{segment}"
+
+
+def _get(table, key, factory):
+    with _registry_lock:
+        value = table.get(key)
+        if value is None:
+            value = table[key] = factory()
+        return value
+
+
+def breaker(name):
+    return _get(_breakers, name, lambda: CircuitBreaker(name))
+
+
+def tracker(endpoint):
+    return _get(_trackers, endpoint, LatencyTracker)
+
+
+def budget(host):
+    return _get(_budgets, host, RetryBudget)
+
+
+def stats():
+    with _registry_lock:
+        breakers, trackers, budgets = dict(_breakers), dict(_trackers), dict(_budgets)
+    return {
+        "breakers": {k: v.stats() for k, v in sorted(breakers.items())},
+        "latency": {k: v.stats() for k, v in sorted(trackers.items())},
+        "retryBudgets": {k: v.stats() for k, v in sorted(budgets.items())},
+    }
@@ -0,0 +1,104 @@
+"""
+CLI Startup Benchmark
+Import every entry point under `python -X importtime` and check the time it
+takes against a budget, and that the dependencies only some code paths need
+(bs4, pycryptodome, websocket-client, multiprocessing) stay out of startup.
+
+Each entry point is imported RUNS times in a fresh interpreter; the best run
+counts, so a cold disk cache doesn't fail the check. The time is the entry
+module's cumulative import time as reported by importtime, i.e. without the
+interpreter's own startup.
+
+Usage:
+    python -m common.startup_bench              # check every entry point
+    python -m common.startup_bench --top 15     # also list the slowest imports
+    python -m common.startup_bench --runs 10
+"""
+
+import os
+import sys
+import subprocess
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# name → (directory the script runs from, module)
+ENTRY_POINTS = {
+    "watch32": ("watch32", "watch32_test"),
+    "streamflix": ("streamflix", "streamflix_test"),
+    "hdhub4u": ("hdhub4u", "hdhub4u_scraper"),
+    "yflix": ("POC", "yflix_resolver"),
+    "batch": ("", "common.batch"),
+    "jobs": ("", "common.jobs"),
+    "server": ("", "server"),
+}
+
+# Hard ceiling per entry point, in milliseconds
+STARTUP_BUDGET_MS = 200
+
+# Imported by the code paths that need them, never at startup
+LAZY_MODULES = ("bs4", "Crypto", "websocket", "multiprocessing")
+
+RUNS = 5
+
+
+def import_times(directory, module):
+    """One fresh `import module` → {imported module: (self µs, cumulative µs)}."""
+    proc = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        cwd=os.path.join(ROOT, directory),
+        capture_output=True,
+        text=True,
+    )
+    if proc.returncode:
+        raise RuntimeError(f"import {module} failed:\n{proc.stderr.strip()}")
+    times = {}
+    for line in proc.stderr.splitlines():
+        if not line.startswith("import time:"):
+            continue
+        self_us, cumulative_us, name = line[len("import time:"):].split("|")
+        if self_us.strip().isdigit():
+            times[name.strip()] = (int(self_us), int(cumulative_us))
+    return times
+
+
+def check(name, directory, module, runs, top):
+    """Benchmark one entry point. Returns the number of failed checks."""
+    best = None
+    for _ in range(runs):
+        times = import_times(directory, module)
+        if best is None or times[module][1] < best[module][1]:
+            best = times
+
+    ms = best[module][1] / 1000
+    over = ms > STARTUP_BUDGET_MS
+    eager = sorted({m.split(".")[0] for m in best} & set(LAZY_MODULES))
+    print(f"   {'❌' if over else '⏱️'}  {name:<11} {ms:7.1f} ms  ({len(best)} modules)")
+    if eager:
+        print(f"   ❌ {name:<11} imports {', '.join(eager)} at startup")
+    if top:
+        slowest = sorted(best.items(), key=lambda kv: -kv[1][0])[:top]
+        for imported, (self_us, _) in slowest:
+            print(f"         {self_us / 1000:7.2f} ms self  {imported}")
+    return over + bool(eager)
+
+
+def main():
+    runs, top = RUNS, 0
+    if "--runs" in sys.argv:
+        runs = max(1, int(sys.argv[sys.argv.index("--runs") + 1]))
+    if "--top" in sys.argv:
+        top = int(sys.argv[sys.argv.index("--top") + 1])
+
+    print(f"⏱️  Startup import time (best of {runs}, budget {STARTUP_BUDGET_MS} ms):")
+    failures = 0
+    for name, (directory, module) in ENTRY_POINTS.items():
+        failures += check(name, directory, module, runs, top)
+
+    if failures:
+        print(f"\n❌ {failures} startup check(s) failed")
+        sys.exit(1)
+    print("\n✅ All entry points within budget")
+
+
+if __name__ == "__main__":
+    main()
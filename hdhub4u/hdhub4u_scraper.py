@@ -3,15 +3,33 @@ import requests
 import json
 import re
 import base64
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from urllib.parse import urlparse
-from bs4 import BeautifulSoup
 
-try:
-    from Crypto.Cipher import AES
-    from Crypto.Util.Padding import unpad
-except ImportError:
-    print("Please install pycryptodome: pip install pycryptodome")
-    sys.exit(1)
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from common import batch, deadline, parsepool, profiling
+from common.cache import TTLCache, ResolvedStreamCache, ttl_for_urls
+from common.http import Session
+from common.metrics import progress, timed
+from common.providers import Provider, make_link
+
+# bs4 and pycryptodome are imported by the code paths that need them, so
+# startup (batch, cron, the server's provider loading) doesn't pay for them
+
+def _soup(markup):
+    from bs4 import BeautifulSoup
+    return BeautifulSoup(markup, 'html.parser')
+
+def _aes():
+    try:
+        from Crypto.Cipher import AES
+        from Crypto.Util.Padding import unpad
+    except ImportError:
+        raise ImportError("Please install pycryptodome: pip install pycryptodome") from None
+    return AES, unpad
 
 HEADERS = {
     "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/131.0.0.0 Safari/537.36",
@@ -19,12 +37,144 @@ HEADERS = {
     "Referer": "https://hdhub4u.rehab"
 }
 
+# Every request goes through the per-host limiter in common/http.py
+SESSION = Session()
+
+TMDB_API_KEY = os.environ.get("TMDB_API_KEY", "297f1b91919bae59d50ed815f8d2e14c")
+
+# Known hdhub4u domains, most recent first (override with HDHUB4U_MIRRORS=a,b,c)
+MIRROR_CANDIDATES = [
+    m.strip().rstrip("/") for m in os.environ.get(
+        "HDHUB4U_MIRRORS",
+        "https://hdhub4u.rehab,https://hdhub4u.gd,https://hdhub4u.frl,https://hdhub4u.fo,https://hdhub4u.cologne",
+    ).split(",") if m.strip()
+]
+MIRROR_TTL = 6 * 3600
+MIRROR_PROBE_TIMEOUT = 8
+
+class MirrorManager:
+    """
+    Tracks the hdhub4u domain that currently works.
+    Candidates are probed concurrently and the first one serving an hdhub4u
+    page wins; permanent redirects (301/308) to a new domain are learned and
+    kept. The active base is shared through the cache and feeds every page
+    URL and the Referer header; a failing base triggers a fresh probe.
+    """
+
+    def __init__(self, candidates):
+        self.candidates = list(candidates)
+        self.cache = TTLCache("hdhub4u:mirror")
+        self.lock = threading.Lock()
+        self.base = None
+
+    def _all_candidates(self):
+        learned = self.cache.get("learned", [])
+        return list(dict.fromkeys(learned + self.candidates))
+
+    def learn(self, base):
+        base = base.rstrip("/")
+        learned = self.cache.get("learned", [])
+        if base not in learned:
+            self.cache.set("learned", [base] + learned, 30 * 24 * 3600)
+
+    def _probe_one(self, base):
+        """Returns the working base for this candidate (following permanent redirects) or None."""
+        url = base + "/"
+        for _ in range(3):
+            resp = SESSION.get(url, headers={**HEADERS, "Referer": base}, timeout=MIRROR_PROBE_TIMEOUT,
+                               allow_redirects=False)
+            if resp.status_code in (301, 308) and resp.headers.get("Location"):
+                target = urlparse(requests.compat.urljoin(url, resp.headers["Location"]))
+                new_base = f"{target.scheme}://{target.netloc}"
+                if new_base != base:
+                    self.learn(new_base)
+                base, url = new_base, new_base + "/"
+                continue
+            if resp.status_code == 200 and "hdhub4u" in resp.text.lower():
+                return base
+            return None
+        return None
+
+    def probe(self, exclude=()):
+        candidates = [c for c in self._all_candidates() if c not in exclude]
+        progress(f"[*] Probing {len(candidates)} hdhub4u mirror(s)...")
+        pool = ThreadPoolExecutor(max_workers=max(1, len(candidates)))
+        try:
+            futures = [deadline.submit(pool, self._probe_one, c) for c in candidates]
+            for future in as_completed(futures):
+                try:
+                    base = future.result()
+                except Exception:
+                    continue
+                if base:
+                    return base
+        finally:
+            pool.shutdown(wait=False, cancel_futures=True)
+        return None
+
+    def set_active(self, base):
+        # Callers hold self.lock; requests read self.base through headers()
+        self.base = base
+        self.cache.set("active", base, MIRROR_TTL)
+        progress(f"[*] Active mirror: {base}")
+
+    def active(self):
+        with self.lock:
+            if self.base is None:
+                base = self.cache.get("active") or self.probe() or self.candidates[0]
+                self.set_active(base)
+            return self.base
+
+    def failover(self):
+        """Drop the current base and switch to the next mirror that answers."""
+        with self.lock:
+            failed = self.base
+            base = self.probe(exclude={failed}) or failed
+            self.set_active(base)
+            return base
+
+    def headers(self):
+        """Request headers with the active mirror as Referer (without probing for one)."""
+        return {**HEADERS, "Referer": self.base or self.candidates[0]}
+
+    def url(self, permalink):
+        """Absolute URL on the active mirror for a path or a permalink on any hdhub4u domain."""
+        parsed = urlparse(permalink)
+        if parsed.netloc and "hdhub4u" not in parsed.netloc:
+            return permalink
+        path = parsed.path or "/"
+        if parsed.query:
+            path += "?" + parsed.query
+        return self.active() + path
+
+    def get(self, permalink):
+        """GET a site page on the active mirror, failing over once on errors."""
+        for attempt in range(2):
+            url = self.url(permalink)
+            try:
+                response = SESSION.get(url, headers=self.headers(), timeout=20)
+                final = urlparse(response.url)
+                if any(r.status_code in (301, 308) for r in response.history) and final.netloc not in url:
+                    # Site moved permanently: remember the new domain
+                    self.learn(f"{final.scheme}://{final.netloc}")
+                    with self.lock:
+                        self.set_active(f"{final.scheme}://{final.netloc}")
+                if response.status_code < 500 or attempt:
+                    return response
+            except requests.RequestException:
+                if attempt:
+                    raise
+            self.failover()
+
+MIRRORS = MirrorManager(MIRROR_CANDIDATES)
+
+@timed("search", "hdhub4u")
 def search(query):
-    print(f"\n[*] Searching for: {query}")
+    progress(f"\n[*] Searching for: {query}")
     url = f"https://search.pingora.fyi/collections/post/documents/search?q={query}&query_by=post_title,category&query_by_weights=4,2&sort_by=sort_by_date:desc&limit=15&highlight_fields=none&use_cache=true&page=1"
-    response = requests.get(url, headers=HEADERS)
+    response = SESSION.get(url, headers={**HEADERS, "Referer": MIRRORS.active()})
     if response.status_code != 200:
-        print(f"Search API failed with {response.status_code}")
+        progress(f"Search API failed with {response.status_code}")
         return []
     
     hits = response.json().get("hits", [])
@@ -41,9 +191,23 @@ def pen(val):
             res += c
     return res
 
+# Decoded ?id= redirect targets, shared by every worker on the cache backend
+REDIRECT_CACHE = TTLCache("hdhub4u:redirect")
+REDIRECT_TTL = 7 * 24 * 3600
+
+@timed("decrypt", "hdhub4u")
 def get_redirect_links(url):
+    cached = REDIRECT_CACHE.get(url)
+    if cached:
+        return cached
+    final_link = decode_redirect(url)
+    if final_link and final_link != url:
+        REDIRECT_CACHE.set(url, final_link, REDIRECT_TTL)
+    return final_link
+
+def decode_redirect(url):
     try:
-        response = requests.get(url, headers=HEADERS)
+        response = SESSION.get(url, headers=MIRRORS.headers())
         doc = response.text
         regex = re.compile(r"s\('o','([A-Za-z0-9+/=]+)'\)|ck\('_wp_http_\d+','([^']+)'\)")
         matches = regex.findall(doc)
@@ -70,26 +234,29 @@ def get_redirect_links(url):
             data = base64.b64decode(data_encoded).decode('utf-8').strip()
             wphttp1 = json_obj.get("blog_url", "").strip()
             directlink_url = f"{wphttp1}?re={data}"
-            dl_resp = requests.get(directlink_url, headers=HEADERS)
-            soup = BeautifulSoup(dl_resp.text, 'html.parser')
+            dl_resp = SESSION.get(directlink_url, headers=MIRRORS.headers())
+            soup = _soup(dl_resp.text)
             if soup.body:
                 return soup.body.text.strip()
     except Exception as e:
-        print(f"[!] Error resolving redirect: {e}")
+        progress(f"[!] Error resolving redirect: {e}")
     return url
 
+@timed("extract", "hdhub4u")
 def extract_vidstack(url):
+    """vidstack/hubstream player URL → m3u8 URL, or None when it can't be decrypted."""
     try:
         hash_val = url.split("#")[-1].split("/")[-1]
         baseurl = f"{urlparse(url).scheme}://{urlparse(url).netloc}"
         api_url = f"{baseurl}/api/v1/video?id={hash_val}"
         
         headers = {"User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64; rv:134.0) Gecko/20100101 Firefox/134.0"}
-        encoded = requests.get(api_url, headers=headers).text.strip()
+        encoded = SESSION.get(api_url, headers=headers).text.strip()
         
         key = b"kiemtienmua911ca"
         iv_list = [b"1234567890oiuytr", b"0123456789abcdef"]
         
+        AES, unpad = _aes()
         input_bytes = bytes.fromhex(encoded)
         decrypted_text = None
         for iv in iv_list:
@@ -102,97 +269,371 @@ def extract_vidstack(url):
                 continue
                 
         if not decrypted_text:
-            return "Decryption failed"
+            progress(f"[!] VidStack: decryption failed for {url}")
+            return None
             
         m3u8_match = re.search(r'"source":"(.*?)"', decrypted_text)
         if m3u8_match:
             return m3u8_match.group(1).replace('\\/', '/')
             
     except Exception as e:
-        print(f"[!] Error in VidStack: {e}")
-    return "Source not found"
-
+        progress(f"[!] Error in VidStack: {e}")
+        return None
+    progress(f"[!] VidStack: no source in {url}")
+    return None
+
+# hubdrive → hubcloud → button list hop caches; later hops rotate faster
+HUBDRIVE_CACHE = TTLCache("hdhub4u:hubdrive")
+HUBDRIVE_TTL = 7 * 24 * 3600
+HUBCLOUD_GATEWAY_CACHE = TTLCache("hdhub4u:hubcloud-gateway")
+HUBCLOUD_GATEWAY_TTL = 24 * 3600
+HUBCLOUD_BUTTONS_CACHE = TTLCache("hdhub4u:hubcloud-buttons")
+HUBCLOUD_BUTTONS_TTL = 3600
+BUTTON_REDIRECT_WORKERS = 6
+
+def resolve_hubdrive(url):
+    """hubdrive file page → hubcloud link from its btn-success1 button (or the url itself)."""
+    cached = HUBDRIVE_CACHE.get(url)
+    if cached is not None:
+        return cached
+    hd_resp = SESSION.get(url, headers=MIRRORS.headers())
+    hd_soup = _soup(hd_resp.text)
+    btn = hd_soup.find("a", class_="btn btn-primary btn-user btn-success1 m-1")
+    if not (btn and btn.get("href")):
+        return url
+    HUBDRIVE_CACHE.set(url, btn.get("href"), HUBDRIVE_TTL)
+    return btn.get("href")
+
+def resolve_hubcloud_gateway(url):
+    """hubcloud gateway page → hubcloud.php doc page from its #download button."""
+    if "hubcloud.php" in url:
+        return url
+    cached = HUBCLOUD_GATEWAY_CACHE.get(url)
+    if cached is not None:
+        return cached
+    response = SESSION.get(url, headers=MIRRORS.headers())
+    soup = _soup(response.text)
+    download_btn = soup.find(id="download")
+    if not (download_btn and download_btn.get("href")):
+        return url
+    href = download_btn.get("href")
+    if not href.startswith("http"):
+        baseurl = f"{urlparse(url).scheme}://{urlparse(url).netloc}"
+        doc_url = f"{baseurl}/{href.lstrip('/')}"
+    else:
+        doc_url = href
+    HUBCLOUD_GATEWAY_CACHE.set(url, doc_url, HUBCLOUD_GATEWAY_TTL)
+    return doc_url
+
+def follow_redirects(url):
+    """Final URL after redirects (HEAD, falling back to a streamed GET)."""
+    try:
+        resp = SESSION.head(url, headers=MIRRORS.headers(), allow_redirects=True, timeout=15)
+        if resp.status_code < 400:
+            return resp.url
+        resp = SESSION.get(url, headers=MIRRORS.headers(), allow_redirects=True, timeout=15, stream=True)
+        resp.close()
+        return resp.url if resp.status_code < 400 else url
+    except Exception:
+        return url
+
+def get_hubcloud_buttons(doc_url):
+    """hubcloud.php doc page → [{label, url}] with each a.btn resolved through its redirects."""
+    cached = HUBCLOUD_BUTTONS_CACHE.get(doc_url)
+    if cached is not None:
+        return cached
+    doc_resp = SESSION.get(doc_url, headers=MIRRORS.headers())
+    buttons = parsepool.run(parse_hubcloud_buttons, doc_resp.content)
+
+    with ThreadPoolExecutor(max_workers=BUTTON_REDIRECT_WORKERS) as pool:
+        finals = list(pool.map(deadline.bind(follow_redirects), [b["url"] for b in buttons]))
+    for button, final in zip(buttons, finals):
+        button["url"] = final
+
+    ttl = ttl_for_urls([b["url"] for b in buttons], HUBCLOUD_BUTTONS_TTL)
+    if buttons and ttl > 0:
+        HUBCLOUD_BUTTONS_CACHE.set(doc_url, buttons, ttl)
+    return buttons
+
+def parse_hubcloud_buttons(html):
+    doc_soup = _soup(html)
+    return [{"label": a.text.strip(), "url": a.get("href")} for a in doc_soup.select("a.btn") if a.get("href")]
+
+@timed("extract", "hdhub4u")
 def extract_hubcloud(url):
     results = []
     try:
-        response = requests.get(url, headers=HEADERS)
-        soup = BeautifulSoup(response.text, 'html.parser')
-        
-        # Check if it's the gateway page
-        if "hubcloud.php" not in url:
-            download_btn = soup.find(id="download")
-            if download_btn:
-                href = download_btn.get("href")
-                if not href.startswith("http"):
-                    baseurl = f"{urlparse(url).scheme}://{urlparse(url).netloc}"
-                    url = f"{baseurl}/{href.lstrip('/')}"
-                else:
-                    url = href
-        
-        doc_resp = requests.get(url, headers=HEADERS)
-        doc_soup = BeautifulSoup(doc_resp.text, 'html.parser')
-        
-        for a in doc_soup.select("a.btn"):
-            link = a.get("href")
-            text = a.text.strip()
-            results.append({"label": text, "url": link})
+        results = get_hubcloud_buttons(resolve_hubcloud_gateway(url))
     except Exception as e:
-        print(f"[!] Error in Hubcloud: {e}")
+        progress(f"[!] Error in Hubcloud: {e}")
+    return results
+
+ALLOWED_DOMAINS = re.compile(r"https://(.*\.)?(hdstream4u|hubstream|hblinks|hubcdn|hubdrive)\..*")
+
+# "E01 –", "Ep 3", "Episode 12" at the start of a link block
+EPISODE_LABEL = re.compile(r"^\s*(?:E|Ep|Episode)[\s.\-]*0*(\d{1,3})\b", re.I)
+QUALITY_LABEL = re.compile(r"\b(2160p|4K|1080p|720p|480p)\b", re.I)
+
+# Season page link index per permalink (backend from SCRAPER_CACHE, see common/cache.py)
+SEASON_INDEX_CACHE = TTLCache("hdhub4u:season-index")
+SEASON_INDEX_TTL = 6 * 3600
+
+def build_season_index(html):
+    """
+    Group the links of a season page by episode and quality.
+    Returns {"episodes": {"1": {"720p 10Bit HEVC": [{label, url}]}}, "packs": [{quality, label, url}]}.
+    Section headings such as ": Single Episode 720p 10Bit HEVC :" set the
+    quality for the "E01 – Drive | Instant | Watch" blocks below them; link
+    blocks without an episode label are season packs.
+    """
+    soup = _soup(html)
+    index = {"episodes": {}, "packs": []}
+    section_quality = ""
+    for block in soup.find_all(["h2", "h3", "h4", "p"]):
+        anchors = [a for a in block.find_all("a") if a.get("href")]
+        text = block.get_text(" ", strip=True)
+        if not anchors:
+            if QUALITY_LABEL.search(text):
+                section_quality = re.sub(r"(?i)single\s+episodes?", "", text).strip(" :")
+            continue
+
+        episode = EPISODE_LABEL.match(text)
+        for a in anchors:
+            label = a.get_text(strip=True)
+            if episode:
+                by_quality = index["episodes"].setdefault(str(int(episode.group(1))), {})
+                by_quality.setdefault(section_quality, []).append({"label": label, "url": a["href"]})
+            else:
+                quality = QUALITY_LABEL.search(label)
+                if not quality:
+                    # Navigation / social links, not downloads
+                    continue
+                index["packs"].append({
+                    "quality": quality.group(1),
+                    "label": label,
+                    "url": a["href"],
+                })
+    return index
+
+@timed("detail", "hdhub4u")
+def get_season_index(permalink):
+    # Keyed by path so the index survives mirror domain changes
+    key = urlparse(permalink).path
+    index = SEASON_INDEX_CACHE.get(key)
+    if index is None:
+        progress(f"\n[*] Indexing season page: {permalink}")
+        response = MIRRORS.get(permalink)
+        index = parsepool.run(build_season_index, response.content)
+        SEASON_INDEX_CACHE.set(key, index, SEASON_INDEX_TTL)
+    progress(f"[*] Season index: {len(index['episodes'])} episode(s), {len(index['packs'])} pack link(s)")
+    return index
+
+@timed("source", "hdhub4u")
+def resolve_source(link):
+    """Resolve one page link to its final download / stream links (printed as it goes)."""
+    results = []
+    # Resolve obfuscated ?id= links
+    if "?id=" in link:
+        final_link = get_redirect_links(link)
+    else:
+        final_link = link
+
+    progress(f"\n=> Source: {final_link}")
+
+    if final_link and ("hubdrive" in final_link.lower() or "hubcloud" in final_link.lower()):
+        if "hubdrive" in final_link.lower():
+            final_link = resolve_hubdrive(final_link)
+
+        if final_link and "hubcloud" in final_link.lower():
+            # Only entries that carry a URL become links
+            links = [l for l in extract_hubcloud(final_link) if l.get("url")]
+            for l in links:
+                progress(f"   - [{l['label']}] {l['url']}")
+            results.extend(links)
+    elif final_link and ("vidstack" in final_link.lower() or "hubstream" in final_link.lower()):
+        m3u8 = extract_vidstack(final_link)
+        if m3u8:
+            progress(f"   - [VidStack/Hubstream M3U8] {m3u8}")
+            results.append({"label": "VidStack/Hubstream M3U8", "url": m3u8})
+    else:
+        progress(f"   - Needs matching extractor")
+    return results
+
+def resolve_links(links):
+    results = []
+    for link in links:
+        try:
+            results.extend(resolve_source(link))
+        except Exception as e:
+            progress(f"   [!] Error processing {link}: {e}")
+            import traceback
+            traceback.print_exc()
     return results
 
-def get_movie_links(permalink):
-    if not permalink.startswith("http"):
-        permalink = "https://hdhub4u.rehab" + permalink
-    print(f"\n[*] Fetching page: {permalink}")
-    response = requests.get(permalink, headers=HEADERS)
-    soup = BeautifulSoup(response.text, 'html.parser')
+def episode_source_links(permalink, episode, quality=None):
+    """Single-episode source links of one episode on a season page."""
+    permalink = MIRRORS.url(permalink)
+    index = get_season_index(permalink)
+    by_quality = index["episodes"].get(str(int(episode)), {})
+    links = []
+    for q, entries in by_quality.items():
+        if quality and quality.lower() not in q.lower():
+            continue
+        links.extend(e["url"] for e in entries if ALLOWED_DOMAINS.search(e["url"]))
+    links = list(dict.fromkeys(links))
+    progress(f"[*] Episode {episode}: {len(links)} source link(s)")
+    return links
+
+@timed("detail", "hdhub4u")
+def page_source_links(permalink):
+    """Every source link on a post page."""
+    permalink = MIRRORS.url(permalink)
+    progress(f"\n[*] Fetching page: {permalink}")
+    response = MIRRORS.get(permalink)
+    extracted = parsepool.run(parse_source_links, response.content)
+    progress(f"[*] Found {len(extracted)} potential source links.")
+    return extracted
+
+def parse_source_links(html):
+    soup = _soup(html)
     
     a_tags = soup.select("h3 a, h4 a, .page-body > div a")
     
-    allowed_domains = re.compile(r"https://(.*\.)?(hdstream4u|hubstream|hblinks|hubcdn|hubdrive)\..*")
-    
     extracted = []
     for tag in a_tags:
         href = tag.get("href")
-        if href and allowed_domains.search(href):
+        if href and ALLOWED_DOMAINS.search(href):
             extracted.append(href)
     
-    extracted = list(set(extracted))
-    print(f"[*] Found {len(extracted)} potential source links.")
-    
-    for link in extracted:
-        try:
-            # Resolve obfuscated ?id= links
-            if "?id=" in link:
-                final_link = get_redirect_links(link)
-            else:
-                final_link = link
-                
-            print(f"\n=> Source: {final_link}")
-            
-            if final_link and ("hubdrive" in final_link.lower() or "hubcloud" in final_link.lower()):
-                if "hubdrive" in final_link.lower():
-                    hd_resp = requests.get(final_link, headers=HEADERS)
-                    hd_soup = BeautifulSoup(hd_resp.text, 'html.parser')
-                    btn = hd_soup.find("a", class_="btn btn-primary btn-user btn-success1 m-1")
-                    if btn and btn.get("href"):
-                        final_link = btn.get("href")
-                
-                if final_link and "hubcloud" in final_link.lower():
-                    links = extract_hubcloud(final_link)
-                    for l in links:
-                        print(f"   - [{l['label']}] {l['url']}")
-            elif final_link and ("vidstack" in final_link.lower() or "hubstream" in final_link.lower()):
-                m3u8 = extract_vidstack(final_link)
-                print(f"   - [VidStack/Hubstream M3U8] {m3u8}")
-            else:
-                print(f"   - Needs matching extractor")
-        except Exception as e:
-            print(f"   [!] Error processing {link}: {e}")
-            import traceback
-            traceback.print_exc()
+    return list(set(extracted))
+
+def get_episode_links(permalink, episode, quality=None):
+    """Resolve only the single-episode links of one episode on a season page."""
+    return resolve_links(episode_source_links(permalink, episode, quality))
+
+def get_movie_links(permalink, episode=None):
+    if episode is not None:
+        return get_episode_links(permalink, episode)
+    return resolve_links(page_source_links(permalink))
+
+# ─── JSON API (same shape as src/index.js) ───
+
+# TMDB responses keyed by request path, shared with the other scrapers
+TMDB_CACHE = TTLCache("tmdb")
+TMDB_TTL = 24 * 3600
+
+@timed("tmdb", "hdhub4u")
+def tmdb_details(tmdb_id, kind):
+    key = f"{kind}/{tmdb_id}"
+    cached = TMDB_CACHE.get(key)
+    if cached is not None:
+        return cached
+    response = SESSION.get(f"https://api.themoviedb.org/3/{kind}/{tmdb_id}", params={"api_key": TMDB_API_KEY}, timeout=15)
+    if response.status_code != 200:
+        raise RuntimeError(f"TMDB details fetch failed: {response.status_code}")
+    details = response.json()
+    TMDB_CACHE.set(key, details, TMDB_TTL)
+    return details
+
+def pick_post(docs, season=None):
+    """Most recent hit, or for TV the first post that names the season."""
+    if season is not None:
+        for doc in docs:
+            title = doc.get("post_title", "")
+            if f"Season {season}" in title or f"S{int(season):02d}" in title:
+                return doc
+    return docs[0]
+
+def as_api_links(results):
+    links = [
+        {"name": "HDHub4u", "link": r["url"], "quality": "Auto" if r["label"] == "VidStack/Hubstream M3U8" else (r["label"] or "Unknown")}
+        for r in results if r.get("url")
+    ]
+    links.sort(key=lambda l: l["quality"])
+    return links
+
+# Whole API responses, kept until the first hubcloud / vidstack URL in them expires
+STREAM_CACHE = ResolvedStreamCache()
+
+def _api_link_urls(links):
+    return [l["link"] for l in links]
+
+def api_movie(tmdb_id):
+    return STREAM_CACHE.get_or_resolve("hdhub4u:api", tmdb_id, None, None, lambda: _api_movie(tmdb_id), _api_link_urls)
+
+def api_tv(tmdb_id, season, episode):
+    return STREAM_CACHE.get_or_resolve(
+        "hdhub4u:api", tmdb_id, season, episode, lambda: _api_tv(tmdb_id, season, episode), _api_link_urls
+    )
+
+def _api_movie(tmdb_id):
+    data = tmdb_details(tmdb_id, "movie")
+    year = (data.get("release_date") or "").split("-")[0]
+    docs = search(f"{data.get('title', '')} {year}".strip())
+    if not docs:
+        return []
+    return as_api_links(get_movie_links(pick_post(docs)["permalink"]))
+
+def _api_tv(tmdb_id, season, episode):
+    data = tmdb_details(tmdb_id, "tv")
+    docs = search(data.get("name", ""))
+    if not docs:
+        return []
+    permalink = pick_post(docs, season)["permalink"]
+    # Like the worker: all links of the post when no episode-specific links are found
+    results = get_episode_links(permalink, episode)
+    if not results:
+        results = get_movie_links(permalink)
+    return as_api_links(results)
+
+# ─── Provider interface (see common/providers.py) ───
+
+class HDHub4uProvider(Provider):
+    name = "hdhub4u"
+    budget = 25.0
+
+    def map(self, tmdb_id, kind, season=None, episode=None):
+        data = tmdb_details(tmdb_id, kind)
+        if kind == "movie":
+            year = (data.get("release_date") or "").split("-")[0]
+            docs = search(f"{data.get('title', '')} {year}".strip())
+        else:
+            docs = search(data.get("name", ""))
+        if not docs:
+            return None
+        return {"permalink": pick_post(docs, season if kind == "tv" else None)["permalink"], "episode": episode}
+
+    def list_servers(self, target):
+        links = []
+        if target["episode"] is not None:
+            links = episode_source_links(target["permalink"], target["episode"])
+        if not links:
+            links = page_source_links(target["permalink"])
+        return [{"name": urlparse(link).hostname, "url": link} for link in links]
+
+    def extract(self, target, server):
+        return [
+            make_link(self.name, r["url"], server=server["name"], label=r["label"])
+            for r in resolve_source(server["url"])
+        ]
+
+PROVIDER = HDHub4uProvider()
 
 def main():
+    # --profile DIR: sampling CPU profile + allocation report of the run (common/profiling.py)
+    profile_dir = None
+    if "--profile" in sys.argv:
+        i = sys.argv.index("--profile")
+        profile_dir = sys.argv[i + 1] if i + 1 < len(sys.argv) else "profile"
+        del sys.argv[i:i + 2]
+    with profiling.profile(profile_dir):
+        # batch [FILE|-] [--out FILE] [--workers N] ...: TMDB ids → JSONL (common/batch.py)
+        if len(sys.argv) > 1 and sys.argv[1].lower() == "batch":
+            batch.main(sys.argv[2:], api_movie, api_tv)
+        else:
+            interactive()
+
+def interactive():
     print("=== HDHub4u Link Scraper ===")
     query = input("Enter Movie/TV Show to search: ")
     docs = search(query)
@@ -212,15 +653,22 @@ def main():
     try:
         idx = int(choice)
         selected = docs[idx]
-        get_movie_links(selected.get("permalink"))
     except (ValueError, IndexError):
         print("Invalid choice.")
+        return
+
+    episode = None
+    if re.search(r"season|episode", selected.get("post_title", ""), re.I):
+        ep_choice = input("Episode number (Enter for all links): ").strip()
+        if ep_choice.isdigit():
+            episode = int(ep_choice)
+    get_movie_links(selected.get("permalink"), episode)
 
 if __name__ == "__main__":
     main()
 
 
-"""
+r"""
 Tv Show response -->
 ```
 python hdhub4u_scraper.py
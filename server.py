@@ -0,0 +1,464 @@
+"""
+HTTP service mode for the Python scrapers.
+
+Serves the same routes and JSON bodies as the Cloudflare workers, from one
+long-lived process: scraper modules are imported once, so their sessions,
+caches and the StreamFlix Firebase connection stay warm between requests.
+
+Routes:
+    GET /                                   → service info
+    GET /stats                              → per-host limits, breakers, latency percentiles, retry budgets,
+                                              per-stage timings
+    GET /metrics                            → per-stage histograms and counters (Prometheus text)
+    GET /{provider}/movie/{tmdb_id}         → provider's worker response
+    GET /{provider}/tv/{tmdb_id}/{s}/{e}
+    GET /movie/{tmdb_id}, /tv/{tmdb_id}/{s}/{e}   → --default provider
+    GET /all/movie/{tmdb_id}[?providers=a,b&budget=S]  → every provider at once,
+                                            normalized links (common/aggregator.py)
+
+Add ?format=ndjson or ?format=sse to any movie/tv route for a progressive
+response: one record per link as soon as its extractor finishes, provider
+status records, then a final {"type": "summary"} record.
+
+Add ?timeout=S (at most REQUEST_TIMEOUT) to bound a lookup: every stage's
+timeouts are cut to what is left of S, work still running at S is abandoned,
+and /all and progressive responses return the links found so far.
+
+Providers: watch32, hdhub4u, streamflix, yflix
+
+Usage:
+    python server.py [--host 127.0.0.1] [--port 8787] [--workers 16] [--default watch32] [--no-preload] [--verbose]
+                     [--parse-workers N|auto]
+
+Scraper progress lines and the request log are off unless --verbose is
+given; per-stage timings are always collected (common/metrics.py).
+--parse-workers moves parsing of large pages into worker processes
+(common/parsepool.py).
+"""
+
+import os
+import re
+import sys
+import json
+import time
+import asyncio
+import contextlib
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlsplit, parse_qs
+
+ROOT = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, ROOT)
+
+from common.errors import ApiError
+from common import http, metrics, parsepool, resilience
+from common.deadline import Deadline, DeadlineExceeded, deadline_scope
+from common.aggregator import collect, progressive
+from common.providers import PROVIDERS, load_provider
+
+REQUEST_TIMEOUT = 60
+# Extra wait for a provider call to notice its deadline before answering 504
+DEADLINE_GRACE = 2
+MAX_HEADER_BYTES = 16 * 1024
+MAX_BODY_BYTES = 64 * 1024
+KEEPALIVE_TIMEOUT = 30
+
+CORS_HEADERS = {
+    "Access-Control-Allow-Origin": "*",
+    "Access-Control-Allow-Methods": "GET, OPTIONS",
+    "Access-Control-Allow-Headers": "Content-Type",
+}
+
+STATUS_TEXT = {
+    200: "OK", 204: "No Content", 400: "Bad Request", 404: "Not Found",
+    405: "Method Not Allowed", 431: "Request Header Fields Too Large",
+    500: "Internal Server Error", 503: "Service Unavailable", 504: "Gateway Timeout",
+}
+
+STREAM_FORMATS = {"ndjson": "application/x-ndjson", "sse": "text/event-stream"}
+
+MOVIE_ROUTE = re.compile(r"^(?:/(?P<provider>[a-z0-9]+))?/movie/(?P<id>\d+)/?$")
+TV_ROUTE = re.compile(r"^(?:/(?P<provider>[a-z0-9]+))?/tv/(?P<id>\d+)/(?P<season>\d+)/(?P<episode>\d+)/?$")
+
+
+# ─── Providers ───────────────────────────────────────────────────────────────
+
+def warm_up(names):
+    """Import providers and prefetch StreamFlix config + catalog before the first request."""
+    for name in names:
+        try:
+            module = load_provider(name)
+            if name == "streamflix":
+                module.get_config()
+                module.get_catalog_item(0)
+            print(f"   ✅ {name} ready")
+        except Exception as e:
+            print(f"   ⚠️  {name} unavailable: {e}")
+
+
+# ─── HTTP ────────────────────────────────────────────────────────────────────
+
+def encode_response(status, body=None, keep_alive=True):
+    """JSON response, or text/plain when body is a str (the Prometheus exposition)."""
+    if isinstance(body, str):
+        payload = body.encode("utf-8")
+    else:
+        payload = b"" if body is None else json.dumps(body).encode("utf-8")
+    headers = {
+        **CORS_HEADERS,
+        "Content-Length": str(len(payload)),
+        "Connection": "keep-alive" if keep_alive else "close",
+    }
+    if isinstance(body, str):
+        headers["Content-Type"] = "text/plain; version=0.0.4; charset=utf-8"
+    elif body is not None:
+        headers["Content-Type"] = "application/json"
+    head = f"HTTP/1.1 {status} {STATUS_TEXT.get(status, 'OK')}\r\n"
+    head += "".join(f"{k}: {v}\r\n" for k, v in headers.items())
+    return head.encode("latin-1") + b"\r\n" + payload
+
+
+class Progressive:
+    """A route result streamed record by record (NDJSON lines or SSE events)."""
+
+    def __init__(self, records, fmt):
+        self.records = records
+        self.fmt = fmt
+        self.content_type = STREAM_FORMATS[fmt]
+
+    def encode(self, record):
+        data = json.dumps(record)
+        if self.fmt == "sse":
+            return f"event: {record.get('type', 'message')}\ndata: {data}\n\n".encode("utf-8")
+        return f"{data}\n".encode("utf-8")
+
+
+async def write_progressive(writer, body, chunked, keep_alive):
+    """Stream a Progressive body; chunked on HTTP/1.1, close-delimited otherwise."""
+    headers = {
+        **CORS_HEADERS,
+        "Content-Type": body.content_type,
+        "Cache-Control": "no-cache",
+        "Connection": "keep-alive" if keep_alive else "close",
+    }
+    if chunked:
+        headers["Transfer-Encoding"] = "chunked"
+    head = "HTTP/1.1 200 OK\r\n" + "".join(f"{k}: {v}\r\n" for k, v in headers.items())
+    writer.write(head.encode("latin-1") + b"\r\n")
+    await writer.drain()
+
+    async with contextlib.aclosing(body.records) as records:
+        async for record in records:
+            payload = body.encode(record)
+            writer.write(b"%x\r\n%s\r\n" % (len(payload), payload) if chunked else payload)
+            # A client that hangs up raises here, which closes the generator and cancels the providers
+            await writer.drain()
+    if chunked:
+        writer.write(b"0\r\n\r\n")
+        await writer.drain()
+
+
+class Service:
+    def __init__(self, default_provider="watch32", workers=16):
+        self.default_provider = default_provider
+        self.slots = asyncio.Semaphore(workers)
+        self.started = time.time()
+        self.served = 0
+        self.overrunning = 0   # timed-out scraper threads still running (holding a slot)
+
+    def info(self, host):
+        base = f"http://{host}" if host else ""
+        return {
+            "service": "Python Scrapers Video Links API",
+            "providers": sorted(PROVIDERS),
+            "defaultProvider": self.default_provider,
+            "movieUrlPattern": f"{base}/{{provider}}/movie/{{tmdbId}}",
+            "tvUrlPattern": f"{base}/{{provider}}/tv/{{tmdbId}}/{{season}}/{{episode}}",
+            "examples": {
+                "movie": f"{base}/watch32/movie/550",
+                "tv": f"{base}/streamflix/tv/1396/1/1",
+                "all": f"{base}/all/movie/550",
+            },
+            "uptime": int(time.time() - self.started),
+            "served": self.served,
+            "overrunning": self.overrunning,
+        }
+
+    async def route(self, method, target, headers):
+        """(status, body) for one request."""
+        if method == "OPTIONS":
+            return 204, None
+        if method != "GET":
+            return 405, {"error": "Method not allowed"}
+
+        path = urlsplit(target).path
+        if path in ("", "/"):
+            return 200, self.info(headers.get("host", ""))
+        if path.rstrip("/") == "/stats":
+            return 200, {
+                "hosts": http.stats(), **resilience.stats(),
+                "stages": metrics.snapshot(), "parsePool": parsepool.stats(),
+            }
+        if path.rstrip("/") == "/metrics":
+            return 200, metrics.prometheus()
+
+        movie = MOVIE_ROUTE.match(path)
+        tv = TV_ROUTE.match(path)
+        match = movie or tv
+        if not match:
+            return 404, {"error": "Not found. Use /{provider}/movie/{tmdbId} or /{provider}/tv/{tmdbId}/{season}/{episode}"}
+
+        provider = match.group("provider") or self.default_provider
+        query = parse_qs(urlsplit(target).query)
+        if provider != "all" and provider not in PROVIDERS:
+            return 404, {"error": f"Unknown provider: {provider}", "providers": sorted(PROVIDERS)}
+        try:
+            sla = self.sla(query)
+        except ApiError as e:
+            return e.status, e.to_json()
+
+        fmt = query.get("format", ["json"])[0]
+        if fmt != "json":
+            if fmt not in STREAM_FORMATS:
+                return 400, {"error": f"format must be json, {' or '.join(STREAM_FORMATS)}"}
+            return self.progressive(match, query, None if provider == "all" else [provider], fmt, sla)
+        if provider == "all":
+            return await self.call_all(match, query, sla)
+
+        if movie:
+            call = ("api_movie", match.group("id"))
+        else:
+            call = ("api_tv", match.group("id"), int(match.group("season")), int(match.group("episode")))
+        return await self.call(provider, *call, sla=sla)
+
+    @staticmethod
+    def sla(query):
+        """Seconds the lookup may take (?timeout=S), at most REQUEST_TIMEOUT."""
+        if "timeout" not in query:
+            return REQUEST_TIMEOUT
+        try:
+            seconds = float(query["timeout"][0])
+        except ValueError:
+            raise ApiError("timeout must be a number of seconds", 400)
+        if seconds <= 0:
+            raise ApiError("timeout must be positive", 400)
+        return min(seconds, REQUEST_TIMEOUT)
+
+    async def call(self, provider, fn_name, *args, sla=REQUEST_TIMEOUT):
+        """
+        Run one scraper call in a thread under a deadline of `sla` seconds.
+        A thread can't be cancelled: on a 504 it goes on until the scraper's
+        next deadline check raises, and keeps its slot until then, so
+        --workers still bounds the threads doing scraper work.
+        """
+        await self.slots.acquire()
+        work = None
+        try:
+            module = await asyncio.to_thread(load_provider, provider)
+            fn = getattr(module, fn_name)
+            # The task copies the context, so the scraper thread sees the deadline
+            with deadline_scope(sla):
+                work = asyncio.ensure_future(asyncio.to_thread(fn, *args))
+            body = await asyncio.wait_for(asyncio.shield(work), sla + DEADLINE_GRACE)
+            self.served += 1
+            return 200, body
+        except ApiError as e:
+            return e.status, e.to_json()
+        except ImportError as e:
+            return 503, {"error": f"Provider {provider} unavailable: {e}"}
+        except (asyncio.TimeoutError, DeadlineExceeded):
+            return 504, {"error": f"Timed out after {sla:g}s"}
+        except Exception as e:
+            return 500, {"error": f"Internal error: {e}"}
+        finally:
+            if work is None or work.done():
+                self.slots.release()
+            else:
+                self.overrunning += 1
+                work.add_done_callback(self._overrun_done)
+
+    def _overrun_done(self, work):
+        # Consume the outcome nobody is waiting for any more
+        if not work.cancelled():
+            work.exception()
+        self.overrunning -= 1
+        self.slots.release()
+
+    @staticmethod
+    def lookup_args(match, query):
+        """(tmdb_id, kind, season, episode, aggregator kwargs) or raise ApiError."""
+        tv = "season" in match.groupdict()
+        kwargs = {}
+        if "providers" in query:
+            kwargs["providers"] = query["providers"][0].split(",")
+        if "budget" in query:
+            try:
+                kwargs["default_budget"] = float(query["budget"][0])
+            except ValueError:
+                raise ApiError("budget must be a number of seconds", 400)
+        return (
+            match.group("id"),
+            "tv" if tv else "movie",
+            int(match.group("season")) if tv else None,
+            int(match.group("episode")) if tv else None,
+            kwargs,
+        )
+
+    async def call_all(self, match, query, sla=REQUEST_TIMEOUT):
+        try:
+            tmdb_id, kind, season, episode, kwargs = self.lookup_args(match, query)
+        except ApiError as e:
+            return e.status, e.to_json()
+        async with self.slots:
+            result = await collect(tmdb_id, kind, season, episode, deadline=Deadline(sla), **kwargs)
+        self.served += 1
+        return 200, {"type": kind, "tmdbId": tmdb_id, "season": season, "episode": episode, **result}
+
+    def progressive(self, match, query, providers, fmt, sla=REQUEST_TIMEOUT):
+        try:
+            tmdb_id, kind, season, episode, kwargs = self.lookup_args(match, query)
+        except ApiError as e:
+            return e.status, e.to_json()
+        if providers:
+            kwargs["providers"] = providers
+
+        async def records():
+            async with self.slots:
+                # Started once a worker slot is free, so queueing doesn't eat the SLA
+                deadline = Deadline(sla)
+                async for record in progressive(tmdb_id, kind, season, episode, deadline=deadline, **kwargs):
+                    yield record
+            self.served += 1
+
+        return 200, Progressive(records(), fmt)
+
+    async def handle(self, reader, writer):
+        try:
+            while True:
+                try:
+                    head = await asyncio.wait_for(reader.readuntil(b"\r\n\r\n"), KEEPALIVE_TIMEOUT)
+                except (asyncio.IncompleteReadError, asyncio.TimeoutError, ConnectionError):
+                    return
+                except asyncio.LimitOverrunError:
+                    writer.write(encode_response(431, {"error": "Headers too large"}, keep_alive=False))
+                    await writer.drain()
+                    return
+
+                lines = head.decode("latin-1").split("\r\n")
+                try:
+                    method, target, version = lines[0].split(" ", 2)
+                except ValueError:
+                    writer.write(encode_response(400, {"error": "Bad request line"}, keep_alive=False))
+                    await writer.drain()
+                    return
+                headers = {}
+                for line in lines[1:]:
+                    if ":" in line:
+                        k, v = line.split(":", 1)
+                        headers[k.strip().lower()] = v.strip()
+
+                # GET bodies are not used, but must be consumed to keep the connection in sync
+                length = headers.get("content-length") or "0"
+                if not length.isdigit():
+                    writer.write(encode_response(400, {"error": "Bad Content-Length"}, keep_alive=False))
+                    await writer.drain()
+                    return
+                if int(length) > MAX_BODY_BYTES:
+                    writer.write(encode_response(413, {"error": "Body too large"}, keep_alive=False))
+                    await writer.drain()
+                    return
+                if int(length):
+                    try:
+                        await asyncio.wait_for(reader.readexactly(int(length)), KEEPALIVE_TIMEOUT)
+                    except (asyncio.IncompleteReadError, asyncio.TimeoutError, ConnectionError):
+                        return
+
+                keep_alive = (
+                    headers.get("connection", "").lower() != "close"
+                    if version == "HTTP/1.1"
+                    else headers.get("connection", "").lower() == "keep-alive"
+                )
+
+                started = time.perf_counter()
+                status, body = await self.route(method.upper(), target, headers)
+                if isinstance(body, Progressive):
+                    chunked = version == "HTTP/1.1"
+                    keep_alive = keep_alive and chunked
+                    try:
+                        await write_progressive(writer, body, chunked, keep_alive)
+                    except ConnectionError:
+                        return
+                else:
+                    writer.write(encode_response(status, body, keep_alive))
+                    await writer.drain()
+                metrics.progress(f"🌐 {method} {target} → {status} ({(time.perf_counter() - started) * 1000:.0f}ms)")
+                if not keep_alive:
+                    return
+        finally:
+            writer.close()
+
+
+async def serve(host, port, default_provider, workers, preload):
+    loop = asyncio.get_running_loop()
+    # Scraper calls are blocking; size the pool to the concurrency limit
+    loop.set_default_executor(ThreadPoolExecutor(max_workers=workers + 4, thread_name_prefix="scraper"))
+    service = Service(default_provider, workers)
+
+    if preload:
+        print("🔥 Warming up providers...")
+        await asyncio.to_thread(warm_up, preload)
+
+    server = await asyncio.start_server(service.handle, host, port, limit=MAX_HEADER_BYTES)
+    print(f"🚀 Listening on http://{host}:{port} (default provider: {default_provider})")
+    async with server:
+        await server.serve_forever()
+
+
+# ─── Main ────────────────────────────────────────────────────────────────────
+
+def main():
+    host, port, workers, default_provider = "127.0.0.1", 8787, 16, "watch32"
+    preload = list(PROVIDERS)
+    verbose = False
+    args = sys.argv[1:]
+    i = 0
+    while i < len(args):
+        if args[i] == "--host" and i + 1 < len(args):
+            host = args[i + 1]
+            i += 2
+        elif args[i] == "--port" and i + 1 < len(args):
+            port = int(args[i + 1])
+            i += 2
+        elif args[i] == "--workers" and i + 1 < len(args):
+            workers = int(args[i + 1])
+            i += 2
+        elif args[i] == "--default" and i + 1 < len(args):
+            default_provider = args[i + 1]
+            i += 2
+        elif args[i] == "--no-preload":
+            preload = []
+            i += 1
+        elif args[i] == "--verbose":
+            verbose = True
+            i += 1
+        elif args[i] == "--parse-workers" and i + 1 < len(args):
+            parsepool.configure(parsepool.workers_from(args[i + 1]))
+            i += 2
+        elif args[i] in ("-h", "--help"):
+            print(__doc__)
+            return
+        else:
+            i += 1
+
+    if default_provider not in PROVIDERS:
+        print(f"❌ Unknown provider: {default_provider} (choose from {', '.join(sorted(PROVIDERS))})")
+        return
+
+    metrics.console(enabled=verbose)
+    try:
+        asyncio.run(serve(host, port, default_provider, workers, preload))
+    except KeyboardInterrupt:
+        print("\n👋 Stopped")
+
+
+if __name__ == "__main__":
+    main()
@@ -7,6 +7,16 @@ Usage:
     python streamflix_test.py tv <tmdb_id> [--season N] [--episode N]
     python streamflix_test.py list
     python streamflix_test.py search <query>
+    python streamflix_test.py batch [FILE|-] [--out FILE] [--workers N] [--deadline S] [--retry-errors]
+
+Add --deadline S to any command to cap the whole lookup at S seconds,
+--timings to print how long each stage took, or --quiet to hide progress.
+--profile DIR writes a sampling CPU profile and allocation report of the run
+to DIR (see common/profiling.py).
+
+batch reads "movie <id>" / "tv <id> <season> <episode>" lines and writes one
+JSON record per title as it resolves; with --out it appends to that file and
+skips titles already in it (see common/batch.py).
 """
 
 import sys
@@ -14,10 +24,18 @@ import os
 import json
 import re
 import time
-import requests
-import websocket
+import itertools
 import threading
 
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from common.cache import TTLCache
+from common.errors import ApiError
+from common import batch, deadline, metrics, profiling, resilience
+from common.http import Session
+from common.metrics import add_bytes, progress, timed
+from common.providers import Provider, make_link
+
 # Fix encoding for Windows PowerShell
 if sys.platform == "win32":
     os.environ["PYTHONIOENCODING"] = "utf-8"
@@ -38,33 +56,117 @@ HEADERS = {
     "Connection": "keep-alive",
 }
 
+SESSION = Session()
+
+# Service mode (server.py) keeps config + catalog in memory and refreshes them
+# at most this often; the CLI commands still fetch fresh copies. Copies are
+# shared through the cache backend, so one worker refreshes for all of them.
+CONFIG_TTL = 15 * 60
+CATALOG_TTL = 15 * 60
+SHARED_CACHE = TTLCache("streamflix:shared")
+# How long one worker may hold the claim to refresh a shared copy, and how
+# soon the others look for its result
+REFRESH_CLAIM_TTL = 60
+SHARED_RECHECK = 5
+EPISODES_CACHE = TTLCache("streamflix:episodes")
+EPISODES_TTL = 3600
+FIREBASE_KEEPALIVE = 45
+FIREBASE_QUERY_TIMEOUT = 15
+
 
 # ─── API Fetchers ────────────────────────────────────────────────────────────
 
+@timed("config", "streamflix")
 def fetch_config():
     """Fetch CDN configuration (premium/movies/tv base URLs)."""
-    print("📡 Fetching config...")
-    resp = requests.get(f"{API_BASE}/config/config-streamflixapp.json", headers=HEADERS, timeout=30)
+    progress("📡 Fetching config...")
+    resp = SESSION.get(f"{API_BASE}/config/config-streamflixapp.json", headers=HEADERS, timeout=30)
     resp.raise_for_status()
     config = resp.json()
-    print(f"   ✅ Config loaded — {len(config.get('premium', []))} premium CDNs, "
-          f"{len(config.get('movies', []))} movie CDNs, {len(config.get('tv', []))} tv CDNs")
+    progress(f"   ✅ Config loaded — {len(config.get('premium', []))} premium CDNs, "
+             f"{len(config.get('movies', []))} movie CDNs, {len(config.get('tv', []))} tv CDNs")
     return config
 
 
+@timed("catalog", "streamflix")
 def fetch_catalog():
     """Fetch the full content catalog."""
-    print("📡 Fetching catalog...")
-    resp = requests.get(f"{API_BASE}/data.json", headers=HEADERS, timeout=30)
+    progress("📡 Fetching catalog...")
+    resp = SESSION.get(f"{API_BASE}/data.json", headers=HEADERS, timeout=30)
     resp.raise_for_status()
     data = resp.json()
     items = data.get("data", [])
     movies = [i for i in items if not i.get("isTV")]
     shows = [i for i in items if i.get("isTV")]
-    print(f"   ✅ Catalog loaded — {len(movies)} movies, {len(shows)} TV shows ({len(items)} total)")
+    progress(f"   ✅ Catalog loaded — {len(movies)} movies, {len(shows)} TV shows ({len(items)} total)")
     return items
 
 
+class _Memo:
+    """
+    Last value of fetch(), refreshed once older than ttl; one refresh at a time.
+    The value is also kept under `name` in SHARED_CACHE: a live shared copy is
+    adopted instead of fetching, and when it is stale only the worker that
+    claims the refresh (SHARED_CACHE.add) fetches while the others keep
+    serving the previous copy.
+    """
+
+    def __init__(self, fetch, ttl, name):
+        self.fetch = fetch
+        self.ttl = ttl
+        self.name = name
+        self.value = None
+        self.loaded_at = 0.0
+        self.lock = threading.Lock()
+
+    def get(self):
+        with self.lock:
+            if self.value is None or time.monotonic() - self.loaded_at > self.ttl:
+                self._refresh()
+            return self.value
+
+    def _refresh(self):
+        entry = SHARED_CACHE.get_entry(self.name)
+        if entry is not None:
+            # Live or stale, the shared copy beats nothing
+            if not entry.expired or self.value is None:
+                self.value = entry.value
+            if not entry.expired:
+                self.loaded_at = time.monotonic() - max(0.0, self.ttl - (entry.expires_at - time.time()))
+                return
+            if not SHARED_CACHE.add(f"{self.name}:refreshing", True, REFRESH_CLAIM_TTL):
+                self.loaded_at = time.monotonic() - self.ttl + SHARED_RECHECK
+                return
+        try:
+            self.value = self.fetch()
+            self.loaded_at = time.monotonic()
+            SHARED_CACHE.set(self.name, self.value, self.ttl)
+        except Exception:
+            # Serve the previous copy rather than fail every request while the API is down
+            if self.value is None:
+                raise
+        finally:
+            if entry is not None:
+                SHARED_CACHE.delete(f"{self.name}:refreshing")
+
+
+def _fetch_catalog_index():
+    items = fetch_catalog()
+    return {str(i.get("tmdb", "")): i for i in items if i.get("tmdb")}
+
+
+_CONFIG = _Memo(fetch_config, CONFIG_TTL, "config")
+_CATALOG_INDEX = _Memo(_fetch_catalog_index, CATALOG_TTL, "catalog-index")
+
+
+def get_config():
+    return _CONFIG.get()
+
+
+def get_catalog_item(tmdb_id):
+    return _CATALOG_INDEX.get().get(str(tmdb_id))
+
+
 def find_by_tmdb(items, tmdb_id):
     """Find a catalog item by its TMDB ID."""
     tmdb_str = str(tmdb_id)
@@ -82,12 +184,13 @@ def find_by_query(items, query):
 
 # ─── WebSocket Episode Fetcher ───────────────────────────────────────────────
 
+@timed("firebase", "streamflix")
 def fetch_episodes_ws(movie_key, total_seasons=1):
     """
     Connect to Firebase RTDB WebSocket and fetch episode data
     for all seasons of a TV show.
     """
-    print(f"🔌 Connecting to Firebase WebSocket for '{movie_key}' ({total_seasons} season(s))...")
+    progress(f"🔌 Connecting to Firebase WebSocket for '{movie_key}' ({total_seasons} season(s))...")
 
     seasons_data = {}
     current_season = [1]
@@ -95,7 +198,7 @@ def fetch_episodes_ws(movie_key, total_seasons=1):
     done_event = threading.Event()
 
     def on_open(ws):
-        print(f"   ✅ WebSocket connected — requesting season {current_season[0]}")
+        progress(f"   ✅ WebSocket connected — requesting season {current_season[0]}")
         request_season(ws, movie_key, current_season[0])
 
     def request_season(ws, key, season_num):
@@ -127,7 +230,7 @@ def fetch_episodes_ws(movie_key, total_seasons=1):
             message_buffer[0] = ""
         except json.JSONDecodeError:
             if len(message_buffer[0]) > 100_000:
-                print("   ⚠️  Message buffer too large, clearing")
+                progress("   ⚠️  Message buffer too large, clearing")
                 message_buffer[0] = ""
                 done_event.set()
             return
@@ -146,14 +249,14 @@ def fetch_episodes_ws(movie_key, total_seasons=1):
         if isinstance(b, dict) and b.get("s") == "ok":
             season = current_season[0]
             ep_count = len(seasons_data.get(season, {}))
-            print(f"   ✅ Season {season} complete — {ep_count} episodes")
+            progress(f"   ✅ Season {season} complete — {ep_count} episodes")
 
             if current_season[0] < total_seasons:
                 current_season[0] += 1
-                print(f"   📡 Requesting season {current_season[0]}...")
+                progress(f"   📡 Requesting season {current_season[0]}...")
                 request_season(ws, movie_key, current_season[0])
             else:
-                print(f"   ✅ All {total_seasons} season(s) fetched")
+                progress(f"   ✅ All {total_seasons} season(s) fetched")
                 done_event.set()
                 ws.close()
             return
@@ -165,35 +268,24 @@ def fetch_episodes_ws(movie_key, total_seasons=1):
             season_match = re.search(r"seasons/(\d+)/episodes", path)
             season_num = int(season_match.group(1)) if season_match else current_season[0]
 
-            episode_map = {}
-            for key, ep in episodes_raw.items():
-                try:
-                    episode_map[int(key)] = {
-                        "key": ep.get("key", 0),
-                        "name": ep.get("name", f"Episode {key}"),
-                        "link": ep.get("link", ""),
-                        "overview": ep.get("overview", ""),
-                        "runtime": ep.get("runtime", 0),
-                        "still_path": ep.get("still_path"),
-                        "vote_average": ep.get("vote_average", 0.0),
-                    }
-                except (ValueError, AttributeError):
-                    pass
+            episode_map = _parse_episodes(episodes_raw)
 
             if episode_map:
                 existing = seasons_data.get(season_num, {})
                 existing.update(episode_map)
                 seasons_data[season_num] = existing
-                print(f"   📺 Season {season_num}: received {len(episode_map)} episodes ({len(existing)} total)")
+                progress(f"   📺 Season {season_num}: received {len(episode_map)} episodes ({len(existing)} total)")
 
     def on_error(ws, error):
-        print(f"   ❌ WebSocket error: {error}")
+        progress(f"   ❌ WebSocket error: {error}")
         done_event.set()
 
     def on_close(ws, code, reason):
-        print(f"   🔌 WebSocket closed ({code}: {reason})")
+        progress(f"   🔌 WebSocket closed ({code}: {reason})")
         done_event.set()
 
+    import websocket  # websocket-client, only needed once Firebase is queried
+
     ws = websocket.WebSocketApp(
         FIREBASE_WS,
         on_open=on_open,
@@ -205,15 +297,236 @@ def fetch_episodes_ws(movie_key, total_seasons=1):
     ws_thread = threading.Thread(target=ws.run_forever, daemon=True)
     ws_thread.start()
 
-    # Wait up to 30 seconds
-    done_event.wait(timeout=30)
+    # Wait up to 30 seconds (less if the lookup's deadline is sooner)
+    wait = deadline.remaining_timeout(30)
+    done_event.wait(timeout=wait)
     if not done_event.is_set():
-        print("   ⚠️  Timeout after 30 seconds")
+        progress(f"   ⚠️  Timeout after {wait:.0f} seconds")
         ws.close()
 
     return seasons_data
 
 
+# ─── Persistent Firebase Connection ──────────────────────────────────────────
+
+def _parse_episodes(episodes_raw):
+    """Firebase episodes node → {0-based index: episode dict}."""
+    if isinstance(episodes_raw, list):
+        episodes_raw = {str(i): ep for i, ep in enumerate(episodes_raw) if ep}
+    episode_map = {}
+    for key, ep in (episodes_raw or {}).items():
+        try:
+            episode_map[int(key)] = {
+                "key": ep.get("key", 0),
+                "name": ep.get("name", f"Episode {key}"),
+                "link": ep.get("link", ""),
+                "overview": ep.get("overview", ""),
+                "runtime": ep.get("runtime", 0),
+                "still_path": ep.get("still_path"),
+                "vote_average": ep.get("vote_average", 0.0),
+            }
+        except (ValueError, AttributeError):
+            pass
+    return episode_map
+
+
+class FirebaseClient:
+    """
+    One long-lived RTDB WebSocket shared by every request of the process.
+
+    Queries are multiplexed by request id: the data push for a path arrives
+    first, then the "ok" status for the request id that asked for it. The
+    connection is opened on first use, kept alive with "0" frames and
+    re-opened by the next query after any error.
+    """
+
+    def __init__(self, url=FIREBASE_WS):
+        self.url = url
+        self.ws = None
+        self.lock = threading.Lock()
+        self.send_lock = threading.Lock()
+        self.ids = itertools.count(1)
+        self.pending = {}   # request id → (path, Event, result dict)
+        self.data = {}      # path → latest data push, while a query for it is open
+        self.sizes = {}     # path → size of that push (characters)
+        self.listens = {}   # path → open queries; its push is dropped with the last one
+
+    def _connect(self):
+        with self.lock:
+            if self.ws is not None:
+                return self.ws
+            import websocket  # websocket-client, only needed once Firebase is queried
+
+            timeout = deadline.remaining_timeout(FIREBASE_QUERY_TIMEOUT)
+            ws = websocket.create_connection(self.url, timeout=timeout, header=[f"User-Agent: {HEADERS['User-Agent']}"])
+            ws.settimeout(None)
+            self.ws = ws
+            threading.Thread(target=self._reader, args=(ws,), daemon=True).start()
+            threading.Thread(target=self._keepalive, args=(ws,), daemon=True).start()
+            progress("🔌 Firebase WebSocket connected")
+            return ws
+
+    def _drop(self, ws, reason):
+        with self.lock:
+            if self.ws is not ws:
+                return
+            self.ws = None
+            pending, self.pending = self.pending, {}
+        try:
+            ws.close()
+        except Exception:
+            pass
+        for _, event, result in pending.values():
+            result["error"] = reason
+            event.set()
+
+    def _send(self, ws, payload):
+        with self.send_lock:
+            ws.send(payload if isinstance(payload, str) else json.dumps(payload))
+
+    def _keepalive(self, ws):
+        while self.ws is ws:
+            time.sleep(FIREBASE_KEEPALIVE)
+            if self.ws is not ws:
+                return
+            try:
+                self._send(ws, "0")
+            except Exception as e:
+                self._drop(ws, f"keepalive failed: {e}")
+                return
+
+    def _reader(self, ws):
+        buffer = ""
+        while True:
+            try:
+                text = ws.recv()
+            except Exception as e:
+                self._drop(ws, f"connection lost: {e}")
+                return
+            if not text:
+                self._drop(ws, "connection closed")
+                return
+            if not buffer and text.strip().isdigit():
+                continue  # frame count of a multi-frame message
+            buffer += text
+            try:
+                msg = json.loads(buffer)
+            except json.JSONDecodeError:
+                continue
+            size, buffer = len(buffer), ""
+            self._dispatch(msg, size)
+
+    def _dispatch(self, msg, size=0):
+        if msg.get("t") != "d":
+            return
+        d = msg.get("d") or {}
+        b = d.get("b") or {}
+        if d.get("a") == "d" and isinstance(b, dict):
+            path = (b.get("p") or "").strip("/")
+            with self.lock:
+                if self.listens.get(path):
+                    self.data[path] = b.get("d")
+                    self.sizes[path] = size
+            return
+        entry = self.pending.pop(d.get("r"), None)
+        if entry is None:
+            return
+        path, event, result = entry
+        if b.get("s") == "ok":
+            # Left in place until the last open query for the path is done (_close)
+            result["data"] = self.data.get(path)
+            result["bytes"] = self.sizes.get(path, 0)
+        else:
+            result["error"] = f"query failed: {b.get('s')} {b.get('d')}"
+        event.set()
+
+    @timed("firebase", "streamflix")
+    def query(self, path, timeout=FIREBASE_QUERY_TIMEOUT):
+        """One-shot read of a path; returns the data node (None when empty)."""
+        # Fail fast while the socket keeps failing instead of waiting out each timeout
+        deadline.check(f"Firebase query {path}")
+        breaker = resilience.breaker("firebase-rtdb")
+        probe = breaker.check()
+        settled = False
+        try:
+            try:
+                data = self._query(path, timeout)
+            except deadline.DeadlineExceeded:
+                raise
+            except Exception:
+                breaker.record_failure()
+                settled = True
+                raise
+            breaker.record_success()
+            settled = True
+            return data
+        finally:
+            # Our deadline, not the socket, ended it: hand a half-open probe back
+            if probe and not settled:
+                breaker.release_probe()
+
+    def _open(self, path):
+        with self.lock:
+            self.listens[path] = self.listens.get(path, 0) + 1
+
+    def _close(self, path):
+        with self.lock:
+            left = self.listens.pop(path, 1) - 1
+            if left:
+                self.listens[path] = left
+            else:
+                self.data.pop(path, None)
+                self.sizes.pop(path, None)
+
+    def _query(self, path, timeout):
+        path = path.strip("/")
+        self._open(path)
+        try:
+            for attempt in range(2):
+                deadline.check(f"Firebase query {path}")
+                ws = self._connect()
+                r = next(self.ids)
+                event = threading.Event()
+                result = {}
+                self.pending[r] = (path, event, result)
+                try:
+                    self._send(ws, {"t": "d", "d": {"a": "q", "r": r, "b": {"p": f"/{path}", "h": ""}}})
+                except Exception as e:
+                    self._drop(ws, f"send failed: {e}")
+                if not event.wait(deadline.remaining_timeout(timeout)):
+                    self.pending.pop(r, None)
+                    deadline.check(f"Firebase query {path}")
+                    raise TimeoutError(f"Firebase query timed out: {path}")
+                if "error" not in result:
+                    # Stop the server pushing later updates for this path
+                    try:
+                        self._send(ws, {"t": "d", "d": {"a": "n", "r": next(self.ids), "b": {"p": f"/{path}"}}})
+                    except Exception:
+                        pass
+                    add_bytes(result.get("bytes", 0))
+                    return result.get("data")
+                if attempt:
+                    raise ConnectionError(result["error"])
+            return None
+        finally:
+            self._close(path)
+
+
+FIREBASE = FirebaseClient()
+
+
+def get_season_episodes(movie_key, season):
+    """{0-based index: episode} for one season, over the shared connection."""
+    key = f"{movie_key}:{season}"
+    cached = EPISODES_CACHE.get(key)
+    if cached is not None:
+        return {int(k): v for k, v in cached.items()}
+    episodes = _parse_episodes(FIREBASE.query(f"Data/{movie_key}/seasons/{season}/episodes"))
+    if episodes:
+        EPISODES_CACHE.set(key, episodes, EPISODES_TTL)
+    return episodes
+
+
 # ─── Video Link Construction ─────────────────────────────────────────────────
 
 def build_movie_links(config, movie_link):
@@ -223,6 +536,8 @@ def build_movie_links(config, movie_link):
         links.append({"url": base_url + movie_link, "quality": "720p", "tier": "Premium"})
     for base_url in config.get("movies", []):
         links.append({"url": base_url + movie_link, "quality": "480p", "tier": "Movies"})
+    for base_url in config.get("download", []):
+        links.append({"url": base_url + movie_link, "quality": "1080p", "tier": "Standard"})
     return links
 
 
@@ -233,6 +548,8 @@ def build_tv_links(config, episode_link):
         links.append({"url": base_url + episode_link, "quality": "720p", "tier": "Premium"})
     for base_url in config.get("tv", []):
         links.append({"url": base_url + episode_link, "quality": "480p", "tier": "TV"})
+    for base_url in config.get("download", []):
+        links.append({"url": base_url + episode_link, "quality": "1080p", "tier": "Standard"})
     return links
 
 
@@ -403,29 +720,158 @@ def cmd_search(query):
         print_item(item, i)
 
 
+# ─── JSON API (same shape as src/index.js) ───────────────────────────────────
+
+def _api_item(tmdb_id):
+    item = get_catalog_item(tmdb_id)
+    if not item:
+        raise ApiError(f"No content found with TMDB ID: {tmdb_id}", 404)
+    return item
+
+
+def api_movie(tmdb_id):
+    """GET /movie/{tmdb_id} response body."""
+    item = _api_item(tmdb_id)
+    if item.get("isTV"):
+        raise ApiError(f"TMDB ID {tmdb_id} is a TV show, not a movie. Use /tv/{tmdb_id}/{{season}}/{{episode}}", 400)
+    movie_link = item.get("movielink") or ""
+    if not movie_link:
+        raise ApiError("No movie link available in catalog data", 404)
+    return {
+        "type": "movie",
+        "tmdbId": str(tmdb_id),
+        "title": item.get("moviename") or "Unknown",
+        "year": item.get("movieyear") or None,
+        "rating": item.get("movierating") or 0,
+        "duration": item.get("movieduration") or None,
+        "description": item.get("moviedesc") or None,
+        "poster": f"{TMDB_IMG}/{item['movieposter']}" if item.get("movieposter") else None,
+        "relativePath": movie_link,
+        "links": build_movie_links(get_config(), movie_link),
+    }
+
+
+def api_tv(tmdb_id, season, episode):
+    """GET /tv/{tmdb_id}/{season}/{episode} response body."""
+    item = _api_item(tmdb_id)
+    if not item.get("isTV"):
+        raise ApiError(f"TMDB ID {tmdb_id} is a movie, not a TV show. Use /movie/{tmdb_id}", 400)
+    movie_key = item.get("moviekey") or ""
+    if not movie_key:
+        raise ApiError("No movie key available for this TV show", 404)
+
+    episodes = get_season_episodes(movie_key, season)
+    if not episodes:
+        raise ApiError(f'No episodes found for season {season} of "{item.get("moviename")}"', 404)
+    # Episode index is 0-based in Firebase, the API is 1-based
+    ep = episodes.get(episode - 1)
+    if not ep:
+        raise ApiError(f'Episode {episode} not found in season {season} of "{item.get("moviename")}"', 404)
+    episode_link = ep.get("link") or ""
+    if not episode_link:
+        raise ApiError(f"No video link available for S{season}E{episode}", 404)
+
+    return {
+        "type": "tv",
+        "tmdbId": str(tmdb_id),
+        "title": item.get("moviename") or "Unknown",
+        "year": item.get("movieyear") or None,
+        "rating": item.get("movierating") or 0,
+        "poster": f"{TMDB_IMG}/{item['movieposter']}" if item.get("movieposter") else None,
+        "season": season,
+        "episode": episode,
+        "episodeName": ep.get("name") or f"Episode {episode}",
+        "episodeOverview": ep.get("overview") or None,
+        "episodeRating": ep.get("vote_average") or 0,
+        "episodeRuntime": ep.get("runtime") or 0,
+        "stillPath": f"{TMDB_IMG}{ep['still_path']}" if ep.get("still_path") else None,
+        "relativePath": episode_link,
+        "links": build_tv_links(get_config(), episode_link),
+    }
+
+
+# ─── Provider Interface (see common/providers.py) ─────────────────────────────
+
+class StreamFlixProvider(Provider):
+    name = "streamflix"
+    # Links are built from the catalog, only the Firebase query goes over the network
+    budget = 10.0
+
+    def map(self, tmdb_id, kind, season=None, episode=None):
+        item = get_catalog_item(tmdb_id)
+        if not item or bool(item.get("isTV")) != (kind == "tv"):
+            return None
+        if kind == "movie":
+            return {"kind": kind, "link": item["movielink"]} if item.get("movielink") else None
+        if not item.get("moviekey"):
+            return None
+        ep = get_season_episodes(item["moviekey"], season).get(episode - 1)
+        return {"kind": kind, "link": ep["link"]} if ep and ep.get("link") else None
+
+    def list_servers(self, target):
+        build = build_movie_links if target["kind"] == "movie" else build_tv_links
+        return [
+            {"name": link["tier"], "url": link["url"], "quality": link["quality"]}
+            for link in build(get_config(), target["link"])
+        ]
+
+    def extract(self, target, server):
+        return [make_link(self.name, server["url"], quality=server["quality"], server=server["name"])]
+
+    def catalog(self):
+        return [(str(i["tmdb"]), "tv" if i.get("isTV") else "movie") for i in fetch_catalog() if i.get("tmdb")]
+
+
+PROVIDER = StreamFlixProvider()
+
+
 # ─── Main ────────────────────────────────────────────────────────────────────
 
 def main():
-    if len(sys.argv) < 2:
+    profile_dir = None
+    if "--profile" in sys.argv:
+        i = sys.argv.index("--profile")
+        profile_dir = sys.argv[i + 1] if i + 1 < len(sys.argv) else "profile"
+        del sys.argv[i:i + 2]
+    if len(sys.argv) > 1 and sys.argv[1].lower() == "batch":
+        # --deadline applies per title here (see common/batch.py)
+        with profiling.profile(profile_dir):
+            batch.main(sys.argv[2:], api_movie, api_tv)
+        return
+
+    seconds = None
+    if "--deadline" in sys.argv:
+        i = sys.argv.index("--deadline")
+        seconds = float(sys.argv[i + 1]) if i + 1 < len(sys.argv) else None
+        del sys.argv[i:i + 2]
+    if "--quiet" in sys.argv or "--timings" in sys.argv:
+        metrics.console(enabled="--quiet" not in sys.argv, timings="--timings" in sys.argv)
+        sys.argv = [a for a in sys.argv if a not in ("--quiet", "--timings")]
+    with profiling.profile(profile_dir), deadline.deadline_scope(seconds):
+        run(sys.argv)
+
+
+def run(argv):
+    if len(argv) < 2:
         print(__doc__)
         return
 
-    command = sys.argv[1].lower()
+    command = argv[1].lower()
 
-    if command == "movie" and len(sys.argv) >= 3:
-        cmd_movie(sys.argv[2])
+    if command == "movie" and len(argv) >= 3:
+        cmd_movie(argv[2])
 
-    elif command == "tv" and len(sys.argv) >= 3:
-        tmdb_id = sys.argv[2]
+    elif command == "tv" and len(argv) >= 3:
+        tmdb_id = argv[2]
         season = None
         episode = None
         i = 3
-        while i < len(sys.argv):
-            if sys.argv[i] == "--season" and i + 1 < len(sys.argv):
-                season = int(sys.argv[i + 1])
+        while i < len(argv):
+            if argv[i] == "--season" and i + 1 < len(argv):
+                season = int(argv[i + 1])
                 i += 2
-            elif sys.argv[i] == "--episode" and i + 1 < len(sys.argv):
-                episode = int(sys.argv[i + 1])
+            elif argv[i] == "--episode" and i + 1 < len(argv):
+                episode = int(argv[i + 1])
                 i += 2
             else:
                 i += 1
@@ -434,8 +880,8 @@ def main():
     elif command == "list":
         cmd_list()
 
-    elif command == "search" and len(sys.argv) >= 3:
-        cmd_search(" ".join(sys.argv[2:]))
+    elif command == "search" and len(argv) >= 3:
+        cmd_search(" ".join(argv[2:]))
 
     else:
         print(__doc__)
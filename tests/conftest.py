@@ -0,0 +1,9 @@
+import os
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# The scrapers are run as scripts from their own directories
+for path in (ROOT, os.path.join(ROOT, "watch32"), os.path.join(ROOT, "POC")):
+    if path not in sys.path:
+        sys.path.insert(0, path)
@@ -0,0 +1,81 @@
+import time
+
+import pytest
+
+from common.cache import AdaptiveTTLCache, MemoryBackend, ResolvedStreamCache, ttl_for_urls, url_expiry
+
+
+def _cache():
+    return AdaptiveTTLCache("test:adaptive", default_ttl=100, min_ttl=10, max_ttl=1000, backend=MemoryBackend())
+
+
+def _ttl(cache, key):
+    return cache.get_entry(key).value["ttl"]
+
+
+def test_unchanged_value_doubles_ttl():
+    cache = _cache()
+    cache.get_or_fetch("k", lambda: "a")
+    cache.backend.set(cache._key("k"), cache.backend.get(cache._key("k"))[0], 0)
+    cache.get_or_fetch("k", lambda: "a")
+    assert _ttl(cache, "k") == 200
+
+
+def test_forced_expiry_shrinks_ttl_even_when_unchanged():
+    cache = _cache()
+    cache.get_or_fetch("k", lambda: "a")
+    cache.expire("k")
+    assert cache.get("k") is None
+    assert cache.get_or_fetch("k", lambda: "a") == "a"
+    assert _ttl(cache, "k") == 50
+    assert "forced" not in cache.get_entry("k").value
+
+
+def test_forced_expiry_respects_min_ttl():
+    cache = _cache()
+    cache.get_or_fetch("k", lambda: "a")
+    for _ in range(6):
+        cache.expire("k")
+        cache.get_or_fetch("k", lambda: "b")
+    assert _ttl(cache, "k") == 10
+
+
+def test_expired_url_is_not_cached():
+    now = time.time()
+    expired = f"https://cdn.example/hls/master.m3u8?expires={int(now) - 60}"
+    assert url_expiry(expired, now) == int(now) - 60
+    assert ttl_for_urls([expired], 1800, now=now) == 0
+    assert ttl_for_urls([f"https://cdn.example/a.m3u8?e={int(now * 1000) - 5000}"], 1800, now=now) == 0
+
+
+def test_url_expiring_within_margin_is_not_cached():
+    now = time.time()
+    url = f"https://cdn.example/hls/master.m3u8?expires={int(now) + 60}"
+    assert ttl_for_urls([url], 1800, margin=120, now=now) == 0
+
+
+def test_future_expiry_bounds_ttl():
+    now = time.time()
+    url = f"https://cdn.example/v4/sig/{int(now) + 3600}/master.m3u8"
+    assert ttl_for_urls([url], 7200, margin=120, now=now) == pytest.approx(3600 - 120, abs=1)
+
+
+def test_past_signing_time_and_far_future_values_are_ignored():
+    now = time.time()
+    signed = f"https://cdn.example/a.m3u8?t={int(now) - 600}&id=1"
+    far = f"https://cdn.example/a.m3u8?expires={int(now) + 400 * 24 * 3600}"
+    assert url_expiry(signed, now) is None
+    assert url_expiry(far, now) is None
+    assert ttl_for_urls([signed, far], 1800, now=now) == 1800
+
+
+def test_expired_streams_are_not_stored():
+    cache = ResolvedStreamCache(backend=MemoryBackend())
+    expired = f"https://cdn.example/master.m3u8?expires={int(time.time()) - 60}"
+    assert cache.put_streams("p", "1", 1, 1, [expired], urls=[expired]) == 0
+    assert cache.get_streams("p", "1", 1, 1) is None
+
+
+def test_season_zero_is_its_own_key():
+    assert ResolvedStreamCache.stream_key("p", "1", 0, 1) != ResolvedStreamCache.stream_key("p", "1", None, 1)
+    assert ResolvedStreamCache.stream_key("p", "1") != ResolvedStreamCache.stream_key("p", "1", 0, 0)
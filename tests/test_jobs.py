@@ -0,0 +1,84 @@
+import os
+import socket
+import subprocess
+import sys
+
+import pytest
+
+from common import jobs
+from common.jobs import JobQueue
+
+
+@pytest.fixture
+def queue(tmp_path):
+    return JobQueue(str(tmp_path / "jobs.sqlite"), max_attempts=2)
+
+
+def _state(queue, job_id):
+    with queue._lock:
+        return queue._conn.execute("SELECT state, attempts FROM jobs WHERE id = ?", (job_id,)).fetchone()
+
+
+def _dead_pid():
+    proc = subprocess.Popen([sys.executable, "-c", "pass"])
+    proc.wait()
+    return proc.pid
+
+
+def test_claim_leases_deepest_job_once(queue):
+    queue.add([jobs.title_job("p", "1", "tv"), jobs.season_job("p", "1", 1)])
+    job = queue.claim()
+    assert job.kind == "season" and job.attempts == 1
+    assert _state(queue, job.id) == ("running", 1)
+    assert queue.claim().kind == "title"
+    assert queue.claim() is None
+
+
+def test_claim_is_exclusive_across_connections(queue, tmp_path):
+    queue.add([jobs.title_job("p", "1", "movie")])
+    other = JobQueue(str(tmp_path / "jobs.sqlite"))
+    assert queue.claim() is not None
+    assert other.claim() is None
+
+
+def test_expired_lease_is_claimed_again(queue):
+    queue.add([jobs.title_job("p", "1", "movie")])
+    first = queue.claim()
+    assert queue.claim() is None
+    with queue._lock:
+        queue._conn.execute("UPDATE jobs SET lease_until = 0 WHERE id = ?", (first.id,))
+    again = queue.claim()
+    assert again.id == first.id and again.attempts == 2
+
+
+def test_release_hands_back_without_counting_the_attempt(queue):
+    queue.add([jobs.title_job("p", "1", "movie")])
+    job = queue.claim()
+    assert queue.release() == 1
+    assert _state(queue, job.id) == ("pending", 0)
+    assert queue.claim().id == job.id
+
+
+@pytest.mark.skipif(os.name != "posix", reason="recover() is POSIX only")
+def test_recover_picks_up_jobs_of_a_dead_runner(queue, tmp_path):
+    queue.add([jobs.title_job("p", "1", "movie"), jobs.title_job("p", "2", "movie")])
+    dead = JobQueue(str(tmp_path / "jobs.sqlite"))
+    dead.worker = f"{socket.gethostname()}:{_dead_pid()}"
+    lost = dead.claim()
+    alive = queue.claim()
+
+    assert queue.recover() == 1
+    assert _state(queue, lost.id)[0] == "pending"
+    assert _state(queue, alive.id)[0] == "running"
+
+
+def test_fail_retries_then_fails_for_good(queue):
+    queue.add([jobs.title_job("p", "1", "movie")])
+    job = queue.claim()
+    queue.fail(job, "boom")
+    assert _state(queue, job.id) == ("pending", 1)
+    with queue._lock:
+        queue._conn.execute("UPDATE jobs SET not_before = 0 WHERE id = ?", (job.id,))
+    job = queue.claim()
+    queue.fail(job, "boom")
+    assert _state(queue, job.id) == ("failed", 2)
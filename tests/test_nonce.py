@@ -0,0 +1,56 @@
+import os
+import json
+import random
+
+import pytest
+
+from nonce_bench import CORPUS_DIR
+from videostr_nonce import _TOKEN, NONCE_LEN, find_nonce, iter_script_blocks
+
+with open(os.path.join(CORPUS_DIR, "expected.json"), encoding="utf-8") as f:
+    EXPECTED = json.load(f)
+
+
+@pytest.mark.parametrize("name", sorted(EXPECTED))
+def test_corpus(name):
+    with open(os.path.join(CORPUS_DIR, name), "rb") as f:
+        raw = f.read()
+    assert find_nonce(raw) == EXPECTED[name]
+
+
+def _two_pass(raw):
+    """Scripts first, then the whole page, each scanned on its own."""
+    def scan(spans):
+        parts = []
+        for start, end in spans:
+            for match in _TOKEN.finditer(raw, start, end):
+                if len(match.group(0)) == NONCE_LEN:
+                    return match.group(0).decode()
+                if len(parts) < 3:
+                    parts.append(match.group(0))
+        return b"".join(parts).decode() if len(parts) == 3 else None
+    return scan(iter_script_blocks(raw)) or scan([(0, len(raw))])
+
+
+def _token(rng, n):
+    return "".join(rng.choice("abcXYZ0189") for _ in range(n))
+
+
+def test_single_pass_matches_scripts_then_page():
+    rng = random.Random(27)
+    for _ in range(500):
+        pieces = []
+        for _ in range(rng.randrange(1, 12)):
+            kind = rng.random()
+            if kind < 0.2:
+                pieces.append(f"<script{rng.choice(['', ' nonce=x'])}>")
+            elif kind < 0.35:
+                pieces.append(rng.choice(["</script>", "</SCRIPT>"]))
+            elif kind < 0.55:
+                pieces.append(f"'{_token(rng, 16)}'")
+            elif kind < 0.65:
+                pieces.append(f" {_token(rng, 48)} ")
+            else:
+                pieces.append(rng.choice([" x ", "<div>", "_" + _token(rng, 16), "é" + _token(rng, 16)]))
+        raw = "".join(pieces).encode()
+        assert find_nonce(raw) == _two_pass(raw), raw
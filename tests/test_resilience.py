@@ -0,0 +1,76 @@
+import time
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+from common import deadline, resilience
+from common.http import Session
+
+
+class _Handler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path.startswith("/api/slow"):
+            time.sleep(0.6)
+        self.send_response(200)
+        self.send_header("Content-Length", "2")
+        self.end_headers()
+        self.wfile.write(b"ok")
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def server():
+    httpd = ThreadingHTTPServer(("127.0.0.1", 0), _Handler)
+    httpd.daemon_threads = True
+    threading.Thread(target=httpd.serve_forever, daemon=True).start()
+    yield f"http://127.0.0.1:{httpd.server_address[1]}"
+    httpd.shutdown()
+    httpd.server_close()
+
+
+def _half_open(name):
+    breaker = resilience.breaker(name)
+    breaker.state, breaker.opened_at = "open", time.monotonic() - breaker.reset_timeout - 1
+    return breaker
+
+
+def test_release_probe_keeps_state():
+    breaker = resilience.CircuitBreaker("test/release")
+    breaker.state, breaker.opened_at = "open", 0.0
+    assert breaker.check() is True
+    assert not breaker.allow()
+    breaker.release_probe()
+    assert breaker.state == "half-open"
+    assert breaker.check() is True
+
+
+def test_closed_breaker_admits_without_probe():
+    assert resilience.CircuitBreaker("test/closed").check() is False
+
+
+def test_expired_deadline_does_not_leak_half_open_probe(server):
+    session = Session()
+    breaker = _half_open(resilience.endpoint_of(f"{server}/api/"))
+
+    with deadline.deadline_scope(0.2):
+        with pytest.raises(deadline.DeadlineExceeded):
+            session.get(f"{server}/api/slow", hedge=False, retries=0)
+    assert breaker.state == "half-open" and not breaker.probing
+
+    response = session.get(f"{server}/api/fast", hedge=False, retries=0)
+    assert response.status_code == 200
+    assert breaker.state == "closed"
+
+
+def test_spent_deadline_is_checked_before_taking_the_probe(server):
+    session = Session()
+    breaker = _half_open(resilience.endpoint_of(f"{server}/api/"))
+
+    with deadline.deadline_scope(0.01):
+        time.sleep(0.02)
+        with pytest.raises(deadline.DeadlineExceeded):
+            session.get(f"{server}/api/fast")
+    assert not breaker.probing
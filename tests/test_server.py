@@ -0,0 +1,55 @@
+import asyncio
+
+import pytest
+
+import server
+from common import metrics
+
+
+async def _exchange(raw):
+    service = server.Service(workers=1)
+    httpd = await asyncio.start_server(service.handle, "127.0.0.1", 0, limit=server.MAX_HEADER_BYTES)
+    port = httpd.sockets[0].getsockname()[1]
+    try:
+        reader, writer = await asyncio.open_connection("127.0.0.1", port)
+        writer.write(raw)
+        await writer.drain()
+        response = await asyncio.wait_for(reader.read(), 5)
+        writer.close()
+        return response
+    finally:
+        httpd.close()
+        await httpd.wait_closed()
+
+
+def _status(response):
+    return int(response.split(b" ", 2)[1])
+
+
+@pytest.mark.parametrize("length", [b"abc", b"-5", b"1e3", b"+7"])
+def test_malformed_content_length_is_400(length):
+    response = asyncio.run(_exchange(b"GET / HTTP/1.1\r\nHost: x\r\nContent-Length: " + length + b"\r\n\r\n"))
+    assert _status(response) == 400
+
+
+def test_oversized_body_is_413():
+    length = str(server.MAX_BODY_BYTES + 1).encode()
+    response = asyncio.run(_exchange(b"GET / HTTP/1.1\r\nHost: x\r\nContent-Length: " + length + b"\r\n\r\n"))
+    assert _status(response) == 413
+
+
+def test_body_is_consumed_and_request_served():
+    response = asyncio.run(_exchange(b"GET / HTTP/1.1\r\nConnection: close\r\nContent-Length: 2\r\n\r\nhi"))
+    assert _status(response) == 200
+
+
+def test_request_log_only_with_verbose(capsys):
+    metrics.console(enabled=False)  # what main() does without --verbose
+    try:
+        asyncio.run(_exchange(b"GET / HTTP/1.1\r\nConnection: close\r\n\r\n"))
+        assert "🌐" not in capsys.readouterr().out
+        metrics.console(enabled=True)
+        asyncio.run(_exchange(b"GET / HTTP/1.1\r\nConnection: close\r\n\r\n"))
+        assert "🌐 GET / → 200" in capsys.readouterr().out
+    finally:
+        metrics.console(enabled=True)
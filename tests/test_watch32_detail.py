@@ -0,0 +1,28 @@
+import requests
+
+import watch32_test as w32
+
+
+def test_failed_metadata_load_falls_back_to_default_once(monkeypatch):
+    calls = []
+
+    def load_detail(url, full=False):
+        calls.append(url)
+        raise requests.ConnectionError("detail page down")
+    monkeypatch.setattr(w32, "w32_load_detail", load_detail)
+
+    detail = w32.LazyDetail(type="tv", data_id="42", url="https://watch32.sx/tv/x-42")
+    assert detail.get("title") is None
+    assert (detail.get("year") or "2008") == "2008"
+    assert detail.get("poster", "tmdb.jpg") == "tmdb.jpg"
+    assert detail["data_id"] == "42"
+    assert detail.load_error == "detail page down"
+    assert len(calls) == 1
+
+
+def test_metadata_loads_on_first_access(monkeypatch):
+    page = {k: f"full-{k}" for k in w32.DETAIL_METADATA_KEYS}
+    monkeypatch.setattr(w32, "w32_load_detail", lambda url, full=False: page)
+    detail = w32.LazyDetail(type="movie", data_id="7", url="https://watch32.sx/movie/x-7")
+    assert detail.get("title") == "full-title"
+    assert detail.load_error is None
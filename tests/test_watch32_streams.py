@@ -0,0 +1,57 @@
+import time
+
+import pytest
+
+import watch32_test as w32
+from common.cache import MemoryBackend, ResolvedStreamCache
+
+
+@pytest.fixture
+def streams(monkeypatch):
+    cache = ResolvedStreamCache(backend=MemoryBackend())
+    monkeypatch.setattr(w32, "STREAM_CACHE", cache)
+    return cache
+
+
+def _m3u8(expires_at):
+    return f"https://cdn.example/hls/master.m3u8?expires={int(expires_at)}"
+
+
+def _serve(monkeypatch, url, calls):
+    monkeypatch.setattr(w32, "w32_get_episode_servers", lambda server_url: [{"name": "UpCloud", "id": "1"}])
+
+    def resolve_servers(servers):
+        calls.append(url)
+        return [{"name": "UpCloud", "id": "1", "m3u8": url, "subtitles": [], "source_name": "Videostr"}]
+    monkeypatch.setattr(w32, "resolve_servers", resolve_servers)
+
+
+EPISODE = {"episode": 1, "name": "Pilot", "server_url": "/ajax/episode/servers/1"}
+
+
+def test_expired_signed_url_is_not_served_from_cache(streams, monkeypatch):
+    calls = []
+    _serve(monkeypatch, _m3u8(time.time() - 60), calls)
+    w32.resolve_episode("1396", 1, EPISODE)
+    assert streams.get_streams("watch32", "1396", 1, 1) is None
+    w32.resolve_episode("1396", 1, EPISODE)
+    assert len(calls) == 2
+
+
+def test_live_signed_url_is_cached(streams, monkeypatch):
+    calls = []
+    _serve(monkeypatch, _m3u8(time.time() + 3600), calls)
+    resolved = w32.resolve_episode("1396", 1, EPISODE)
+    assert streams.get_streams("watch32", "1396", 1, 1) == resolved
+
+
+def test_api_tv_refetches_expired_urls(streams, monkeypatch):
+    calls = []
+
+    def api_tv(tmdb_id, season, episode):
+        calls.append((tmdb_id, season, episode))
+        return {"servers": [{"name": "UpCloud", "m3u8": _m3u8(time.time() - 60)}]}
+    monkeypatch.setattr(w32, "_api_tv", api_tv)
+    w32.api_tv("1396", 1, 1)
+    w32.api_tv("1396", 1, 1)
+    assert len(calls) == 2
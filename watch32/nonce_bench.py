@@ -0,0 +1,114 @@
+"""
+Videostr Nonce Regression + Benchmark
+Check find_nonce() against the recorded embed page corpus and time it on
+synthetic worst-case pages next to the legacy regex pair.
+
+Usage:
+    python nonce_bench.py              # regression + benchmark
+    python nonce_bench.py --no-bench   # regression only
+    python nonce_bench.py --size-mb 8  # largest synthetic page size
+"""
+
+import sys
+import os
+import re
+import json
+import time
+
+from videostr_nonce import find_nonce
+
+CORPUS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "nonce_corpus")
+
+# Hard ceiling for the scanner, in seconds per MB of page
+SCAN_BUDGET_PER_MB = 0.25
+
+LEGACY_48 = re.compile(r"\b[a-zA-Z0-9]{48}\b")
+LEGACY_3X16 = re.compile(
+    r"\b([a-zA-Z0-9]{16})\b.*?\b([a-zA-Z0-9]{16})\b.*?\b([a-zA-Z0-9]{16})\b",
+    re.DOTALL,
+)
+
+
+def legacy_find_nonce(raw):
+    """The original extract_videostr nonce lookup, for comparison."""
+    page_text = raw.decode("utf-8", "replace")
+    match48 = LEGACY_48.search(page_text)
+    if match48:
+        return match48.group(0)
+    match3x16 = LEGACY_3X16.search(page_text)
+    if match3x16:
+        return match3x16.group(1) + match3x16.group(2) + match3x16.group(3)
+    return None
+
+
+def run_regression():
+    """Check every corpus page against expected.json. Returns failure count."""
+    with open(os.path.join(CORPUS_DIR, "expected.json"), encoding="utf-8") as f:
+        expected = json.load(f)
+
+    failures = 0
+    for name in sorted(expected):
+        with open(os.path.join(CORPUS_DIR, name), "rb") as f:
+            raw = f.read()
+        got = find_nonce(raw)
+        ok = got == expected[name]
+        failures += not ok
+        legacy = legacy_find_nonce(raw)
+        note = "" if legacy == got else "  (legacy regex differs)"
+        print(f"   {'✅' if ok else '❌'} {name}{note}")
+        if not ok:
+            print(f"      expected {expected[name]!r}, got {got!r}")
+    return failures
+
+
+def synthetic_pages(size_bytes):
+    """Worst-case shapes: nonce-free filler that the legacy regexes must fully scan."""
+    filler = b"<div class=\"x\">" + b"a" * 17 + b" " + b"b" * 15 + b"_c </div>\n"
+    body = filler * (size_bytes // len(filler))
+    yield "two 16-char tokens + filler", b"<script>var a='abcdefghijklmnop', b='ABCDEFGHIJKLMNOP';" + body + b"</script>"
+    yield "unterminated script", b"<html><script>" + body
+    yield "no scripts at all", b"<html><body>" + body + b"</body></html>"
+
+
+def run_benchmark(max_mb):
+    """Time both scanners on growing synthetic pages. Returns budget overruns."""
+    overruns = 0
+    size = 256 * 1024
+    while size <= max_mb * 1024 * 1024:
+        for label, raw in synthetic_pages(size):
+            t0 = time.perf_counter()
+            find_nonce(raw)
+            scan = time.perf_counter() - t0
+            t0 = time.perf_counter()
+            legacy_find_nonce(raw)
+            legacy = time.perf_counter() - t0
+            mb = len(raw) / (1024 * 1024)
+            over = scan > SCAN_BUDGET_PER_MB * max(mb, 1)
+            overruns += over
+            print(f"   {'❌' if over else '⏱️'}  {mb:5.2f} MB  {label:<30} scanner {scan * 1000:8.2f} ms   legacy {legacy * 1000:8.2f} ms")
+        size *= 2
+    return overruns
+
+
+def main():
+    bench = "--no-bench" not in sys.argv
+    max_mb = 4
+    if "--size-mb" in sys.argv:
+        max_mb = int(sys.argv[sys.argv.index("--size-mb") + 1])
+
+    print("🔑 Nonce regression corpus:")
+    failures = run_regression()
+
+    overruns = 0
+    if bench:
+        print("\n⏱️  Nonce scanner benchmark:")
+        overruns = run_benchmark(max_mb)
+
+    if failures or overruns:
+        print(f"\n❌ {failures} regression failure(s), {overruns} budget overrun(s)")
+        sys.exit(1)
+    print("\n✅ All checks passed")
+
+
+if __name__ == "__main__":
+    main()
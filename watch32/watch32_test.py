@@ -4,22 +4,51 @@ Fetch video links for movies and TV shows by TMDB ID via Watch32.sx scraping.
 
 Usage:
     python watch32_test.py movie <tmdb_id>
-    python watch32_test.py tv <tmdb_id> [--season N] [--episode N]
+    python watch32_test.py tv <tmdb_id> [--season N] [--episode N] [--prefetch N]
     python watch32_test.py search <query>
+    python watch32_test.py batch [FILE|-] [--out FILE] [--workers N] [--deadline S] [--retry-errors]
+
+Add --deadline S to any command to cap the whole lookup at S seconds,
+--timings to print how long each stage took, or --quiet to hide progress.
+--profile DIR writes a sampling CPU profile and allocation report of the run
+to DIR (see common/profiling.py).
+
+batch reads "movie <id>" / "tv <id> <season> <episode>" lines and writes one
+JSON record per title as it resolves; with --out it appends to that file and
+skips titles already in it (see common/batch.py).
 
 Examples:
     python watch32_test.py movie 155          # The Dark Knight
     python watch32_test.py tv 1396 --season 1 --episode 1  # Breaking Bad S01E01
+    python watch32_test.py tv 1396 --season 1 --episode 1 --prefetch 2  # + warm E02, E03
     python watch32_test.py search "inception"
+
+Server lists, embed links, data-ids, TMDB details, MegaCloud keys and resolved
+streams are cached (SCRAPER_CACHE=memory://, sqlite:///path or redis://host,
+default ~/.cache/cloudflare-provider/cache.sqlite).
+--prefetch resolves the next N episodes in the background after the requested
+one (the CLI waits at most PREFETCH_WAIT seconds for it before exiting); it is
+skipped during W32_PEAK_HOURS (e.g. "18-23", local time).
 """
 
 import sys
 import os
 import re
 import json
-import requests
+import time
+import threading
+from concurrent.futures import ThreadPoolExecutor
 from urllib.parse import urlencode, quote
-from bs4 import BeautifulSoup
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from common import batch, deadline, metrics, parsepool, profiling
+from common.cache import AdaptiveTTLCache, ResolvedStreamCache, TTLCache
+from common.errors import ApiError
+from common.http import Session
+from common.metrics import add_bytes, progress, span, timed
+from common.providers import Provider, make_link
+from videostr_nonce import find_nonce
 
 # Fix encoding for Windows PowerShell
 if sys.platform == "win32":
@@ -54,50 +83,93 @@ AJAX_HEADERS = {
     "Accept": "*/*",
 }
 
-SESSION = requests.Session()
+# Max concurrent season episode-list fetches
+MAX_SEASON_WORKERS = 4
+
+# Embed link / server list caches (backend from SCRAPER_CACHE, see common/cache.py).
+# TTLs start at 6h and adapt to how long watch32 keeps returning the same data.
+SOURCE_LINK_CACHE = AdaptiveTTLCache("w32:source", default_ttl=6 * 3600, min_ttl=600, max_ttl=7 * 24 * 3600)
+SERVER_LIST_CACHE = AdaptiveTTLCache("w32:servers", default_ttl=6 * 3600, min_ttl=600, max_ttl=7 * 24 * 3600)
+
+# Fully resolved per-episode stream lists, TTL bounded by the m3u8 expiry
+STREAM_CACHE = ResolvedStreamCache()
+
+# TMDB responses (namespace shared with the other scrapers), detail page url →
+# data-id, and the MegaCloud key list, so every worker and node starts warm
+TMDB_CACHE = TTLCache("tmdb")
+TMDB_TTL = 24 * 3600
+DATA_ID_CACHE = TTLCache("w32:data-id")
+DATA_ID_TTL = 30 * 24 * 3600
+MEGACLOUD_KEYS_CACHE = TTLCache("w32:megacloud-keys")
+MEGACLOUD_KEYS_TTL = 15 * 60
+# Parsed episode lists keyed by watch32 season id; airing seasons gain episodes
+SEASON_EPISODES_CACHE = TTLCache("w32:season-episodes")
+SEASON_EPISODES_TTL = 6 * 3600
+
+# Background prefetch: pause between episodes so it never competes with foreground work
+PREFETCH_DELAY = 2.0
+# Longest the CLI waits for a running prefetch after printing its answer (seconds)
+PREFETCH_WAIT = 30.0
+PEAK_HOURS = os.environ.get("W32_PEAK_HOURS", "")
+
+# Rate / concurrency limited per host (common/http.py)
+SESSION = Session()
 SESSION.headers.update(HEADERS)
 
 
 # ─── TMDB Helpers ────────────────────────────────────────────────────────────
 
+@timed("tmdb", "watch32")
 def tmdb_get_movie(tmdb_id):
     """Fetch movie details from TMDB."""
-    print(f"📡 Fetching movie info from TMDB (ID: {tmdb_id})...")
-    resp = SESSION.get(
-        f"{TMDB_API_BASE}/movie/{tmdb_id}",
-        params={"api_key": TMDB_API_KEY, "language": "en-US"},
-        timeout=15,
-    )
-    resp.raise_for_status()
-    data = resp.json()
+    progress(f"📡 Fetching movie info from TMDB (ID: {tmdb_id})...")
+    data = _tmdb_get(f"movie/{tmdb_id}")
     title = data.get("title", "")
     year = (data.get("release_date") or "")[:4]
-    print(f"   ✅ TMDB: {title} ({year})")
+    progress(f"   ✅ TMDB: {title} ({year})")
     return data
 
 
+@timed("tmdb", "watch32")
 def tmdb_get_tv(tmdb_id):
     """Fetch TV show details from TMDB."""
-    print(f"📡 Fetching TV info from TMDB (ID: {tmdb_id})...")
-    resp = SESSION.get(
-        f"{TMDB_API_BASE}/tv/{tmdb_id}",
-        params={"api_key": TMDB_API_KEY, "language": "en-US"},
-        timeout=15,
-    )
-    resp.raise_for_status()
-    data = resp.json()
+    progress(f"📡 Fetching TV info from TMDB (ID: {tmdb_id})...")
+    data = _tmdb_get(f"tv/{tmdb_id}")
     title = data.get("name", "")
     year = (data.get("first_air_date") or "")[:4]
     seasons = data.get("number_of_seasons", 1)
-    print(f"   ✅ TMDB: {title} ({year}) — {seasons} season(s)")
+    progress(f"   ✅ TMDB: {title} ({year}) — {seasons} season(s)")
+    return data
+
+
+def _tmdb_get(path):
+    """GET a TMDB path (en-US), through TMDB_CACHE."""
+    key = f"{path}?language=en-US"
+    data = TMDB_CACHE.get(key)
+    if data is None:
+        resp = SESSION.get(
+            f"{TMDB_API_BASE}/{path}",
+            params={"api_key": TMDB_API_KEY, "language": "en-US"},
+            timeout=15,
+        )
+        resp.raise_for_status()
+        data = resp.json()
+        TMDB_CACHE.set(key, data, TMDB_TTL)
     return data
 
 
 # ─── Watch32 Scraper ─────────────────────────────────────────────────────────
 
+def _soup(markup):
+    """Parse HTML; bs4 is imported on the first parse rather than at startup."""
+    from bs4 import BeautifulSoup
+    return BeautifulSoup(markup, "html.parser")
+
+
+@timed("search", "watch32")
 def w32_search(query):
     """Search Watch32 for a title."""
-    print(f"🔍 Searching Watch32 for '{query}'...")
+    progress(f"🔍 Searching Watch32 for '{query}'...")
     resp = SESSION.post(
         f"{WATCH32_BASE}/ajax/search",
         data={"keyword": query},
@@ -109,7 +181,17 @@ def w32_search(query):
         timeout=20,
     )
     resp.raise_for_status()
-    soup = BeautifulSoup(resp.text, "html.parser")
+    results = parsepool.run(_parse_search, resp.content)
+
+    progress(f"   ✅ Found {len(results)} result(s)")
+    for i, r in enumerate(results[:5], 1):
+        progress(f"      [{i}] {r['title']}  →  {r['url']}")
+    return results
+
+
+def _parse_search(html):
+    """Search results page → [{title, url, poster}]."""
+    soup = _soup(html)
     results = []
     for a in soup.select("a.nav-item:has(div)"):
         href = a.get("href", "")
@@ -122,19 +204,133 @@ def w32_search(query):
         url = WATCH32_BASE + "/" + href.lstrip("/") if href else ""
         if title and url:
             results.append({"title": title, "url": url, "poster": poster})
-
-    print(f"   ✅ Found {len(results)} result(s)")
-    for i, r in enumerate(results[:5], 1):
-        print(f"      [{i}] {r['title']}  →  {r['url']}")
     return results
 
 
-def w32_load_detail(url):
-    """Load a Watch32 detail page and extract metadata."""
-    print(f"📄 Loading detail page: {url}")
+# Opening tag carrying the data-id, e.g. <div class="detail_page-watch" data-id="12345">
+DETAIL_WATCH_TAG = re.compile(rb"<[^<>]*\bdetail_page-watch\b[^<>]*>")
+DATA_ID_ATTR = re.compile(rb"\bdata-id\s*=\s*[\"']?([^\"'\s>]+)")
+
+DETAIL_METADATA_KEYS = ("title", "poster", "background", "synopsis", "year", "genres", "duration")
+
+_DETAIL_POOL = None
+
+
+class LazyDetail(dict):
+    """
+    Detail dict from the fast loader: data_id, type and url are set up front;
+    the first access to a metadata key (title, poster, ...) loads the full page.
+    If that load fails the metadata keys stay missing (get() returns the
+    default, so callers fall back to TMDB) and the page is not fetched again.
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._lock = threading.Lock()
+        self._loaded = False
+        self.load_error = None
+
+    def __missing__(self, key):
+        if key in DETAIL_METADATA_KEYS and not self._loaded:
+            self.load_metadata()
+            return dict.__getitem__(self, key)
+        raise KeyError(key)
+
+    def get(self, key, default=None):
+        try:
+            return self[key]
+        except KeyError:
+            return default
+
+    def load_metadata(self):
+        """Fetch and parse the full detail page (once)."""
+        with self._lock:
+            if self._loaded:
+                return
+            try:
+                full = w32_load_detail(self["url"], full=True)
+                self.update({k: full[k] for k in DETAIL_METADATA_KEYS})
+            except Exception as e:
+                self.load_error = str(e) or type(e).__name__
+                progress(f"   ⚠️  Detail page metadata unavailable: {self.load_error}")
+            self._loaded = True
+
+    def load_in_background(self):
+        """Start the full metadata load on a worker thread; returns its Future."""
+        global _DETAIL_POOL
+        if _DETAIL_POOL is None:
+            _DETAIL_POOL = ThreadPoolExecutor(max_workers=2, thread_name_prefix="w32-detail")
+        return deadline.submit(_DETAIL_POOL, self.load_metadata)
+
+
+@timed("detail", "watch32")
+def w32_load_detail(url, full=False):
+    """
+    Load a Watch32 detail page.
+    Fast mode (default) streams the page only until the .detail_page-watch tag
+    and returns a LazyDetail; full=True parses the whole page for metadata.
+    """
+    if not full:
+        return _load_detail_fast(url)
+
+    progress(f"📄 Loading detail page: {url}")
     resp = SESSION.get(url, timeout=20)
     resp.raise_for_status()
-    soup = BeautifulSoup(resp.text, "html.parser")
+    return _parse_detail(resp.content, url)
+
+
+def _load_detail_fast(url):
+    """Read the detail page just far enough to find data-id (cached per url)."""
+    data_id = DATA_ID_CACHE.get(url)
+    if data_id:
+        progress(f"📄 Detail page data-id (cached): {data_id}")
+        return LazyDetail(type="movie" if "/movie/" in url else "tv", data_id=data_id, url=url)
+
+    progress(f"📄 Loading detail page (data-id only): {url}")
+    resp = SESSION.get(url, timeout=20, stream=True)
+    try:
+        resp.raise_for_status()
+        buf = bytearray()
+        for chunk in resp.iter_content(chunk_size=8192):
+            # Re-scan a small overlap so a tag split across chunks is still found
+            scan_from = max(0, len(buf) - 1024)
+            buf += chunk
+            tag = DETAIL_WATCH_TAG.search(buf, scan_from)
+            if tag:
+                id_match = DATA_ID_ATTR.search(tag.group(0))
+                data_id = id_match.group(1).decode("utf-8", "replace") if id_match else ""
+                add_bytes(len(buf))
+                progress(f"   ✅ data-id: {data_id or 'N/A'} ({len(buf)} bytes read)")
+                if data_id:
+                    DATA_ID_CACHE.set(url, data_id, DATA_ID_TTL)
+                return LazyDetail(
+                    type="movie" if "/movie/" in url else "tv",
+                    data_id=data_id,
+                    url=url,
+                )
+    finally:
+        resp.close()
+
+    # Tag never showed up — the whole page is in buf, so fall back to a full parse
+    add_bytes(len(buf))
+    progress("   ⚠️  .detail_page-watch not found while streaming, parsing full page")
+    return _parse_detail(bytes(buf), url)
+
+
+def _parse_detail(html, url):
+    """Full metadata parse of a detail page (raw bytes, parsed off-thread when large)."""
+    detail = parsepool.run(_parse_detail_page, html, url)
+    if detail["data_id"]:
+        DATA_ID_CACHE.set(url, detail["data_id"], DATA_ID_TTL)
+    progress(f"   ✅ {detail['title']} ({detail['year']}) [{detail['type'].upper()}]")
+    progress(f"      Genres: {', '.join(detail['genres']) if detail['genres'] else 'N/A'}")
+    progress(f"      Duration: {detail['duration'] or 'N/A'}")
+    progress(f"      Synopsis: {detail['synopsis'][:100]}..." if detail["synopsis"] else "      Synopsis: N/A")
+    return detail
+
+
+def _parse_detail_page(html, url):
+    soup = _soup(html)
 
     title = ""
     heading = soup.select_one(".heading-name")
@@ -170,11 +366,6 @@ def w32_load_detail(url):
     detail_el = soup.select_one(".detail_page-watch")
     data_id = detail_el.get("data-id", "") if detail_el else ""
 
-    print(f"   ✅ {title} ({year}) [{content_type.upper()}]")
-    print(f"      Genres: {', '.join(genres) if genres else 'N/A'}")
-    print(f"      Duration: {duration or 'N/A'}")
-    print(f"      Synopsis: {synopsis[:100]}..." if synopsis else "      Synopsis: N/A")
-
     return {
         "title": title,
         "poster": poster,
@@ -189,71 +380,135 @@ def w32_load_detail(url):
     }
 
 
+@timed("servers", "watch32")
 def w32_get_movie_servers(data_id):
     """Get video server links for a movie."""
-    print(f"📡 Fetching movie episode list (data_id: {data_id})...")
-    # First get the episode list
-    resp = SESSION.get(f"{WATCH32_BASE}/ajax/episode/list/{data_id}", headers=AJAX_HEADERS, timeout=20)
+    progress(f"📡 Fetching movie episode list (data_id: {data_id})...")
+    servers = SERVER_LIST_CACHE.get_or_fetch(
+        f"movie:{data_id}",
+        lambda: _fetch_server_list(f"{WATCH32_BASE}/ajax/episode/list/{data_id}"),
+    )
+    progress(f"   ✅ Found {len(servers)} server(s)")
+    return servers
+
+
+def _fetch_server_list(list_url):
+    """Fetch and parse a watch32 server list (movie episode list or TV episode servers)."""
+    resp = SESSION.get(list_url, headers=AJAX_HEADERS, timeout=20)
     resp.raise_for_status()
-    soup = BeautifulSoup(resp.text, "html.parser")
+    return parsepool.run(_parse_server_list, resp.content)
+
 
+def _parse_server_list(html):
+    soup = _soup(html)
     servers = []
     for a in soup.select(".nav-item a"):
         vid_id = a.get("data-id", "")
-        server_title = a.get("title", a.get_text(strip=True))
+        server_name = a.get("title", a.get_text(strip=True))
         if vid_id:
-            servers.append({"id": vid_id, "name": server_title})
+            servers.append({"id": vid_id, "name": server_name})
 
-    print(f"   ✅ Found {len(servers)} server(s)")
     return servers
 
 
-def w32_get_tv_episodes(data_id):
-    """Get seasons and episodes for a TV show."""
-    print(f"📡 Fetching season list (data_id: {data_id})...")
+@timed("servers", "watch32")
+def w32_get_season_list(data_id):
+    """Get the season number → season id mapping for a TV show (no episodes)."""
+    progress(f"📡 Fetching season list (data_id: {data_id})...")
     resp = SESSION.get(f"{WATCH32_BASE}/ajax/season/list/{data_id}", headers=AJAX_HEADERS, timeout=20)
     resp.raise_for_status()
-    soup = BeautifulSoup(resp.text, "html.parser")
+    soup = _soup(resp.text)
 
-    seasons = {}
+    season_ids = {}
     for idx, season_el in enumerate(soup.select("a"), 1):
         season_id = season_el.get("data-id", "")
-        if not season_id:
-            continue
+        if season_id:
+            season_ids[idx] = season_id
 
-        print(f"   📺 Fetching Season {idx} episodes (id: {season_id})...")
-        ep_resp = SESSION.get(
-            f"{WATCH32_BASE}/ajax/season/episodes/{season_id}",
-            headers=AJAX_HEADERS, timeout=20,
-        )
-        ep_resp.raise_for_status()
-        ep_soup = BeautifulSoup(ep_resp.text, "html.parser")
+    progress(f"   ✅ Found {len(season_ids)} season(s)")
+    return season_ids
 
-        episodes = []
-        for ep_num, nav_item in enumerate(ep_soup.select(".nav-item"), 1):
-            a = nav_item.select_one("a") if nav_item.name != "a" else nav_item
-            if not a:
-                continue
-            ep_data_id = a.get("data-id", "")
-            ep_text = nav_item.get_text(strip=True)
-            # Episode name is after the colon, e.g. "Eps 1:Pilot"
-            ep_name = ep_text.split(":", 1)[1].strip() if ":" in ep_text else ep_text
-            server_url = f"{WATCH32_BASE}/ajax/episode/servers/{ep_data_id}"
-            episodes.append({
-                "episode": ep_num,
-                "name": ep_name,
-                "data_id": ep_data_id,
-                "server_url": server_url,
-            })
 
-        seasons[idx] = episodes
-        print(f"      ✅ Season {idx}: {len(episodes)} episode(s)")
+@timed("servers", "watch32")
+def w32_get_season_episodes(season_id):
+    """Get the episodes of a single season, cached per season id."""
+    cached = SEASON_EPISODES_CACHE.get(season_id)
+    if cached is not None:
+        return cached
+
+    ep_resp = SESSION.get(
+        f"{WATCH32_BASE}/ajax/season/episodes/{season_id}",
+        headers=AJAX_HEADERS, timeout=20,
+    )
+    ep_resp.raise_for_status()
+    episodes = parsepool.run(_parse_season_episodes, ep_resp.content)
+
+    if episodes:
+        SEASON_EPISODES_CACHE.set(season_id, episodes, SEASON_EPISODES_TTL)
+    return episodes
+
+
+def _parse_season_episodes(html):
+    """Season episode list → [{episode, name, data_id, server_url}]."""
+    ep_soup = _soup(html)
+    episodes = []
+    for ep_num, nav_item in enumerate(ep_soup.select(".nav-item"), 1):
+        a = nav_item.select_one("a") if nav_item.name != "a" else nav_item
+        if not a:
+            continue
+        ep_data_id = a.get("data-id", "")
+        ep_text = nav_item.get_text(strip=True)
+        # Episode name is after the colon, e.g. "Eps 1:Pilot"
+        ep_name = ep_text.split(":", 1)[1].strip() if ":" in ep_text else ep_text
+        server_url = f"{WATCH32_BASE}/ajax/episode/servers/{ep_data_id}"
+        episodes.append({
+            "episode": ep_num,
+            "name": ep_name,
+            "data_id": ep_data_id,
+            "server_url": server_url,
+        })
+    return episodes
+
+
+def w32_get_tv_episodes(data_id, season_filter=None):
+    """
+    Get seasons and episodes for a TV show.
+    Only the season list is fetched up front; episode lists are loaded for the
+    requested season(s) only — all seasons when season_filter is None — in
+    parallel when more than one is needed.
+    """
+    season_ids = w32_get_season_list(data_id)
+    if season_filter is not None:
+        season_ids = {n: sid for n, sid in season_ids.items() if n == season_filter}
+    if not season_ids:
+        return {}
+
+    def load(season_num):
+        progress(f"   📺 Fetching Season {season_num} episodes (id: {season_ids[season_num]})...")
+        return w32_get_season_episodes(season_ids[season_num])
+
+    wanted = sorted(season_ids)
+    if len(wanted) == 1:
+        loaded = [load(wanted[0])]
+    else:
+        with ThreadPoolExecutor(max_workers=min(MAX_SEASON_WORKERS, len(wanted))) as pool:
+            loaded = list(pool.map(deadline.bind(load), wanted))
+
+    seasons = {}
+    for season_num, episodes in zip(wanted, loaded):
+        seasons[season_num] = episodes
+        progress(f"      ✅ Season {season_num}: {len(episodes)} episode(s)")
 
     return seasons
 
 
+@timed("source", "watch32")
 def w32_get_source_link(vid_id):
-    """Get the embed link for a video server."""
+    """Get the embed link for a video server (cached per server id)."""
+    return SOURCE_LINK_CACHE.get_or_fetch(vid_id, lambda: _fetch_source_link(vid_id))
+
+
+def _fetch_source_link(vid_id):
     resp = SESSION.get(
         f"{WATCH32_BASE}/ajax/episode/sources/{vid_id}",
         headers=AJAX_HEADERS, timeout=20,
@@ -264,30 +519,32 @@ def w32_get_source_link(vid_id):
     return link
 
 
+@timed("servers", "watch32")
 def w32_get_episode_servers(server_url):
-    """Get video servers for a TV episode."""
-    resp = SESSION.get(server_url, headers=AJAX_HEADERS, timeout=20)
-    resp.raise_for_status()
-    soup = BeautifulSoup(resp.text, "html.parser")
+    """Get video servers for a TV episode (cached per episode)."""
+    return SERVER_LIST_CACHE.get_or_fetch(server_url, lambda: _fetch_server_list(server_url))
 
-    servers = []
-    for a in soup.select(".nav-item a"):
-        vid_id = a.get("data-id", "")
-        server_name = a.get("title", a.get_text(strip=True))
-        if vid_id:
-            servers.append({"id": vid_id, "name": server_name})
 
-    return servers
+# ─── Videostr Extractor ──────────────────────────────────────────────────────
 
+def megacloud_keys():
+    """MegaCloud decryption keys from GitHub, cached for MEGACLOUD_KEYS_TTL."""
+    keys = MEGACLOUD_KEYS_CACHE.get("keys")
+    if keys is None:
+        key_resp = SESSION.get(MEGACLOUD_KEYS_URL, timeout=15)
+        key_resp.raise_for_status()
+        keys = key_resp.json()
+        MEGACLOUD_KEYS_CACHE.set("keys", keys, MEGACLOUD_KEYS_TTL)
+    return keys
 
-# ─── Videostr Extractor ──────────────────────────────────────────────────────
 
+@timed("extract", "watch32")
 def extract_videostr(url):
     """
     Extract M3U8 video URL and subtitles from a videostr.net embed.
     Ports the Kotlin Videostr extractor logic to Python.
     """
-    print(f"   🎬 Extracting from: {url}")
+    progress(f"   🎬 Extracting from: {url}")
 
     # Step 1: Get embed page and extract nonce
     resp = SESSION.get(url, headers={
@@ -296,27 +553,16 @@ def extract_videostr(url):
         "X-Requested-With": "XMLHttpRequest",
     }, timeout=20)
     resp.raise_for_status()
-    page_text = resp.text
 
     vid_id = url.rstrip("/").split("/")[-1].split("?")[0]
 
-    # Try 48-char nonce first
-    match48 = re.search(r"\b[a-zA-Z0-9]{48}\b", page_text)
-    if match48:
-        nonce = match48.group(0)
-    else:
-        # Fallback: 3 × 16-char tokens
-        match3x16 = re.search(
-            r"\b([a-zA-Z0-9]{16})\b.*?\b([a-zA-Z0-9]{16})\b.*?\b([a-zA-Z0-9]{16})\b",
-            page_text, re.DOTALL,
-        )
-        if match3x16:
-            nonce = match3x16.group(1) + match3x16.group(2) + match3x16.group(3)
-        else:
-            print("      ❌ Nonce not found in embed page")
-            return None
+    # 48-char nonce, or 3 × 16-char tokens, scanned on the raw bytes
+    nonce = find_nonce(resp.content)
+    if not nonce:
+        progress("      ❌ Nonce not found in embed page")
+        return None
 
-    print(f"      🔑 Nonce: {nonce[:12]}...{nonce[-6:]}")
+    progress(f"      🔑 Nonce: {nonce[:12]}...{nonce[-6:]}")
 
     # Step 2: Get sources
     api_url = f"{VIDEOSTR_BASE}/embed-1/v3/e-1/getSources?id={vid_id}&_k={nonce}"
@@ -333,48 +579,50 @@ def extract_videostr(url):
     encrypted = source_data.get("encrypted", False)
 
     if not sources:
-        print("      ❌ No sources in response")
+        progress("      ❌ No sources in response")
         return None
 
     encoded_source = sources[0].get("file", "")
-    print(f"      📦 Source encrypted: {encrypted}")
+    progress(f"      📦 Source encrypted: {encrypted}")
 
     # Step 3: Decrypt if needed
     if ".m3u8" in encoded_source:
         m3u8_url = encoded_source
-        print(f"      ✅ Direct M3U8 URL found")
+        progress(f"      ✅ Direct M3U8 URL found")
     else:
-        print(f"      🔐 Encrypted source — fetching decryption key...")
-        # Get key from GitHub
-        key_resp = SESSION.get(MEGACLOUD_KEYS_URL, timeout=15)
-        key_resp.raise_for_status()
-        keys = key_resp.json()
-        key = keys.get("vidstr", "")
-        if not key:
-            print("      ❌ Decryption key 'vidstr' not found")
-            return None
-        print(f"      🔑 Key: {key[:8]}...")
-
-        # Decrypt via Google Apps Script
-        decrypt_url = (
-            f"{DECRYPT_SERVICE_URL}"
-            f"?encrypted_data={quote(encoded_source)}"
-            f"&nonce={quote(nonce)}"
-            f"&secret={quote(key)}"
-        )
-        print(f"      🔓 Decrypting via Google Apps Script...")
-        dec_resp = SESSION.get(decrypt_url, timeout=30)
-        dec_resp.raise_for_status()
-        dec_text = dec_resp.text
-
-        m3u8_match = re.search(r'"file":"(.*?)"', dec_text)
-        if m3u8_match:
-            m3u8_url = m3u8_match.group(1)
-            print(f"      ✅ Decrypted M3U8 URL obtained")
-        else:
-            print(f"      ❌ Could not extract M3U8 from decrypted response")
-            print(f"         Response preview: {dec_text[:200]}")
-            return None
+        progress(f"      🔐 Encrypted source — fetching decryption key...")
+        with span("decrypt", "watch32") as decrypt_span:
+            keys = megacloud_keys()
+            key = keys.get("vidstr", "")
+            if not key:
+                progress("      ❌ Decryption key 'vidstr' not found")
+                decrypt_span.outcome = "empty"
+                return None
+            progress(f"      🔑 Key: {key[:8]}...")
+
+            # Decrypt via Google Apps Script
+            decrypt_url = (
+                f"{DECRYPT_SERVICE_URL}"
+                f"?encrypted_data={quote(encoded_source)}"
+                f"&nonce={quote(nonce)}"
+                f"&secret={quote(key)}"
+            )
+            progress(f"      🔓 Decrypting via Google Apps Script...")
+            dec_resp = SESSION.get(decrypt_url, timeout=30)
+            dec_resp.raise_for_status()
+            dec_text = dec_resp.text
+
+            m3u8_match = re.search(r'"file":"(.*?)"', dec_text)
+            if m3u8_match:
+                m3u8_url = m3u8_match.group(1)
+                progress(f"      ✅ Decrypted M3U8 URL obtained")
+            else:
+                progress(f"      ❌ Could not extract M3U8 from decrypted response")
+                progress(f"         Response preview: {dec_text[:200]}")
+                # The key may have rotated: fetch it again next time
+                MEGACLOUD_KEYS_CACHE.expire("keys")
+                decrypt_span.outcome = "empty"
+                return None
 
     # Step 4: Extract subtitles
     subtitles = []
@@ -399,11 +647,128 @@ def extract_generic(url):
     if "videostr.net" in url:
         return extract_videostr(url)
     else:
-        print(f"   ⚠️  Unknown extractor for: {url}")
-        print(f"      Returning raw embed URL")
+        progress(f"   ⚠️  Unknown extractor for: {url}")
+        progress(f"      Returning raw embed URL")
         return {"m3u8": url, "subtitles": [], "source_name": "Unknown"}
 
 
+# ─── Stream Resolution ───────────────────────────────────────────────────────
+
+def resolve_servers(servers):
+    """
+    Resolve embed link + extraction for each server (last server first, as the
+    site lists its preferred servers last). Returns one dict per server with
+    either the extraction result or an "error".
+    """
+    return [resolve_server(server) for server in reversed(servers)]
+
+
+def resolve_server(server):
+    """Embed link + extraction for one server → dict with the result fields or "error"."""
+    progress(f"\n   📡 Server: {server['name']} (ID: {server['id']})")
+    entry = {"name": server["name"], "id": server["id"]}
+    try:
+        embed_link = w32_get_source_link(server["id"])
+        if not embed_link:
+            progress(f"      ❌ No embed link returned")
+            entry["error"] = "No embed link"
+            return entry
+        progress(f"      🌐 Embed: {embed_link}")
+        entry["embed"] = embed_link
+        result = extract_generic(embed_link)
+        if not result:
+            SOURCE_LINK_CACHE.expire(server["id"])
+            entry["error"] = "Extraction failed"
+            progress(f"      ❌ Extraction failed for {server['name']}")
+        else:
+            entry.update(result)
+            progress(f"      ✅ {result['source_name']}: {result['m3u8']}")
+    except Exception as e:
+        progress(f"      ❌ Error: {e}")
+        entry["error"] = str(e)
+    return entry
+
+
+def resolve_episode(tmdb_id, season_num, ep):
+    """Resolve all servers of one TV episode, storing the result in STREAM_CACHE."""
+    servers = w32_get_episode_servers(ep["server_url"])
+    if not servers:
+        return []
+    progress(f"   📡 {len(servers)} server(s) found")
+    resolved = resolve_servers(servers)
+    good = [r for r in resolved if r.get("m3u8")]
+    if good:
+        STREAM_CACHE.put_streams(
+            "watch32", tmdb_id, season_num, ep["episode"], resolved,
+            urls=[r["m3u8"] for r in good],
+        )
+    return resolved
+
+
+def print_streams(resolved):
+    """Print a resolved server list (from resolve_servers or STREAM_CACHE)."""
+    for entry in resolved:
+        print(f"\n   📡 Server: {entry['name']} (ID: {entry['id']})")
+        if entry.get("m3u8"):
+            print_extraction_result(entry, entry["name"])
+        else:
+            print(f"      ❌ {entry.get('error', 'No result')}")
+
+
+def print_cached_streams(resolved):
+    """Print a resolved server list that came from STREAM_CACHE."""
+    print(f"   ⚡ {len(resolved)} server(s) from cache")
+    print_streams(resolved)
+
+
+def in_peak_hours(spec=None, hour=None):
+    """True if the local hour falls in a "start-end" spec such as "18-23" (wraps past midnight)."""
+    spec = PEAK_HOURS if spec is None else spec
+    if not spec:
+        return False
+    hour = time.localtime().tm_hour if hour is None else hour
+    try:
+        start, end = (int(h) for h in spec.split("-", 1))
+    except ValueError:
+        return False
+    if start <= end:
+        return start <= hour <= end
+    return hour >= start or hour <= end
+
+
+def start_prefetch(tmdb_id, season_num, episodes, after_episode, count):
+    """
+    Resolve the `count` episodes after `after_episode` on a background thread,
+    one at a time, skipping any that are already in STREAM_CACHE.
+    Returns the thread (None when nothing is prefetched).
+    """
+    if count <= 0:
+        return None
+    if in_peak_hours():
+        progress(f"\n⏸️  Prefetch skipped during peak hours ({PEAK_HOURS})")
+        return None
+
+    upcoming = [ep for ep in episodes if after_episode < ep["episode"] <= after_episode + count]
+    if not upcoming:
+        return None
+
+    def run():
+        for ep in upcoming:
+            if STREAM_CACHE.get_streams("watch32", tmdb_id, season_num, ep["episode"]):
+                continue
+            time.sleep(PREFETCH_DELAY)
+            progress(f"\n⏩ Prefetching S{season_num:02d}E{ep['episode']:02d}: {ep['name']}")
+            try:
+                resolve_episode(tmdb_id, season_num, ep)
+            except Exception as e:
+                progress(f"   ⚠️  Prefetch failed: {e}")
+
+    progress(f"\n⏩ Prefetching {len(upcoming)} upcoming episode(s) in the background...")
+    thread = threading.Thread(target=run, name="w32-prefetch", daemon=True)
+    thread.start()
+    return thread
+
+
 # ─── Display Helpers ─────────────────────────────────────────────────────────
 
 def print_extraction_result(result, server_name=""):
@@ -465,7 +830,7 @@ def pick_best_result(results, title, prefer_type="movie"):
 
     if scored:
         best_score, best = scored[0]
-        print(f"\n   🎯 Best match (score {best_score}): {best['title']}  →  {best['url']}")
+        progress(f"\n   🎯 Best match (score {best_score}): {best['title']}  →  {best['url']}")
         return best
     return results[0] if results else None
 
@@ -515,24 +880,28 @@ def cmd_movie(tmdb_id):
     print(f"  🎬 VIDEO LINKS")
     print(f"{'═' * 60}")
 
-    for server in reversed(servers):
-        print(f"\n   📡 Server: {server['name']} (ID: {server['id']})")
-        try:
-            embed_link = w32_get_source_link(server["id"])
-            if not embed_link:
-                print(f"      ❌ No embed link returned")
-                continue
-            print(f"      🌐 Embed: {embed_link}")
-            result = extract_generic(embed_link)
-            print_extraction_result(result, server["name"])
-        except Exception as e:
-            print(f"      ❌ Error: {e}")
+    print_streams(resolve_servers(servers))
 
     print()
 
 
-def cmd_tv(tmdb_id, season_filter=None, episode_filter=None):
-    """Fetch video links for a TV show by TMDB ID."""
+def cmd_tv(tmdb_id, season_filter=None, episode_filter=None, prefetch=0):
+    """
+    Fetch video links for a TV show by TMDB ID.
+    With an episode filter and prefetch > 0, the next `prefetch` episodes are
+    resolved in the background afterwards; the prefetch thread is returned.
+    """
+    # Fast path: a single episode that was already resolved (e.g. prefetched)
+    if season_filter is not None and episode_filter is not None:
+        cached = STREAM_CACHE.get_streams("watch32", tmdb_id, season_filter, episode_filter)
+        if cached:
+            print(f"\n📺 S{season_filter:02d}E{episode_filter:02d} (TMDB ID: {tmdb_id})")
+            print_cached_streams(cached)
+            print()
+            return None
+
+    prefetch_thread = None
+
     # Step 1: Get TV show title from TMDB
     try:
         tmdb_data = tmdb_get_tv(tmdb_id)
@@ -565,7 +934,7 @@ def cmd_tv(tmdb_id, season_filter=None, episode_filter=None):
         return
 
     # Step 4: Get seasons and episodes
-    seasons = w32_get_tv_episodes(detail["data_id"])
+    seasons = w32_get_tv_episodes(detail["data_id"], season_filter)
     if not seasons:
         print(f"\n❌ No episodes found")
         return
@@ -592,32 +961,24 @@ def cmd_tv(tmdb_id, season_filter=None, episode_filter=None):
             print(f"  E{ep_num:02d}: {ep['name']}")
             print(f"  {'─' * 56}")
 
-            # Get servers for this episode
-            try:
-                servers = w32_get_episode_servers(ep["server_url"])
-                if not servers:
-                    print(f"   ❌ No servers found")
-                    continue
-
-                print(f"   📡 {len(servers)} server(s) found")
-
-                for server in reversed(servers):
-                    print(f"\n   📡 Server: {server['name']} (ID: {server['id']})")
-                    try:
-                        embed_link = w32_get_source_link(server["id"])
-                        if not embed_link:
-                            print(f"      ❌ No embed link returned")
-                            continue
-                        print(f"      🌐 Embed: {embed_link}")
-                        result = extract_generic(embed_link)
-                        print_extraction_result(result, server["name"])
-                    except Exception as e:
-                        print(f"      ❌ Error: {e}")
-
-            except Exception as e:
-                print(f"   ❌ Server fetch error: {e}")
+            cached = STREAM_CACHE.get_streams("watch32", tmdb_id, season_num, ep_num)
+            if cached:
+                print_cached_streams(cached)
+            else:
+                try:
+                    resolved = resolve_episode(tmdb_id, season_num, ep)
+                    if resolved:
+                        print_streams(resolved)
+                    else:
+                        print(f"   ❌ No servers found")
+                except Exception as e:
+                    print(f"   ❌ Server fetch error: {e}")
+
+            if episode_filter is not None:
+                prefetch_thread = start_prefetch(tmdb_id, season_num, episodes, ep_num, prefetch)
 
     print()
+    return prefetch_thread
 
 
 def cmd_search(query):
@@ -636,36 +997,218 @@ def cmd_search(query):
         print()
 
 
+# ─── JSON API (same shape as watch32/src/index.js) ────────────────────────────
+
+def _api_detail(tmdb_data, title_key, prefer_type):
+    """TMDB data → (chosen search result, LazyDetail), raising ApiError like the worker."""
+    title = tmdb_data.get(title_key, "")
+    if not title:
+        raise ApiError(f"No {'movie' if prefer_type == 'movie' else 'TV show'} found on TMDB", 404)
+    results = w32_search(title)
+    if not results:
+        raise ApiError(f'No results on Watch32 for "{title}"', 404)
+    chosen = pick_best_result(results, title, prefer_type=prefer_type)
+    detail = w32_load_detail(chosen["url"])
+    if not detail.get("data_id"):
+        raise ApiError("Could not extract data_id from detail page", 500)
+    # Metadata is only needed for the response body — load it alongside server resolution
+    detail.load_in_background()
+    return chosen, detail
+
+
+def _api_servers(resolved):
+    return [{k: v for k, v in r.items() if k not in ("id", "embed")} for r in resolved]
+
+
+def _api_stream_urls(body):
+    return [s["m3u8"] for s in body.get("servers", []) if s.get("m3u8")]
+
+
+def api_movie(tmdb_id):
+    """GET /movie/{tmdb_id} response body, served from STREAM_CACHE while its m3u8s are live."""
+    return STREAM_CACHE.get_or_resolve("watch32:api", tmdb_id, None, None, lambda: _api_movie(tmdb_id), _api_stream_urls)
+
+
+def api_tv(tmdb_id, season, episode):
+    """GET /tv/{tmdb_id}/{season}/{episode} response body, cached like api_movie."""
+    return STREAM_CACHE.get_or_resolve(
+        "watch32:api", tmdb_id, season, episode, lambda: _api_tv(tmdb_id, season, episode), _api_stream_urls,
+    )
+
+
+def _api_movie(tmdb_id):
+    tmdb_data = tmdb_get_movie(tmdb_id)
+    chosen, detail = _api_detail(tmdb_data, "title", "movie")
+    servers = w32_get_movie_servers(detail["data_id"])
+    if not servers:
+        raise ApiError("No video servers found", 404)
+    resolved = resolve_servers(servers)
+    poster_path = tmdb_data.get("poster_path")
+    return {
+        "type": "movie",
+        "tmdbId": str(tmdb_id),
+        "title": detail.get("title") or tmdb_data.get("title", ""),
+        "year": detail.get("year") or (tmdb_data.get("release_date") or "")[:4],
+        "poster": detail.get("poster") or (f"{TMDB_IMG}{poster_path}" if poster_path else None),
+        "background": detail.get("background") or None,
+        "synopsis": detail.get("synopsis") or tmdb_data.get("overview", ""),
+        "genres": detail.get("genres"),
+        "duration": detail.get("duration") or None,
+        "watch32Url": chosen["url"],
+        "servers": _api_servers(resolved),
+    }
+
+
+def _api_tv(tmdb_id, season, episode):
+    tmdb_data = tmdb_get_tv(tmdb_id)
+    chosen, detail = _api_detail(tmdb_data, "name", "tv")
+    seasons = w32_get_tv_episodes(detail["data_id"], season)
+    episodes = seasons.get(season)
+    if not episodes:
+        raise ApiError(f"Season {season} not available.", 404)
+    if episode < 1 or episode > len(episodes):
+        raise ApiError(
+            f"Episode {episode} not available in season {season}. "
+            f"This season has {len(episodes)} episode(s).", 404,
+        )
+    target = episodes[episode - 1]
+
+    resolved = STREAM_CACHE.get_streams("watch32", tmdb_id, season, episode)
+    if resolved is None:
+        resolved = resolve_episode(tmdb_id, season, target)
+    if not resolved:
+        raise ApiError(f"No video servers found for S{season}E{episode}", 404)
+
+    poster_path = tmdb_data.get("poster_path")
+    return {
+        "type": "tv",
+        "tmdbId": str(tmdb_id),
+        "title": detail.get("title") or tmdb_data.get("name", ""),
+        "year": detail.get("year") or (tmdb_data.get("first_air_date") or "")[:4],
+        "poster": detail.get("poster") or (f"{TMDB_IMG}{poster_path}" if poster_path else None),
+        "background": detail.get("background") or None,
+        "synopsis": detail.get("synopsis") or tmdb_data.get("overview", ""),
+        "genres": detail.get("genres"),
+        "season": season,
+        "episode": episode,
+        "episodeName": target["name"] or f"Episode {episode}",
+        "totalSeasons": tmdb_data.get("number_of_seasons"),
+        "totalEpisodesInSeason": len(episodes),
+        "watch32Url": chosen["url"],
+        "servers": _api_servers(resolved),
+    }
+
+
+# ─── Provider Interface (see common/providers.py) ─────────────────────────────
+
+class Watch32Provider(Provider):
+    name = "watch32"
+    # The videostr decrypt is the slow hop
+    budget = 25.0
+
+    def map(self, tmdb_id, kind, season=None, episode=None):
+        tmdb_data = tmdb_get_movie(tmdb_id) if kind == "movie" else tmdb_get_tv(tmdb_id)
+        title = tmdb_data.get("title" if kind == "movie" else "name", "")
+        results = w32_search(title) if title else []
+        if not results:
+            return None
+        chosen = pick_best_result(results, title, prefer_type=kind)
+        data_id = w32_load_detail(chosen["url"]).get("data_id")
+        if not data_id:
+            return None
+        if kind == "movie":
+            return {"data_id": data_id}
+        episodes = w32_get_tv_episodes(data_id, season).get(season) or []
+        if not 1 <= episode <= len(episodes):
+            return None
+        return {"data_id": data_id, "episode": episodes[episode - 1]}
+
+    def list_servers(self, target):
+        if "episode" in target:
+            servers = w32_get_episode_servers(target["episode"]["server_url"])
+        else:
+            servers = w32_get_movie_servers(target["data_id"])
+        # Preferred servers are listed last
+        return list(reversed(servers or []))
+
+    def extract(self, target, server):
+        entry = resolve_server(server)
+        if not entry.get("m3u8"):
+            raise RuntimeError(entry.get("error") or "Extraction failed")
+        referer = f"{VIDEOSTR_BASE}/" if entry.get("source_name") == "Videostr" else None
+        return [make_link(
+            self.name, entry["m3u8"], server=server["name"], label=entry.get("source_name"),
+            referer=referer, subtitles=entry.get("subtitles"),
+        )]
+
+
+PROVIDER = Watch32Provider()
+
+
 # ─── Main ────────────────────────────────────────────────────────────────────
 
 def main():
-    if len(sys.argv) < 2:
+    profile_dir = None
+    if "--profile" in sys.argv:
+        i = sys.argv.index("--profile")
+        profile_dir = sys.argv[i + 1] if i + 1 < len(sys.argv) else "profile"
+        del sys.argv[i:i + 2]
+    if len(sys.argv) > 1 and sys.argv[1].lower() == "batch":
+        # --deadline applies per title here (see common/batch.py)
+        with profiling.profile(profile_dir):
+            batch.main(sys.argv[2:], api_movie, api_tv)
+        return
+
+    seconds = None
+    if "--deadline" in sys.argv:
+        i = sys.argv.index("--deadline")
+        seconds = float(sys.argv[i + 1]) if i + 1 < len(sys.argv) else None
+        del sys.argv[i:i + 2]
+    if "--quiet" in sys.argv or "--timings" in sys.argv:
+        metrics.console(enabled="--quiet" not in sys.argv, timings="--timings" in sys.argv)
+        sys.argv = [a for a in sys.argv if a not in ("--quiet", "--timings")]
+    with profiling.profile(profile_dir), deadline.deadline_scope(seconds):
+        run(sys.argv)
+
+
+def run(argv):
+    if len(argv) < 2:
         print(__doc__)
         return
 
-    command = sys.argv[1].lower()
+    command = argv[1].lower()
 
-    if command == "movie" and len(sys.argv) >= 3:
-        cmd_movie(sys.argv[2])
+    if command == "movie" and len(argv) >= 3:
+        cmd_movie(argv[2])
 
-    elif command == "tv" and len(sys.argv) >= 3:
-        tmdb_id = sys.argv[2]
+    elif command == "tv" and len(argv) >= 3:
+        tmdb_id = argv[2]
         season = None
         episode = None
+        prefetch = 0
         i = 3
-        while i < len(sys.argv):
-            if sys.argv[i] == "--season" and i + 1 < len(sys.argv):
-                season = int(sys.argv[i + 1])
+        while i < len(argv):
+            if argv[i] == "--season" and i + 1 < len(argv):
+                season = int(argv[i + 1])
+                i += 2
+            elif argv[i] == "--episode" and i + 1 < len(argv):
+                episode = int(argv[i + 1])
                 i += 2
-            elif sys.argv[i] == "--episode" and i + 1 < len(sys.argv):
-                episode = int(sys.argv[i + 1])
+            elif argv[i] == "--prefetch" and i + 1 < len(argv):
+                prefetch = int(argv[i + 1])
                 i += 2
             else:
                 i += 1
-        cmd_tv(tmdb_id, season, episode)
+        prefetch_thread = cmd_tv(tmdb_id, season, episode, prefetch)
+        if prefetch_thread:
+            # Give the prefetch a bounded chance to fill the cache; Ctrl-C skips it
+            try:
+                prefetch_thread.join(PREFETCH_WAIT)
+            except KeyboardInterrupt:
+                pass
 
-    elif command == "search" and len(sys.argv) >= 3:
-        cmd_search(" ".join(sys.argv[2:]))
+    elif command == "search" and len(argv) >= 3:
+        cmd_search(" ".join(argv[2:]))
 
     else:
         print(__doc__)